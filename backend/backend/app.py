@@ -3,32 +3,82 @@ import io
 import csv
 import zipfile
 from typing import Tuple
-import pandas as pd
 from flask import Flask, request, jsonify, make_response, Response
 from flask_cors import CORS
 
 
 from .key_config import (
     CSV_FILE_PATH,
+    ANSWER_CACHE_PATH,
+    TRANSFORMATION_CACHE_PATH,
+    REQUEST_TIMEOUT,
 )
 
 from .llm_config import get_llm_connection
-from .entities.agent import Agent
 from .services.get_data import GetData
 from .services.gemini_service import Gemini
 from .services.llm_handler import LlmHandler
+from .services.answer_cache import AnswerCache
+from .services.transformation_cache import TransformationCache
 from .services.csv_service import extract_questions_from_csv
+from .services.training_data import dataframe_to_agents, TrainingData
 from .services.agent_transformer import AgentTransformer
+from .services.scenario_comparison import ScenarioComparison
+from .services.population_store import PopulationStore
+from .services.distribution_counts import DistributionCounts
+from .services.shift_statistics import get_shift_statistics
+from .services.latent_correlations import LatentCorrelations
+from .services.survey_pipeline import SurveyPipeline
+from .services.cancellation import (
+    CancellationToken,
+    RequestCancelled,
+    socket_disconnected,
+)
 
 app = Flask(__name__)
 CORS(app)
 ai_model = get_llm_connection()
 gemini = Gemini(ai_model)
 csv_file = CSV_FILE_PATH
-llm_handler = LlmHandler()
+# Memory-mapped from the binary copy of the CSV file, if it has been created with
+# `invoke convert-data`, so that the data is not parsed at startup and only the used rows are read
+training_data = TrainingData(csv_file)
+# Answers are cached across sessions if ANSWER_CACHE_PATH is set in the .env file
+answer_cache = AnswerCache(ANSWER_CACHE_PATH) if ANSWER_CACHE_PATH else None
+llm_handler = LlmHandler(answer_cache=answer_cache)
+
+# Transformations are cached across sessions if TRANSFORMATION_CACHE_PATH is set in the .env file
+transformation_cache = (
+    TransformationCache(TRANSFORMATION_CACHE_PATH)
+    if TRANSFORMATION_CACHE_PATH
+    else None
+)
+
+# The agents of the session. Requests read the version that is current when they start, and
+# requests that change the agents publish a modified copy as a new version.
+population_store = PopulationStore()
+# The correlations of the latent variables and the answers, cached by population version
+latent_correlations = LatentCorrelations()
+# The whole workflow with memoized stages, used by `/run_pipeline`
+survey_pipeline = SurveyPipeline(
+    llm_handler,
+    AgentTransformer(transformation_cache=transformation_cache),
+    training_data,
+)
+
 
-# Set a default value for the global variable agents
-agents = []
+def request_cancellation() -> CancellationToken:
+    """Returns a cancellation token for the current request. The token is cancelled when the
+    client closes the connection (e.g. the user closes the tab) or when REQUEST_TIMEOUT seconds
+    have passed, so that the remaining LLM requests are not sent and paid for."""
+    # Gunicorn and the Flask development server expose the socket of the client connection
+    sock = request.environ.get("gunicorn.socket") or request.environ.get(
+        "werkzeug.socket"
+    )
+    return CancellationToken(
+        timeout=float(REQUEST_TIMEOUT) if REQUEST_TIMEOUT else None,
+        is_disconnected=lambda: socket_disconnected(sock),
+    )
 
 
 @app.route("/", methods=["GET"])
@@ -52,38 +102,14 @@ def create_agents() -> Tuple[Response, int]:
         # Get the number of agents requested from the query parameters
         requested = request.args.get("agents", default=50, type=int)
         agent_count = min(max(requested, 1), 100)  # enforce 1–100 bounds
-
-        # Declare the list of agents to be a global variable, so that other functions can access it
-        global agents
-
-        df = pd.read_csv(csv_file)
+        # Optionally keep the proportions of genders and age bands of the training data
+        stratified = request.args.get("stratified", default="false") == "true"
 
         # Select random 50 rows
-        df = df.sample(agent_count)
-
-        # Convert integer columns to strings
-        int_cols = df.select_dtypes(include=["int"]).columns
-        df[int_cols] = df[int_cols].astype(str)
-
-        agents = []
-
-        # Create Agent objects: info includes Age, Gender, and Answers.
-        for record in df.to_dict(orient="records"):
-
-            # Create agents
-            info = {
-                "Age": record.get("Age"),
-                "Gender": record.get("Gender"),
-                "Answers": {
-                    question_text: answer_value
-                    for question_text, answer_value in record.items()
-                    if question_text not in ["Age", "Gender"]
-                },
-            }
+        df = training_data.sample(agent_count, stratified=stratified)
 
-            agent = Agent(info)
-            agents.append(agent)
-            # Example Agent-object now: Agent(Age=24, Answers={'Q1': 1, 'Q2': 3}, Gender=Male)
+        agents = dataframe_to_agents(df)
+        population_store.publish(agents)
 
         # Convert agents to a list of dicts matching the frontend structure
         agent_dicts = []
@@ -121,7 +147,17 @@ def create_agents() -> Tuple[Response, int]:
 @app.route("/receive_user_csv", methods=["POST"])
 def receive_user_csv() -> Tuple[Response, int]:
     """Receives the user's questions and returns answer distributions and statistics
-    for those questions.
+    for those questions. If the optional field `repetitions` (1-10) is greater than 1, each
+    question is asked repeatedly until its confidence intervals converge, and the distributions
+    contain the mean counts over the repetitions with confidence intervals. If the optional
+    field `probabilities` is true, the distributions are the expected counts calculated from the
+    LLM's token probabilities of each agent's answer. If the optional field `surrogate` is true,
+    only a part of the agents is asked from the LLM and the answers of the others are predicted
+    from their latent variables, which makes large populations affordable; `predicted` then
+    tells how many agents' answers to each question were predicted. If the agents have
+    been transformed to the future, `shifts` compares each agent's current and future answers
+    (see `get_shift_statistics`). If the agents are replaced or transformed while the questions
+    are asked, the answers are not saved and the status is 409.
 
     Returns:
         JSON:
@@ -150,8 +186,6 @@ def receive_user_csv() -> Tuple[Response, int]:
                 }
     """
 
-    global agents
-
     data = request.get_json()
 
     if not data:
@@ -171,24 +205,325 @@ def receive_user_csv() -> Tuple[Response, int]:
     if questions == []:
         return jsonify({"error": "'questions' must not be an empty list"}), 400
 
-    i = 1
-    # Send the questions to the LLM one by one
-    for question in questions:
-        i += 1
-        # Method get_agents_responses saves the responses generated by the LLM into the Agent-
-        # objects. We don't need the return value given by the method.
-        responses = llm_handler.get_agents_responses(agents, [question])
+    repetitions = data.get("repetitions", 1)
+
+    # bool is a subclass of int, so `true` would otherwise be accepted as 1
+    if (
+        isinstance(repetitions, bool)
+        or not isinstance(repetitions, int)
+        or not 1 <= repetitions <= 10
+    ):
+        return jsonify({"error": "'repetitions' must be an integer from 1 to 10"}), 400
+
+    probabilities = data.get("probabilities", False)
+
+    if not isinstance(probabilities, bool):
+        return jsonify({"error": "'probabilities' must be a boolean"}), 400
+
+    if probabilities and repetitions > 1:
+        return (
+            jsonify({"error": "'probabilities' and 'repetitions' cannot be combined"}),
+            400,
+        )
+
+    surrogate = data.get("surrogate", False)
+
+    if not isinstance(surrogate, bool):
+        return jsonify({"error": "'surrogate' must be a boolean"}), 400
+
+    if surrogate and (probabilities or repetitions > 1):
+        return (
+            jsonify(
+                {
+                    "error": "'surrogate' cannot be combined with 'probabilities' or 'repetitions'"
+                }
+            ),
+            400,
+        )
 
-    # Create distributions from the answers that have been saved into the Agent-objects
     get_data = GetData()
-    current_distributions, future_distributions = get_data.get_all_distributions(agents)
+    cancellation = request_cancellation()
+    # The answers are saved into copies of the agents, so that other requests keep reading the
+    # current version
+    population = population_store.current()
+    agents = population.copy_agents()
+    distribution_counts = population.distribution_counts.copy()
 
-    return jsonify(
+    try:
+        current_distributions, future_distributions = ask_questions(
+            agents,
+            questions,
+            repetitions,
+            probabilities,
+            surrogate,
+            get_data,
+            cancellation,
+            distribution_counts,
+        )
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+    except RequestCancelled as error:
+        # The client has gone or the deadline passed: the remaining questions are not asked
+        return jsonify({"error": str(error)}), 504
+
+    # If the agents were replaced or transformed meanwhile, the answers would be saved into an
+    # outdated version
+    if (
+        population_store.publish(
+            agents, base=population, distribution_counts=distribution_counts
+        )
+        is None
+    ):
+        return (
+            jsonify(
+                {
+                    "error": "The agents changed while the questions were asked. Please try again.",
+                }
+            ),
+            409,
+        )
+
+    result = {
+        "status": "success",
+        "distributions": current_distributions,
+        "future_distributions": future_distributions,
+    }
+
+    if surrogate:
+        result["predicted"] = count_predicted_answers(agents, questions)
+
+    if future_distributions:
+        # How the answers of each agent changed in the future scenario
+        result["shifts"] = get_shift_statistics(agents)
+
+    if answer_cache is not None:
+        result["answer_cache"] = answer_cache.get_statistics()
+
+    if hasattr(llm_handler.llm, "get_cache_statistics"):
+        # The number of prompt tokens read from the provider's prompt cache
+        result["prompt_cache"] = llm_handler.llm.get_cache_statistics()
+
+    return jsonify(result)
+
+
+def ask_questions(
+    agents: list,
+    questions: list,
+    repetitions: int,
+    probabilities: bool,
+    surrogate: bool,
+    get_data: GetData,
+    cancellation: CancellationToken,
+    distribution_counts: DistributionCounts,
+) -> Tuple[list, list]:
+    """Asks the questions from the agents in the way chosen in the request to
+    `/receive_user_csv` and returns the current and future distributions. The answers are saved
+    into the given agents and counted in `distribution_counts`.
+
+    Raises:
+        ValueError: If the answer probabilities cannot be requested from the LLM.
+        RequestCancelled: If the request is cancelled.
+    """
+    if probabilities:
+        # The answer probabilities of each agent are read from the token log probabilities
+        for question in questions:
+            llm_handler.get_agents_probability_responses(
+                agents, [question], distribution_counts, cancellation=cancellation
+            )
+
+        current_distributions, future_distributions = (
+            get_data.get_all_expected_distributions(agents)
+        )
+    elif surrogate:
+        # Ask the LLM only where the surrogate model cannot predict the answers
+        for question in questions:
+            llm_handler.get_agents_surrogate_responses(
+                agents,
+                [question],
+                cancellation=cancellation,
+                distribution_counts=distribution_counts,
+            )
+
+        current_distributions, future_distributions = (
+            distribution_counts.get_all_distributions()
+        )
+    elif repetitions > 1:
+        # Ask each question repeatedly until its confidence intervals converge
+        for question in questions:
+            # Up to three answers per agent are requested from the LLM in one round trip
+            llm_handler.get_repeated_agents_responses(
+                agents,
+                [question],
+                max_repetitions=repetitions,
+                samples_per_request=3,
+                cancellation=cancellation,
+                distribution_counts=distribution_counts,
+            )
+
+        current_distributions, future_distributions = (
+            get_data.get_all_repeated_distributions(agents)
+        )
+    else:
+        # Send the questions to the LLM one by one
+        for question in questions:
+            # Method get_agents_responses saves the responses generated by the LLM into the Agent-
+            # objects. We don't need the return value given by the method.
+            llm_handler.get_agents_responses(
+                agents,
+                [question],
+                cancellation=cancellation,
+                distribution_counts=distribution_counts,
+            )
+
+        # The answers have been counted as they were saved into the Agent-objects
+        current_distributions, future_distributions = (
+            distribution_counts.get_all_distributions()
+        )
+
+    return current_distributions, future_distributions
+
+
+def count_predicted_answers(agents: list, questions: list) -> list:
+    """Returns the number of agents whose answer to each question was predicted by the
+    surrogate model instead of being asked from the LLM, for example:
+        [{"question": "I like pasta", "predicted": 40, "future predicted": 38}]
+    """
+    return [
         {
-            "status": "success",
-            "distributions": current_distributions,
-            "future_distributions": future_distributions,
+            "question": question,
+            "predicted": sum(question in agent.predicted_questions for agent in agents),
+            "future predicted": sum(
+                question in agent.future_predicted_questions for agent in agents
+            ),
         }
+        for question in dict.fromkeys(questions)
+    ]
+
+
+@app.route("/distributions", methods=["GET"])
+def get_distributions() -> Tuple[Response, int]:
+    """Returns the answer distributions of the current agents to all questions asked so far.
+    The distributions are made from the answer counts kept while the answers were saved, so the
+    agents are not read and the time taken depends only on the number of questions.
+
+    Returns:
+        JSON:
+            The distributions in the same form as `/receive_user_csv` returns them, and the
+            version of the agents they belong to. An example:
+                {
+                    "status": "success",
+                    "version": 3,
+                    "distributions": [...],
+                    "future_distributions": [...]
+                }
+    """
+    population = population_store.current()
+    current_distributions, future_distributions = (
+        population.distribution_counts.get_all_distributions()
+    )
+
+    return (
+        jsonify(
+            {
+                "status": "success",
+                "version": population.version,
+                "distributions": current_distributions,
+                "future_distributions": future_distributions,
+            }
+        ),
+        200,
+    )
+
+
+@app.route("/segmented_distributions", methods=["GET"])
+def get_segmented_distributions() -> Tuple[Response, int]:
+    """Returns the answer distributions of the current agents separately for each segment of
+    the agents. The query parameter `by` chooses the segments: "Gender" (the default), "Age"
+    for ten-year age bands, or the name of another categorical column of the training data.
+
+    Returns:
+        JSON:
+            The distributions of each segment. An example:
+                {
+                    "status": "success",
+                    "segment_by": "Gender",
+                    "segments": [
+                        {
+                            "segment": "Female",
+                            "agents": 12,
+                            "distributions": [...],
+                            "future_distributions": [...]
+                        },
+                        ...
+                    ]
+                }
+    """
+    segment_by = request.args.get("by", default="Gender")
+    agents = population_store.current().agents
+
+    if not agents:
+        return jsonify({"error": "No agents have been created"}), 400
+
+    try:
+        segments = GetData().get_all_segmented_distributions(agents, segment_by)
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+
+    return (
+        jsonify({"status": "success", "segment_by": segment_by, "segments": segments}),
+        200,
+    )
+
+
+@app.route("/latent_correlations", methods=["GET"])
+def get_latent_correlations() -> Tuple[Response, int]:
+    """Returns the correlation of each latent variable with the answers to each question, for
+    the current and future agents. The query parameter `method` chooses the Spearman rank
+    correlation ("spearman", the default) or the Pearson correlation ("pearson"). The result is
+    calculated once per version of the agents.
+
+    Returns:
+        JSON:
+            The correlations of each question. An example:
+                {
+                    "status": "success",
+                    "version": 3,
+                    "method": "spearman",
+                    "correlations": [
+                        {
+                            "question": "I like pasta",
+                            "agents": 50,
+                            "correlations": [
+                                {"variable": "Future Awareness", "value": 0.42},
+                                ...
+                            ]
+                        }
+                    ],
+                    "future_correlations": [...]
+                }
+    """
+    method = request.args.get("method", default="spearman")
+    population = population_store.current()
+
+    if not population.agents:
+        return jsonify({"error": "No agents have been created"}), 400
+
+    try:
+        current, future = latent_correlations.get_correlations(population, method)
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+
+    return (
+        jsonify(
+            {
+                "status": "success",
+                "version": population.version,
+                "method": method,
+                "correlations": current,
+                "future_correlations": future,
+            }
+        ),
+        200,
     )
 
 
@@ -203,8 +538,6 @@ def receive_future_scenario() -> Tuple[Response, int]:
             if something went wrong.
     """
 
-    global agents
-
     data = request.get_json()
 
     if not data:
@@ -224,8 +557,17 @@ def receive_future_scenario() -> Tuple[Response, int]:
     if not isinstance(scenario, str):
         return jsonify({"error": "'scenario' must be an string"}), 400
 
+    # The agents are transformed as copies. Other requests read the current version until the
+    # transformed agents are published.
+    population = population_store.current()
+    agents = [agent.create_variant() for agent in population]
+
     try:
-        AgentTransformer().transform_agents_to_future(agents, scenario)
+        AgentTransformer(
+            transformation_cache=transformation_cache
+        ).transform_agents_to_future(agents, scenario, request_cancellation())
+    except RequestCancelled as error:
+        return jsonify({"error": str(error)}), 504
     except Exception:
         return (
             jsonify(
@@ -236,6 +578,16 @@ def receive_future_scenario() -> Tuple[Response, int]:
             500,
         )
 
+    if population_store.publish(agents, base=population) is None:
+        return (
+            jsonify(
+                {
+                    "error": "The agents changed during the transformation. Please try again.",
+                }
+            ),
+            409,
+        )
+
     return jsonify(
         {
             "status": "success",
@@ -244,13 +596,186 @@ def receive_future_scenario() -> Tuple[Response, int]:
     )
 
 
+@app.route("/compare_future_scenarios", methods=["POST"])
+def compare_future_scenarios() -> Tuple[Response, int]:
+    """Receives several future scenarios and the user's questions. Transforms copies of the
+    agents into every scenario concurrently, asks the questions from all of them in parallel and
+    returns the distributions side by side. The agents of the session are not modified.
+
+    Returns:
+        JSON:
+            The distributions of the original agents and the future distributions for each
+            scenario. An example:
+                {
+                    "status": "success",
+                    "distributions": [...],
+                    "scenarios": [
+                        {"scenario": "Scenario 1", "future_distributions": [...]},
+                        {"scenario": "Scenario 2", "future_distributions": [...]}
+                    ]
+                }
+    """
+
+    data = request.get_json()
+
+    if not data:
+        return jsonify({"error": "No data provided"}), 400
+
+    if not isinstance(data, dict):
+        return jsonify({"error": "Payload must be a dictionary"}), 400
+
+    if "scenarios" not in data:
+        return jsonify({"error": "Missing 'scenarios' field in payload"}), 400
+
+    scenarios = data["scenarios"]
+
+    if (
+        not isinstance(scenarios, list)
+        or not 2 <= len(scenarios) <= 5
+        or not all(isinstance(scenario, str) for scenario in scenarios)
+    ):
+        return (
+            jsonify({"error": "'scenarios' must be a list of 2 to 5 strings"}),
+            400,
+        )
+
+    if "questions" not in data:
+        return jsonify({"error": "Missing 'questions' field in payload"}), 400
+
+    questions = extract_questions_from_csv(data)
+
+    if not isinstance(questions, list):
+        return jsonify({"error": "'questions' must be an object (list)"}), 400
+
+    if questions == []:
+        return jsonify({"error": "'questions' must not be an empty list"}), 400
+
+    agents = population_store.current().agents
+
+    if not agents:
+        return jsonify({"error": "No agents have been created"}), 400
+
+    comparison = ScenarioComparison(
+        llm_handler, AgentTransformer(transformation_cache=transformation_cache)
+    )
+
+    try:
+        current_distributions, scenario_distributions = comparison.compare(
+            agents, scenarios, questions, request_cancellation()
+        )
+    except RequestCancelled as error:
+        return jsonify({"error": str(error)}), 504
+    except Exception:
+        return (
+            jsonify(
+                {
+                    "error": "Something went wrong during the scenario comparison.",
+                }
+            ),
+            500,
+        )
+
+    return jsonify(
+        {
+            "status": "success",
+            "distributions": current_distributions,
+            "scenarios": scenario_distributions,
+        }
+    )
+
+
+@app.route("/run_pipeline", methods=["POST"])
+def run_pipeline() -> Tuple[Response, int]:
+    """Runs the whole workflow as a pipeline: samples the agents, transforms them to the
+    optional future scenario, asks the questions and returns the distributions. The result of
+    every stage is memoized by a hash of its inputs, so running the pipeline again with one
+    question or the scenario changed asks the LLM only what changed. The agents of the session
+    are not used or modified.
+
+    The payload contains `questions` like in `/receive_user_csv` and optionally `scenario`
+    (str), `agents` (the number of agents, 1-100, default 50), `seed` (int, default 0; the same
+    seed gives the same agents) and `stratified` (bool).
+
+    Returns:
+        JSON:
+            The distributions and the stages that were computed or reused. An example:
+                {
+                    "status": "success",
+                    "distributions": [...],
+                    "future_distributions": [...],
+                    "stages": [
+                        {"stage": "population", "key": "3f2a...", "status": "reused"},
+                        {"stage": "original answers", "key": "9c1d...", "status": "computed"},
+                        ...
+                    ]
+                }
+    """
+    data = request.get_json()
+
+    if not data or not isinstance(data, dict):
+        return jsonify({"error": "Payload must be a dictionary"}), 400
+
+    if "questions" not in data:
+        return jsonify({"error": "Missing 'questions' field in payload"}), 400
+
+    questions = extract_questions_from_csv(data)
+
+    if not isinstance(questions, list) or questions == []:
+        return jsonify({"error": "'questions' must be a non-empty list"}), 400
+
+    scenario = data.get("scenario")
+
+    if scenario is not None and not isinstance(scenario, str):
+        return jsonify({"error": "'scenario' must be a string"}), 400
+
+    agent_count = data.get("agents", 50)
+    seed = data.get("seed", 0)
+
+    # bool is a subclass of int, so `true` would otherwise be accepted as 1
+    if (
+        isinstance(agent_count, bool)
+        or not isinstance(agent_count, int)
+        or not 1 <= agent_count <= 100
+    ):
+        return jsonify({"error": "'agents' must be an integer from 1 to 100"}), 400
+
+    if isinstance(seed, bool) or not isinstance(seed, int):
+        return jsonify({"error": "'seed' must be an integer"}), 400
+
+    stratified = data.get("stratified", False)
+
+    if not isinstance(stratified, bool):
+        return jsonify({"error": "'stratified' must be a boolean"}), 400
+
+    try:
+        result = survey_pipeline.run(
+            questions,
+            scenario=scenario,
+            agent_count=agent_count,
+            seed=seed,
+            stratified=stratified,
+            cancellation=request_cancellation(),
+        )
+    except RequestCancelled as error:
+        return jsonify({"error": str(error)}), 504
+    except Exception:
+        return (
+            jsonify({"error": "Something went wrong while running the pipeline."}),
+            500,
+        )
+
+    return jsonify({"status": "success", **result}), 200
+
+
 @app.route("/download_agent_response_csv", methods=["POST"])
 def download_agent_response_csv() -> Response:
     """
     Endpoint to generate and download a CSV files containing current and future agent responses
     along with the agent's age and gender.
     The CSVs will have one row per agent, where the first columns are the agent identifier, age, gender,
-    and subsequent columns correspond to each question.
+    and subsequent columns correspond to each question. If some answers were predicted by the
+    surrogate model, the last column `Predicted` lists the questions whose answers the agent did
+    not get from the LLM, separated by semicolons.
 
     AGE AND GENDER TODO
     """
@@ -266,6 +791,8 @@ def download_agent_response_csv() -> Response:
         return jsonify({"error": "Missing 'questions' field in payload"}), 400
 
     questions_payload = data["questions"]
+    # The version of the agents that is current now is used for the whole download
+    agents = population_store.current().agents
 
     # If questions_payload is empty, use the keys from the first agent's questions
     if not questions_payload:
@@ -278,6 +805,10 @@ def download_agent_response_csv() -> Response:
 
     # Create headers
     header_current = ["Agent", "Age", "Gender"] + list(questions_payload.keys())
+    questions_current = header_current[3:]
+    predicted_current = any(agent.predicted_questions for agent in agents)
+    if predicted_current:
+        header_current.append("Predicted")
     # In-memory CSV
     si_current = io.StringIO()
     writer_current = csv.writer(si_current)
@@ -288,12 +819,16 @@ def download_agent_response_csv() -> Response:
         agent_info = agent.get_agent_info()
         row = [str(i), agent_info.get("Age", ""), agent_info.get("Gender", "")]
         if hasattr(agent, "questions"):
-            for question in header_current[3:]:
+            for question in questions_current:
                 value = agent.questions.get(question, "")
                 row.append(value)
         else:
             # Replace empty questions with empty strings
-            row.extend(["" for _ in header_current[3:]])
+            row.extend(["" for _ in questions_current])
+        if predicted_current:
+            row.append(
+                ";".join(q for q in questions_current if q in agent.predicted_questions)
+            )
         writer_current.writerow(row)
     # Retrieve CSV content
     csv_content_current = si_current.getvalue()
@@ -315,6 +850,10 @@ def download_agent_response_csv() -> Response:
 
     # Create headers
     header_future = ["Agent", "Age", "Gender"] + list(future_questions_payload.keys())
+    questions_future = header_future[3:]
+    predicted_future = any(agent.future_predicted_questions for agent in agents)
+    if predicted_future:
+        header_future.append("Predicted")
     si_future = io.StringIO()
     writer_future = csv.writer(si_future)
     writer_future.writerow(header_future)
@@ -324,12 +863,18 @@ def download_agent_response_csv() -> Response:
         agent_info = agent.get_agent_info()
         row = [str(i), agent_info.get("Age", ""), agent_info.get("Gender", "")]
         if hasattr(agent, "future_questions"):
-            for question in header_future[3:]:
+            for question in questions_future:
                 value = agent.future_questions.get(question, "")
                 row.append(value)
         else:
             # Replace empty questions with empty strings
-            row.extend(["" for _ in header_future[3:]])
+            row.extend(["" for _ in questions_future])
+        if predicted_future:
+            row.append(
+                ";".join(
+                    q for q in questions_future if q in agent.future_predicted_questions
+                )
+            )
         writer_future.writerow(row)
     # Retrieve CSV content
     csv_content_future = si_future.getvalue()
@@ -10,6 +10,12 @@ class Agent:
         __future_info (dict): The latent variables and answers after the agent has been transformed to the future
         questions (dict): Holds the questions and the agent's likert-scale answers to them
         future_questions (dict): Holds the questions and the transformed agent's likert-scale answers to them
+        answer_probabilities (dict): Holds the questions and the probabilities of the agent's answers
+            on each likert-scale level, derived from the LLM's token log probabilities
+        future_answer_probabilities (dict): The same as `answer_probabilities` for the transformed agent
+        predicted_questions (set): The questions whose answers were predicted by the surrogate
+            model instead of being asked from the LLM
+        future_predicted_questions (set): The same as `predicted_questions` for the transformed agent
     """
 
     _id_counter = 0  # Class variable to keep track of the last assigned ID
@@ -26,6 +32,56 @@ class Agent:
         self.__future_info = {"Answers": {}}
         self.questions = {}
         self.future_questions = {}
+        self.answer_probabilities = {}
+        self.future_answer_probabilities = {}
+        self.predicted_questions = set()
+        self.future_predicted_questions = set()
+
+    def create_variant(self) -> "Agent":
+        """Returns a copy of the agent that can be transformed into another future scenario. The
+        copy has the same id, information and original answers, but no future information.
+
+        Returns:
+            Agent: The copy of the agent.
+        """
+        variant = Agent.__new__(Agent)
+        variant.__id = self.__id
+        variant.__info = self.__info
+        variant.__future_info = {"Answers": {}}
+        variant.questions = {
+            question: list(answers) for question, answers in self.questions.items()
+        }
+        variant.future_questions = {}
+        variant.answer_probabilities = {
+            question: list(vectors)
+            for question, vectors in self.answer_probabilities.items()
+        }
+        variant.future_answer_probabilities = {}
+        variant.predicted_questions = set(self.predicted_questions)
+        variant.future_predicted_questions = set()
+        return variant
+
+    def copy(self) -> "Agent":
+        """Returns a copy of the agent with the same id, information, future information and
+        answers. Saving answers into the copy does not change the agent, so the copy can be
+        modified while the agent is read by other requests.
+
+        Returns:
+            Agent: The copy of the agent.
+        """
+        copy = self.create_variant()
+        # The future information is replaced, not modified, when the agent is transformed
+        copy.__future_info = self.__future_info
+        copy.future_questions = {
+            question: list(answers)
+            for question, answers in self.future_questions.items()
+        }
+        copy.future_answer_probabilities = {
+            question: list(vectors)
+            for question, vectors in self.future_answer_probabilities.items()
+        }
+        copy.future_predicted_questions = set(self.future_predicted_questions)
+        return copy
 
     def get_id(self) -> int:
         """Returns the unique identifier of the agent."""
@@ -54,10 +110,25 @@ class Agent:
 
     def delete_future_info_and_questions(self) -> None:
         """Overwrites the `future_info`, `questions` and future `future_questions` attributes
-        with empty dictionaries. Returns `None`."""
+        and the answer probabilities with empty dictionaries, and forgets the predicted answers.
+        Returns `None`."""
         self.__future_info = {"Answers": {}}
         self.questions = {}
         self.future_questions = {}
+        self.answer_probabilities = {}
+        self.future_answer_probabilities = {}
+        self.predicted_questions = set()
+        self.future_predicted_questions = set()
+
+    def delete_future_info_and_future_questions(self) -> None:
+        """Overwrites the `future_info`, `future_questions` and `future_answer_probabilities`
+        attributes with empty dictionaries and forgets the predicted future answers. The answers
+        of the original agent are kept, because they do not depend on the future scenario.
+        Returns `None`."""
+        self.__future_info = {"Answers": {}}
+        self.future_questions = {}
+        self.future_answer_probabilities = {}
+        self.future_predicted_questions = set()
 
     def save_new_future_latent_variables(self, new_variables: Dict[str, Any]) -> None:
         """Save new future latent variables into the __future_into argument.
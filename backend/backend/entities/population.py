@@ -0,0 +1,59 @@
+from typing import Iterable, Iterator, List, Optional, Tuple
+from .agent import Agent
+from ..services.distribution_counts import DistributionCounts
+
+
+class Population:
+    """An immutable version of the agents of the session. The agents of a published population
+    are only read: a request that changes them copies the agents with `copy_agents`, modifies
+    the copies and publishes them as a new version in the _PopulationStore_.
+
+    Attributes:
+        agents (tuple): The agents.
+        version (int): The version number, increasing with every published population.
+        distribution_counts (DistributionCounts): The counts of the agents' answers.
+    """
+
+    def __init__(
+        self,
+        agents: Iterable[Agent],
+        version: int = 0,
+        distribution_counts: Optional[DistributionCounts] = None,
+    ) -> None:
+        """Creates a population.
+
+        Args:
+            agents (iterable): The agents.
+            version (int): The version number.
+            distribution_counts (DistributionCounts, optional): The counts of the answers saved
+                into the agents. Counted from the agents if not given.
+        """
+        self.__agents = tuple(agents)
+        self.__version = version
+        self.__distribution_counts = (
+            distribution_counts
+            if distribution_counts is not None
+            else DistributionCounts.from_agents(self.__agents)
+        )
+
+    @property
+    def agents(self) -> Tuple[Agent, ...]:
+        return self.__agents
+
+    @property
+    def version(self) -> int:
+        return self.__version
+
+    @property
+    def distribution_counts(self) -> DistributionCounts:
+        return self.__distribution_counts
+
+    def copy_agents(self) -> List[Agent]:
+        """Returns copies of the agents that can be modified without changing this version."""
+        return [agent.copy() for agent in self.__agents]
+
+    def __len__(self) -> int:
+        return len(self.__agents)
+
+    def __iter__(self) -> Iterator[Agent]:
+        return iter(self.__agents)
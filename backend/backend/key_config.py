@@ -6,8 +6,16 @@ load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 CSV_FILE_PATH = os.getenv("CSV_FILE_PATH")
+ANSWER_CACHE_PATH = os.getenv("ANSWER_CACHE_PATH")
+TRANSFORMATION_CACHE_PATH = os.getenv("TRANSFORMATION_CACHE_PATH")
+# Models per task. If a model is not set, the default model of the provider is used.
+ANSWER_MODEL = os.getenv("ANSWER_MODEL")
+ESCALATION_MODEL = os.getenv("ESCALATION_MODEL")
+TRANSFORMATION_MODEL = os.getenv("TRANSFORMATION_MODEL")
+# The maximum number of seconds the LLM work of a request may take. No deadline if not set.
+REQUEST_TIMEOUT = os.getenv("REQUEST_TIMEOUT")
 
-if not GEMINI_API_KEY and not OPENAI_API_KEY:
+if not GEMINI_API_KEY and not OPENAI_API_KEY and os.getenv("LLM_PROVIDER") != "local":
     raise FileNotFoundError(
         "GEMINI_API_KEY or OPENAI_API_KEY is missing from the .env file."
     )
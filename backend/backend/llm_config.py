@@ -1,36 +1,107 @@
 import os
-from typing import Union
+import threading
+from typing import Dict, Union, Optional, TYPE_CHECKING
 import google.generativeai as genai
 from .services.gemini_service import Gemini
-from .services.openai_service import OpenAI
+from .services.hedged_llm import HedgedLLM
+from .services.local_llm_service import LocalLLM
 
+if TYPE_CHECKING:
+    from .services.openai_service import OpenAI
 
-def get_llm_connection() -> Union[Gemini, OpenAI]:
-    """Returns an instance of class _Gemini_ or _OpenAI_. The returned class will be the LLM model, that
-    the program uses. The used model is specified in the .env-file.
+# One llama.cpp model per model file, shared by all callers, since every instance loads the
+# whole model into memory
+_local_models: Dict[str, LocalLLM] = {}
+_local_models_lock = threading.Lock()
+
+
+def get_llm_connection(
+    model: Optional[str] = None,
+) -> Union[Gemini, "OpenAI", LocalLLM, HedgedLLM]:
+    """Returns an instance of class _Gemini_, _OpenAI_ or _LocalLLM_. The returned class will be the
+    LLM model, that the program uses. The used model is specified in the .env-file.
+
+    If LLM_HEDGING is set to true in the .env-file, returns a _HedgedLLM_ that uses the provider
+    specified by LLM_PROVIDER first and the other provider when the first one is slow or failing.
+
+    Args:
+        model (str, optional): The name of the model of the provider specified by LLM_PROVIDER,
+            or the path of the model file for the local provider. Defaults to **None**, when
+            "gemini-1.5-flash", "gpt-4o" or LOCAL_MODEL_PATH is used.
 
     Returns:
-        Union(Gemini, OpenAI): The LLM model used by the program.
+        Union(Gemini, OpenAI, LocalLLM, HedgedLLM): The LLM model used by the program.
 
     Raises:
         ValueError: If the .env-file does not specify the LLM model correctly.
     """
     llm_provider = os.getenv("LLM_PROVIDER")
 
+    if llm_provider == "local":
+        # The same model file is loaded only once and shared
+        return _get_local(model)
+
+    if llm_provider not in ("gemini", "openai"):
+        raise ValueError("Invalid LLM_PROVIDER. Must be 'openai', 'gemini' or 'local'")
+
+    if os.getenv("LLM_HEDGING", "").lower() == "true":
+        hedge_delay = os.getenv("LLM_HEDGE_DELAY")
+        if llm_provider == "gemini":
+            providers = [_get_gemini(model), _get_openai()]
+        else:
+            providers = [_get_openai(model), _get_gemini()]
+        return HedgedLLM(
+            providers,
+            hedge_delay=float(hedge_delay) if hedge_delay else None,
+            # Every worker thread of the server may wait for a hedged response
+            max_concurrent_requests=int(os.getenv("GUNICORN_THREADS", "32")),
+        )
+
     if llm_provider == "gemini":
-        gemini_api_key = os.getenv("GEMINI_API_KEY")
-        if not gemini_api_key:
-            raise ValueError("No GEMINI_API_KEY found in environment")
-        genai.configure(api_key=gemini_api_key)
-        model = genai.GenerativeModel("gemini-1.5-flash")
-
-        return Gemini(model)
-
-    elif llm_provider == "openai":
-        openai_api_key = os.getenv("OPENAI_API_KEY")
-        if not openai_api_key:
-            raise ValueError("No OPENAI_API_KEY found in environment")
-        return OpenAI(openai_api_key)
-
-    else:
-        raise ValueError("Invalid LLM_PROVIDER. Must be 'openai' or 'gemini'")
+        return _get_gemini(model)
+    return _get_openai(model)
+
+
+def _get_gemini(model: Optional[str] = None) -> Gemini:
+    gemini_api_key = os.getenv("GEMINI_API_KEY")
+    if not gemini_api_key:
+        raise ValueError("No GEMINI_API_KEY found in environment")
+    genai.configure(api_key=gemini_api_key)
+    ai_model = genai.GenerativeModel(model or "gemini-1.5-flash")
+
+    return Gemini(ai_model)
+
+
+def _get_openai(model: Optional[str] = None) -> "OpenAI":
+    # Imported here, because the OpenAI client requires an API-key already when it is created
+    from .services.openai_service import OpenAI
+
+    openai_api_key = os.getenv("OPENAI_API_KEY")
+    if not openai_api_key:
+        raise ValueError("No OPENAI_API_KEY found in environment")
+    return OpenAI(openai_api_key, model or "gpt-4o")
+
+
+def _get_local(model_path: Optional[str] = None) -> LocalLLM:
+    model_path = model_path or os.getenv("LOCAL_MODEL_PATH")
+    if not model_path or not os.path.exists(model_path):
+        raise ValueError("LOCAL_MODEL_PATH is missing or the file does not exist")
+    try:
+        from llama_cpp import Llama
+    except ImportError as exc:
+        raise ValueError(
+            "The local provider requires llama-cpp-python: pip install llama-cpp-python"
+        ) from exc
+
+    key = os.path.realpath(model_path)
+    with _local_models_lock:
+        if key not in _local_models:
+            threads = os.getenv("LOCAL_MODEL_THREADS")
+            ai_model = Llama(
+                model_path=model_path,
+                n_ctx=int(os.getenv("LOCAL_MODEL_CONTEXT", "8192")),
+                n_threads=int(threads) if threads else None,
+                verbose=False,
+            )
+            _local_models[key] = LocalLLM(ai_model)
+        return _local_models[key]
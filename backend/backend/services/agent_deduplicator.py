@@ -0,0 +1,112 @@
+from typing import List, Dict, Tuple, Any
+from ..entities.agent import Agent
+
+# The latent values are shown to the LLM rounded to one decimal (see `format_latent_value`), so
+# agents that are equal at this precision are indistinguishable in the prompts.
+LATENT_DECIMALS = 1
+
+
+def format_latent_value(value: Any, decimals: int = LATENT_DECIMALS) -> Any:
+    """Returns a latent variable value the way it is shown to the LLM. Decimal numbers are
+    rounded to `decimals` decimals, other values are kept as they are.
+
+    Args:
+        value: The value, e.g. 1.234 or "3".
+        decimals (int): The number of decimals.
+
+    Returns:
+        The value to be written into the prompt, e.g. 1.2.
+    """
+    if isinstance(value, float):
+        # Adding 0.0 turns a negative zero into a positive zero
+        return round(value, decimals) + 0.0
+    return value
+
+
+def latent_vector_key(
+    agent: Agent,
+    latent_variables: List[str],
+    future: bool = False,
+    decimals: int = LATENT_DECIMALS,
+) -> Tuple[Any, ...]:
+    """Returns the rounded latent variable values of an agent as a hashable tuple.
+
+    Args:
+        agent (Agent): An Agent object.
+        latent_variables (list): The labels of the latent variables. Sets the order of the values.
+        future (bool): Whether to use the future (True) or the original (False) latent variables.
+        decimals (int): The number of decimals the values are rounded to.
+
+    Returns:
+        tuple: The latent variable values. Values that are not numbers are kept as strings.
+    """
+    info = agent.get_agent_future_info() if future else agent.get_agent_info()
+    values = info.get("Answers", {})
+
+    key = []
+    for var_name in latent_variables:
+        value = values.get(var_name, "N/A")
+        try:
+            # Adding 0.0 turns a negative zero into a positive zero
+            key.append(round(float(value), decimals) + 0.0)
+        except (TypeError, ValueError):
+            key.append(str(value))
+
+    return tuple(key)
+
+
+def group_identical_agents(
+    agents: List[Agent],
+    latent_variables: List[str],
+    future: bool = False,
+    decimals: int = LATENT_DECIMALS,
+) -> List[List[Agent]]:
+    """Groups agents that have equal (rounded) latent variable values. The first agent of each
+    group is the representative of the group and the length of the group is its weight.
+
+    Args:
+        agents (list): A list of Agent objects.
+        latent_variables (list): The labels of the latent variables.
+        future (bool): Whether to group by the future (True) or the original (False) values.
+        decimals (int): The number of decimals the values are rounded to before comparing.
+
+    Returns:
+        list: The groups in the order of their first appearance in `agents`. An example:
+        [[<Agent 0>, <Agent 3>], [<Agent 1>], [<Agent 2>, <Agent 4>]]
+    """
+    groups: Dict[Tuple[Any, ...], List[Agent]] = {}
+    for agent in agents:
+        key = latent_vector_key(agent, latent_variables, future, decimals)
+        groups.setdefault(key, []).append(agent)
+
+    return list(groups.values())
+
+
+def get_representatives(groups: List[List[Agent]]) -> List[Agent]:
+    """Returns the representative (the first agent) of each group."""
+    return [group[0] for group in groups]
+
+
+def expand_group_responses(
+    responses: Dict[Agent, Dict[str, Any]], groups: List[List[Agent]]
+) -> Dict[Agent, Dict[str, Any]]:
+    """Copies the responses of the representatives to every member of their group.
+
+    Args:
+        responses (dict): The responses of the representative agents, keyed by the agent.
+        groups (list): The agent groups created by `group_identical_agents`.
+
+    Returns:
+        dict: The responses of all agents. Groups whose representative has no response are left
+        out.
+    """
+    expanded = {}
+    for group in groups:
+        representative = group[0]
+        if representative not in responses:
+            continue
+        for agent in group:
+            # Each agent gets its own copy, so that the answers can be modified separately
+            expanded[agent] = dict(responses[representative])
+
+    return expanded
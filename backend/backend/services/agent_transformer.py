@@ -1,7 +1,18 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 from token_count import TokenCount
 from ..llm_config import get_llm_connection
+from ..key_config import TRANSFORMATION_MODEL
 from ..entities.agent import Agent
+from .agent_deduplicator import (
+    format_latent_value,
+    latent_vector_key,
+    group_identical_agents,
+    get_representatives,
+)
+from .transformation_cache import TransformationCache
+from .hedged_llm import HedgedLLM
+from .cancellation import CancellationToken, RequestCancelled, cancellation_kwargs
+from .response_parser import parse_latent_values
 
 
 class AgentTransformer:
@@ -11,8 +22,35 @@ class AgentTransformer:
 
     Attributes:
         __llm: The LLM model. By default uses the model defined in the .env file.
+        deduplicate (bool): If True, agents with equal (rounded) latent variable values are
+            transformed only once and the new values are copied to all of them.
+        transformation_cache (TransformationCache): A persistent store of earlier
+            transformations. Agents whose transformation is found in the cache are not sent to
+            the LLM. None if no cache is used.
     """
 
+    # Change the version when the prompt changes, so that transformations made with the old
+    # prompt are not served from the transformation cache
+    PROMPT_VERSION = "3"
+
+    # Descriptive labels of the latent variables of the Gen Z food study, whose data file names
+    # the columns A-M. Other column names are shown to the LLM as they are.
+    LATENT_VARIABLE_LABELS = {
+        "A": "Future Awareness - Awareness of global agricultural challenges",
+        "B": "Perceived Individual Efficiency - Belief in personal impact on sustainability",
+        "C": "Perceived Collective Efficiency - Belief in societal changes for sustainability",
+        "D": "Advocacy and Career Intentions - Interest in sustainability careers",
+        "E": "Tech Orientation - Trust in food production technology",
+        "F": "Unwillingness to Change - Resistance to dietary changes",
+        "G": "Low Behavioral Activation - Perceived low impact of personal choices",
+        "H": "Social Support - Influence of peers on food choices",
+        "I": "Influencing Others - Encouraging sustainable choices",
+        "J": "Belief About Consequences - Impact of food choices on environment & health",
+        "K": "Emotions - Satisfaction and guilt related to sustainable food choices",
+        "L": "Food Preparation Skills - Ability to cook sustainable meals",
+        "M": "Green Purchase Intention - Commitment to buying sustainable food",
+    }
+
     INTRO_BEGINNING = """
 I have a survey about the views and opinions that young people have about food 
 and food production. The questions of the survey concerned sustainability, technology and 
@@ -29,8 +67,6 @@ future: this means you should change the latent variables for each of the respon
 and these changes should be based on the future scenario. I other words, you need to 
 infer how the views and opinions of the respondents would change, if the given future 
 scenario would actually take place.
-
-This is the future scenario:
 """
     FUTURE_SCENARIO = """
 In five years from now new technologies are developed to create cultured meat. This meat is grown 
@@ -39,30 +75,16 @@ production. Its climate impact is small, although still a little more than using
 choices. Its price is only a little above the price of traditionally produced meat. In a short time
 it becomes a very popular product with good availability.
 """
-    INTRO_END = """
-
+    LATENT_VARIABLES_BEGINNING = """
 These are the latent variables:
- - Future Awareness - Awareness of global agricultural challenges
- - Perceived Individual Efficiency - Belief in personal impact on sustainability
- - Perceived Collective Efficiency - Belief in societal changes for sustainability
- - Advocacy and Career Intentions - Interest in sustainability careers
- - Tech Orientation - Trust in food production technology
- - Unwillingness to Change - Resistance to dietary changes
- - Low Behavioral Activation - Perceived low impact of personal choices
- - Social Support - Influence of peers on food choices
- - Influencing Others - Encouraging sustainable choices
- - Belief About Consequences - Impact of food choices on environment & health
- - Emotions - Satisfaction and guilt related to sustainable food choices
- - Food Preparation Skills - Ability to cook sustainable meals
- - Green Purchase Intention - Commitment to buying sustainable food
-
-Next I will give you the values of the respondents for the latent variables. The latent variables 
-will be in the same order as in the previous listing.
-
+"""
+    INTRO_END = """
+After these instructions I will give you the future scenario and the values of the respondents for 
+the latent variables. The latent variables will be in the same order as in the previous listing.
 """
     PROMPT_END = """
-Now create the new latent values for the respondents. Give the values in the same order as they 
-were given previously. Before each respondent's values, include the text 'Respondent' and after that
+Create the new latent values for the respondents. Give the values in the same order as they 
+were given. Before each respondent's values, include the text 'Respondent' and after that
 the respondent's number. Here is an example, how the response could look like for the first two 
 respondents.
 
@@ -95,20 +117,42 @@ Respondent 2
 -0.5
 -0.8
 -1.1
+"""
+    SCENARIO_BEGINNING = """
+This is the future scenario:
+"""
+    VALUES_BEGINNING = """
+These are the values of the respondents for the latent variables:
 
-Give the new latent values for all of the respondents like in the previous example. Do not output 
+"""
+    PROMPT_CLOSING = """Give the new latent values for all of the respondents like in the example. Do not output 
 anything else.
 """
 
-    def __init__(self, llm: Any = get_llm_connection()) -> None:
+    def __init__(
+        self,
+        llm: Any = get_llm_connection(TRANSFORMATION_MODEL),
+        deduplicate: bool = True,
+        transformation_cache: Optional[TransformationCache] = None,
+    ) -> None:
         """Initializes the LLM connection.
 
         Args:
-            llm: The LLM model. By default uses the model defined in the .env file."""
+            llm: The LLM model. By default uses TRANSFORMATION_MODEL or the default model of the
+                provider defined in the .env file.
+            deduplicate (bool): Whether to transform agents with identical latent variables only
+                once. Defaults to True.
+            transformation_cache (TransformationCache): The cache of earlier transformations.
+                Defaults to None (no cache)."""
         self.__llm = llm
+        self.deduplicate = deduplicate
+        self.transformation_cache = transformation_cache
 
     def transform_agents_to_future(
-        self, agents: List[Agent], future_scenario: str
+        self,
+        agents: List[Agent],
+        future_scenario: str,
+        cancellation: Optional[CancellationToken] = None,
     ) -> bool:
         """
         Transforms agents to future. Takes a future scenario and a list of agent-objects as
@@ -120,11 +164,15 @@ anything else.
             agents (list): A list of agent-objects.
             future_scenario (str): A scenario by the user of the future. Maximum allowed length is
                 10000 tokens.
+            cancellation (CancellationToken, optional): The cancellation token of the request.
+                The LLM request is cancelled when it is cancelled, and the agents are not
+                modified.
 
         Returns:
             bool: **True** if future transformation was successful for all agents.
 
         Raises:
+            RequestCancelled: If the request is cancelled.
             RuntimeError: If future scenario is too long.
             RuntimeError: If an error occurs when asking a question from the LLM.
             RuntimeError: If an error occurs when parsing the response given by the LLM.
@@ -142,51 +190,146 @@ anything else.
         # Get the labels of the latent variables in a list
         latent_variables = self._get_latent_variables(agents[0])
 
-        prompt = self.create_prompt(agents, future_scenario, latent_variables)
+        # Agents with identical latent values are included in the prompt only once
+        if self.deduplicate:
+            groups = group_identical_agents(agents, latent_variables)
+        else:
+            groups = [[agent] for agent in agents]
+
+        # Groups whose transformation is found in the cache are not sent to the LLM
+        new_latent_variables, missing = self._get_cached_transformations(
+            groups, future_scenario, latent_variables
+        )
+
+        if missing:
+            unique_agents = get_representatives([groups[i] for i in missing])
+            if hasattr(self.__llm, "cache_prefix"):
+                # Explicit context caching of the instructions shared by all prompts
+                self.__llm.cache_prefix(self.create_prompt_prefix(latent_variables))
+            prompt = self.create_prompt(
+                unique_agents, future_scenario, latent_variables
+            )
 
-        try:
-            response = self.__llm.get_response(prompt)
-        except Exception as exc:
-            raise RuntimeError(
-                "Something went wrong when LLM was creating an answer"
-            ) from exc
+            kwargs = cancellation_kwargs(cancellation)
+            if isinstance(self.__llm, HedgedLLM):
+                # A response that cannot be parsed does not win the race of the providers
+                kwargs["is_valid"] = lambda response: self._parses(
+                    response, len(unique_agents), latent_variables
+                )
 
-        try:
-            new_latent_variables = self._parse_response(
-                response, len(agents), latent_variables
+            try:
+                response = self.__llm.get_response(prompt, **kwargs)
+            except RequestCancelled:
+                raise
+            except Exception as exc:
+                raise RuntimeError(
+                    "Something went wrong when LLM was creating an answer"
+                ) from exc
+
+            try:
+                parsed = self._parse_response(
+                    response, len(unique_agents), latent_variables
+                )
+            except Exception as exc:
+                msg = "Something went wrong while parsing the LLM's answer. "
+                msg += "Here are the first 200 characters of the LLM's response:\n"
+                msg += f"{response[0:200]}"
+                raise RuntimeError(msg) from exc
+
+            # In parsed the prompted agents are numbered beginning from 1
+            for number, group_index in enumerate(missing, start=1):
+                new_latent_variables[group_index + 1] = parsed[number]
+
+            self._save_transformations_to_cache(
+                unique_agents, parsed, future_scenario, latent_variables
             )
-        except Exception as exc:
-            msg = "Something went wrong while parsing the LLM's answer. "
-            msg += "Here are the first 200 characters of the LLM's response:\n"
-            msg += f"{response[0:200]}"
-            raise RuntimeError(msg) from exc
 
-        # Delete old questions and the latent variables based on the previous future scenario
+        # Delete the future answers and latent variables based on the previous future scenario.
+        # The answers of the original agents are kept.
         self._delete_old_variables_and_questions(agents)
-        self._save_new_variables_to_agents(new_latent_variables, agents)
+        self._save_new_variables_to_agents(new_latent_variables, groups)
 
         return True
 
+    def warm_up_cache(
+        self,
+        agents: List[Agent],
+        future_scenario: str = "default",
+        batch_size: int = 50,
+    ) -> int:
+        """Transforms the agents into the future scenario in batches, so that the
+        transformations are saved into the transformation cache. Agents with identical latent
+        variables are transformed only once. The given agents are modified.
+
+        Args:
+            agents (list): A list of agent-objects, e.g. the whole training data.
+            future_scenario (str): The future scenario. Defaults to the default scenario.
+            batch_size (int): The number of agents transformed with one prompt.
+
+        Returns:
+            int: The number of batches that could not be transformed.
+        """
+        if self.transformation_cache is None or not agents:
+            return 0
+
+        latent_variables = self._get_latent_variables(agents[0])
+        unique_agents = get_representatives(
+            group_identical_agents(agents, latent_variables)
+        )
+
+        failed = 0
+        for start in range(0, len(unique_agents), batch_size):
+            try:
+                self.transform_agents_to_future(
+                    unique_agents[start : start + batch_size], future_scenario
+                )
+            except RuntimeError:
+                failed += 1
+
+        return failed
+
     def create_prompt(
         self, agents: List[Agent], future_scenario: str, latent_variables: List[str]
     ) -> str:
-        """Creates a prompt that will ask the LLM to transform the agents into the future.
+        """Creates a prompt that will ask the LLM to transform the agents into the future. The
+        instructions come before the future scenario and the agents, so that every prompt starts
+        with the same prefix, which the LLM provider can cache.
 
         Args:
             agents (list): A list of agents.
             future_scenario (str): The future scenario given by the user.
             latent_variables (list): The labels of the latent variables.
         """
-        prompt = self.INTRO_BEGINNING
+        prompt = self.create_prompt_prefix(latent_variables)
+        prompt += self.SCENARIO_BEGINNING
         prompt += future_scenario
-        prompt += self.INTRO_END
-
-        # For now, the labels of the latent variables are hard coded into the prompt (in INTRO_END)
+        prompt += self.VALUES_BEGINNING
         prompt += self._add_agent_variable_values(agents, latent_variables)
-        prompt += self.PROMPT_END
+        prompt += self.PROMPT_CLOSING
 
         return prompt
 
+    def create_prompt_prefix(self, latent_variables: List[str]) -> str:
+        """Creates the part of the prompt that does not depend on the future scenario or the
+        agents.
+
+        Args:
+            latent_variables (list): The labels of the latent variables.
+        """
+        prefix = self.INTRO_BEGINNING
+        prefix += self.LATENT_VARIABLES_BEGINNING
+
+        # The labels of the latent variables are the column names of the training data (for SPSS
+        # files, the variable labels in the metadata), or the descriptive labels of the columns
+        # A-M of the Gen Z food study
+        for variable in latent_variables:
+            prefix += f" - {self.LATENT_VARIABLE_LABELS.get(variable, variable)}\n"
+
+        prefix += self.INTRO_END
+        prefix += self.PROMPT_END
+
+        return prefix
+
     def _get_latent_variables(self, agent: Agent) -> List[str]:
         """
         Takes an agent as an argument, searches its latent variables and returns the labels of the
@@ -228,9 +371,7 @@ anything else.
             # The order is set in the latent_variables -variable
             for var_name in latent_variables:
                 value = agent_info["Answers"].get(var_name, "N/A")
-                if isinstance(value, float):
-                    value = round(value, 1)
-                prompt += f"{value}\n"
+                prompt += f"{format_latent_value(value)}\n"
 
             prompt += "\n"
         return prompt
@@ -239,7 +380,8 @@ anything else.
         self, response: str, number_of_agents: int, latent_variables: List[str]
     ) -> Dict[int, Dict[str, Any]]:
         """Parses the future transformation response by the LLM and stores the new latent variables
-        into a dictionary.
+        into a dictionary. The values are matched to the respondents by the respondent numbers,
+        so the order of the respondents does not matter.
 
         Args:
             response (str): Response by the LLM.
@@ -252,94 +394,100 @@ anything else.
 
         Raises:
             RuntimeError: If the LLM gives an id number, that does not match the id number of any
-                saved agent.
-            TypeError: If a latent variable given by the LLM cannot be converted to a float.
-            RuntimeError: If, for some agent, the LLM gives more latent variable values that there
-                were latent variables.
-            RuntimeError: If, for some agent, the LLM gives less latent variable values that there
-                were latent variables.
-            RuntimeError: If the LLM did not give new latent variable values for all agents, or gave
-                them for more agents than exists.
+                saved agent, or gives the values of an agent twice.
+            RuntimeError: If, for some agent, the LLM gives more or fewer latent variable values
+                than there are latent variables.
         """
-        new_latent_values = {i: {} for i in range(1, number_of_agents + 1)}
-
-        response = response.split("Respondent")
-        response = [values.split("\n") for values in response]
-
-        agent_id = 0
-        for value_list in response:
-            # Line breaks in the response can create lists with empty strings: ['', ''].
-            # Skip these.
-            if self._only_empty_strings_in_a_list(value_list):
-                continue
-
-            latent_value_number = 0
-            first_value = True
-
-            for entry in value_list:
-                # Line breaks create empty strings: ''. Skip these.
-                if entry == "":
-                    continue
-
-                # The first value should be the id number of the agent (respondent)
-                if first_value:
-                    # Check that agent_id matches the id of any agent
-                    if entry.find(str(agent_id)):
-                        agent_id += 1
-                        first_value = False
-                        continue
-                    # Raise error if the first value was not the expected agent id
-                    raise RuntimeError(
-                        "Agent id numbers did not match when parsing LLM response"
-                    )
-
-                # Check that the value is a real number
-                try:
-                    float(entry)
-                except ValueError as exc:
-                    raise TypeError(
-                        f"A value for a latent variable was not a real number. The value was {entry}"
-                    ) from exc
-
-                # Check that the LLM did not give too many values. The number of values must not be
-                # greater than the number of latent variables.
-                if latent_value_number >= len(latent_variables):
-                    raise RuntimeError("Too many new latent values were being added")
-                latent_variable = latent_variables[latent_value_number]
-                latent_value_number += 1
-
-                # Add the latent variable into the dictionary
-                new_latent_values[agent_id][latent_variable] = entry
-
-            # Check that all latent variables got a value
-            number_given = len(new_latent_values[agent_id])
-
-            if number_given != len(latent_variables):
-                raise RuntimeError(
-                    f"Agent number {agent_id} got too few new latent variables. "
-                    f"It got {number_given}."
-                )
+        values = parse_latent_values(response, number_of_agents, len(latent_variables))
 
-        # Check that all agents got the new latent values
-        if agent_id != number_of_agents:
-            error = (
-                "An incorrect number of agents got new latent variables. There were ",
-                f"{number_of_agents} agents, but {agent_id} got new values",
-            )
-            raise RuntimeError(error)
+        return {
+            number: dict(zip(latent_variables, row))
+            for number, row in enumerate(values.tolist(), start=1)
+        }
 
-        return new_latent_values
+    def _parses(
+        self, response: str, number_of_agents: int, latent_variables: List[str]
+    ) -> bool:
+        """Returns True if the response can be parsed with `_parse_response`."""
+        try:
+            self._parse_response(response, number_of_agents, latent_variables)
+        except Exception:
+            return False
+        return True
 
-    def _only_empty_strings_in_a_list(self, list_to_check: List[str]) -> bool:
-        """Checks whether a list contains only empty string. Returns True if it does and False
-        otherwise."""
-        only_empty_strings = True
-        for value in list_to_check:
-            if value != "":
-                only_empty_strings = False
-                return only_empty_strings
+    def _get_cached_transformations(
+        self,
+        groups: List[List[Agent]],
+        future_scenario: str,
+        latent_variables: List[str],
+    ) -> Tuple[Dict[int, Dict[str, Any]], List[int]]:
+        """Looks up the new latent variables of the agent groups from the transformation cache.
 
-        return only_empty_strings
+        Args:
+            groups (list): The agent groups.
+            future_scenario (str): The future scenario.
+            latent_variables (list): The labels of the latent variables.
+
+        Returns:
+            Tuple: (new latent variables of the groups found in the cache, numbered beginning
+            from 1 like in `_parse_response`, indexes of the groups not found in the cache)
+        """
+        if self.transformation_cache is None:
+            return {}, list(range(len(groups)))
+
+        # A hedged LLM may have transformed the agents with any of its providers
+        if isinstance(self.__llm, HedgedLLM):
+            models = self.__llm.models
+        else:
+            models = [self._get_model_name()]
+        found = {}
+        missing = []
+
+        for i, group in enumerate(groups):
+            latent_key = latent_vector_key(group[0], latent_variables)
+            new_values = None
+            for model in models:
+                new_values = self.transformation_cache.get(
+                    future_scenario, latent_key, model, self.PROMPT_VERSION
+                )
+                if new_values is not None:
+                    break
+            if new_values is None:
+                missing.append(i)
+            else:
+                found[i + 1] = new_values
+
+        return found, missing
+
+    def _save_transformations_to_cache(
+        self,
+        agents: List[Agent],
+        new_latent_variables: Dict[int, Dict[str, Any]],
+        future_scenario: str,
+        latent_variables: List[str],
+    ) -> None:
+        """Saves the new latent variables of the prompted agents into the transformation cache,
+        if it is in use."""
+        if self.transformation_cache is None:
+            return
+
+        # Saved under the model that gave the response
+        if isinstance(self.__llm, HedgedLLM):
+            model = self.__llm.get_answering_model()
+        else:
+            model = self._get_model_name()
+        for i, agent in enumerate(agents):
+            self.transformation_cache.set(
+                future_scenario,
+                latent_vector_key(agent, latent_variables),
+                model,
+                self.PROMPT_VERSION,
+                new_latent_variables[i + 1],
+            )
+
+    def _get_model_name(self) -> str:
+        """Returns the name of the used LLM model."""
+        return str(getattr(self.__llm, "model", type(self.__llm).__name__))
 
     def future_variables_exist(self, agents: List[Agent]) -> bool:
         """Checks if the first agent in the list has future latent variable values already set."""
@@ -348,24 +496,29 @@ anything else.
         return False
 
     def _delete_old_variables_and_questions(self, agents: List[Agent]) -> None:
-        """Deletes the all questions, anwers and future latent variables from the Agent-objects.
-        Only the original latent variables and demographic information are left intact.
+        """Deletes the future answers and future latent variables from the Agent-objects. The
+        original latent variables, demographic information and the answers of the original agents
+        are left intact, so the original agents do not have to be asked again.
         """
         for agent in agents:
-            agent.delete_future_info_and_questions()
+            agent.delete_future_info_and_future_questions()
 
     def _save_new_variables_to_agents(
-        self, new_latent_variables: Dict[int, Dict[str, Any]], agents: List[Agent]
+        self, new_latent_variables: Dict[int, Dict[str, Any]], groups: List[List[Agent]]
     ) -> None:
-        """Saves the created latent variables into the Agent-objects.
+        """Saves the created latent variables into the Agent-objects. Every agent in a group gets
+        the new latent variables of the group.
 
         Args:
-            new_latent_variables (dict): The new latent variables for the agents in a dictionary.
-            agents (list): The Agent-objects in a list.
+            new_latent_variables (dict): The new latent variables for the groups in a dictionary.
+            groups (list): The Agent-objects grouped by their latent variable values.
         """
-        for i, agent in enumerate(agents):
-            # In new_latent_variables the agents are numbered beginning from 1.
-            agent.save_new_future_latent_variables(new_latent_variables[i + 1])
+        for i, group in enumerate(groups):
+            for agent in group:
+                # In new_latent_variables the groups are numbered beginning from 1.
+                agent.save_new_future_latent_variables(
+                    dict(new_latent_variables[i + 1])
+                )
 
     def count_token_length(self, text: str) -> int:
         """Calculates the number of tokens in a given text.
@@ -378,3 +531,19 @@ anything else.
         tc = TokenCount(model_name="gpt-4o")
         tokens = tc.num_tokens_from_string(text)
         return tokens
+
+
+if __name__ == "__main__":
+    from ..key_config import CSV_FILE_PATH, TRANSFORMATION_CACHE_PATH
+    from .training_data import TrainingData, dataframe_to_agents
+
+    if not TRANSFORMATION_CACHE_PATH:
+        raise SystemExit("Set TRANSFORMATION_CACHE_PATH in the .env file")
+
+    # Transforms the whole training data into the default scenario, so that the
+    # transformations of the default scenario are served from the cache
+    training_agents = dataframe_to_agents(TrainingData(CSV_FILE_PATH).to_dataframe())
+    failed = AgentTransformer(
+        transformation_cache=TransformationCache(TRANSFORMATION_CACHE_PATH)
+    ).warm_up_cache(training_agents)
+    print(f"Warmed up {TRANSFORMATION_CACHE_PATH}, {failed} batches failed")
@@ -0,0 +1,121 @@
+import json
+import re
+import sqlite3
+import threading
+from typing import Tuple, Dict, Any, Optional
+
+
+class AnswerCache:
+    """A persistent store for the Likert answers of agents. An answer depends only on the agent's
+    latent variable values, the statement and the used model and prompt, so these form the key.
+
+    Attributes:
+        hits (int): The number of answers found in the cache.
+        misses (int): The number of answers not found in the cache.
+    """
+
+    def __init__(self, path: str = ":memory:") -> None:
+        """Opens (and creates if needed) the SQLite database of the cache.
+
+        Args:
+            path (str): The path of the database file. Defaults to an in-memory database.
+        """
+        self.__connection = sqlite3.connect(path, check_same_thread=False)
+        self.__lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        with self.__lock, self.__connection:
+            self.__connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS answers (
+                    latent_values TEXT,
+                    question TEXT,
+                    model TEXT,
+                    prompt_version TEXT,
+                    answer INTEGER,
+                    PRIMARY KEY (latent_values, question, model, prompt_version)
+                )
+                """
+            )
+
+    def get(
+        self,
+        latent_key: Tuple[Any, ...],
+        question: str,
+        model: str,
+        prompt_version: str,
+    ) -> Optional[int]:
+        """Returns the cached answer or None if there is no answer for the key.
+
+        Args:
+            latent_key (tuple): The rounded latent variable values of the agent.
+            question (str): The statement.
+            model (str): The name of the LLM model.
+            prompt_version (str): The version of the prompt.
+        """
+        with self.__lock:
+            row = self.__connection.execute(
+                "SELECT answer FROM answers WHERE latent_values = ? AND question = ? "
+                "AND model = ? AND prompt_version = ?",
+                self._key(latent_key, question, model, prompt_version),
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            return row[0]
+
+    def set(
+        self,
+        latent_key: Tuple[Any, ...],
+        question: str,
+        model: str,
+        prompt_version: str,
+        answer: int,
+    ) -> None:
+        """Saves an answer into the cache. An existing answer for the key is kept.
+
+        Args:
+            latent_key (tuple): The rounded latent variable values of the agent.
+            question (str): The statement.
+            model (str): The name of the LLM model.
+            prompt_version (str): The version of the prompt.
+            answer (int): The Likert answer.
+        """
+        with self.__lock, self.__connection:
+            self.__connection.execute(
+                "INSERT OR IGNORE INTO answers VALUES (?, ?, ?, ?, ?)",
+                self._key(latent_key, question, model, prompt_version) + (answer,),
+            )
+
+    def get_statistics(self) -> Dict[str, float]:
+        """Returns the number of cache hits and misses and the hit rate."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def _key(
+        self,
+        latent_key: Tuple[Any, ...],
+        question: str,
+        model: str,
+        prompt_version: str,
+    ) -> Tuple[str, str, str, str]:
+        """Returns the database key for the given values."""
+        return (
+            json.dumps(list(latent_key)),
+            normalize_question(question),
+            model,
+            prompt_version,
+        )
+
+
+def normalize_question(question: str) -> str:
+    """Normalizes a statement for comparison: lowercase, with extra whitespace removed."""
+    return re.sub(r"\s+", " ", question).strip().lower()
@@ -0,0 +1,153 @@
+import select
+import socket
+import time
+from concurrent.futures import Future, CancelledError, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, Optional
+
+# How often (seconds) a waiting request checks whether it has been cancelled
+POLL_INTERVAL = 0.2
+
+
+class RequestCancelled(Exception):
+    """Raised when the work of a request is abandoned, because the client disconnected or the
+    deadline of the request passed."""
+
+
+class CancellationToken:
+    """Tells the work started by one HTTP request when it should stop. The request is cancelled
+    when `cancel` is called, when its deadline passes or when `is_disconnected` returns True.
+
+    The token is passed from the Flask view through the LLM handler and the agent transformer to
+    the providers, which cancel their pending futures when the token is cancelled. The running
+    asyncio tasks are cancelled with them, so their HTTP requests are closed and stop using the
+    worker and the rate limit.
+    """
+
+    def __init__(
+        self,
+        timeout: Optional[float] = None,
+        is_disconnected: Optional[Callable[[], bool]] = None,
+        clock: Callable[[], float] = time.monotonic,
+        parent: Optional["CancellationToken"] = None,
+    ) -> None:
+        """Constructor for CancellationToken.
+
+        Args:
+            timeout (float, optional): The number of seconds the request may take. Defaults to
+                **None** (no deadline).
+            is_disconnected (callable, optional): Returns True if the client has disconnected.
+            clock (callable): Returns the current time in seconds.
+            parent (CancellationToken, optional): A token whose cancellation cancels this token
+                too. Defaults to **None**.
+        """
+        self.__clock = clock
+        self.deadline = clock() + timeout if timeout is not None else None
+        self.__is_disconnected = is_disconnected
+        self.__parent = parent
+        self.__cancelled = False
+        self.reason = None
+
+    def child(self) -> "CancellationToken":
+        """Returns a token that is cancelled with this one, but can also be cancelled alone,
+        e.g. to stop one of several requests sent for the same work."""
+        return CancellationToken(clock=self.__clock, parent=self)
+
+    def cancel(self, reason: str = "The request was cancelled") -> None:
+        """Cancels the request."""
+        if not self.__cancelled:
+            self.__cancelled = True
+            self.reason = reason
+
+    def is_cancelled(self) -> bool:
+        """Returns True if the work of the request should stop."""
+        if self.__cancelled:
+            return True
+        if self.__parent is not None and self.__parent.is_cancelled():
+            self.cancel(self.__parent.reason)
+        elif self.deadline is not None and self.__clock() >= self.deadline:
+            self.cancel("The deadline of the request passed")
+        elif self.__is_disconnected is not None and self.__is_disconnected():
+            self.cancel("The client disconnected")
+        return self.__cancelled
+
+    def remaining(self) -> Optional[float]:
+        """Returns the number of seconds until the deadline, or None if there is no deadline.
+        The deadline of the parent token is the deadline of this token too."""
+        remaining = (
+            max(self.deadline - self.__clock(), 0.0)
+            if self.deadline is not None
+            else None
+        )
+        if self.__parent is not None:
+            parent_remaining = self.__parent.remaining()
+            if remaining is None or (
+                parent_remaining is not None and parent_remaining < remaining
+            ):
+                remaining = parent_remaining
+        return remaining
+
+    def raise_if_cancelled(self) -> None:
+        """Raises RequestCancelled if the request has been cancelled."""
+        if self.is_cancelled():
+            raise RequestCancelled(self.reason)
+
+
+def cancellation_kwargs(cancellation: Optional[CancellationToken]) -> Dict[str, Any]:
+    """Returns the keyword arguments that pass the token to an LLM provider. The token is passed
+    only if there is one, so that providers and test doubles without the `cancellation`
+    parameter keep working when no token is used."""
+    return {"cancellation": cancellation} if cancellation is not None else {}
+
+
+def wait_for(future: Future, cancellation: Optional[CancellationToken] = None) -> Any:
+    """Waits for the result of a future. If the request is cancelled while waiting, the future is
+    cancelled and RequestCancelled is raised. Cancelling a future from
+    `asyncio.run_coroutine_threadsafe` cancels the coroutine in the event loop as well.
+
+    Args:
+        future (Future): A concurrent.futures future.
+        cancellation (CancellationToken, optional): The cancellation token of the request.
+
+    Returns:
+        The result of the future.
+
+    Raises:
+        RequestCancelled: If the request is cancelled before the future is done.
+    """
+    if cancellation is None:
+        return future.result()
+
+    while True:
+        if cancellation.is_cancelled():
+            future.cancel()
+            raise RequestCancelled(cancellation.reason)
+
+        remaining = cancellation.remaining()
+        timeout = POLL_INTERVAL if remaining is None else min(POLL_INTERVAL, remaining)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            continue
+        except CancelledError as exc:
+            raise RequestCancelled(cancellation.reason) from exc
+
+
+def socket_disconnected(sock: Any) -> bool:
+    """Returns True if the peer of a connected socket has closed the connection. The socket is
+    polled without blocking and peeked, so data that has not been read is left in place.
+
+    Args:
+        sock: The socket of the client connection, or None if the server does not expose it.
+    """
+    if sock is None:
+        return False
+
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+        if not readable:
+            return False
+        # A closed connection is readable, but there is nothing to read
+        return sock.recv(1, socket.MSG_PEEK) == b""
+    except (OSError, ValueError):
+        # The socket has been closed or reset
+        return True
@@ -0,0 +1,108 @@
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from .get_data import LIKERT_LABELS, statistics_from_counts
+
+# The index of each Likert answer in a row of counts
+LEVEL_INDEX = {str(level): level - 1 for level in range(1, len(LIKERT_LABELS) + 1)}
+
+
+class DistributionCounts:
+    """Running counts of the agents' answers on each Likert level, one row per question, for
+    the current and the future agents. The counts are updated by
+    `LlmHandler.save_responses_to_agents` as the answers are saved, so the distributions can be
+    returned without going through the agents. Like `GetData.get_all_distributions`, only the
+    first answer of each agent to a question is counted.
+    """
+
+    def __init__(self) -> None:
+        # {future: {question: [count of 1s, count of 2s, ..., count of 5s]}}
+        self.__counts = {False: {}, True: {}}
+
+    @classmethod
+    def from_agents(cls, agents: Iterable[Any]) -> "DistributionCounts":
+        """Counts the first answers that have already been saved into the agents.
+
+        Args:
+            agents (iterable): The agents.
+
+        Returns:
+            DistributionCounts: The counts.
+        """
+        counts = cls()
+        for agent in agents:
+            for future, answers in (
+                (False, agent.questions),
+                (True, agent.future_questions),
+            ):
+                for question, answer_list in answers.items():
+                    if answer_list:
+                        counts.add(question, answer_list[0], future=future)
+        return counts
+
+    def copy(self) -> "DistributionCounts":
+        """Returns a copy that can be updated without changing these counts."""
+        copy = DistributionCounts()
+        for future, questions in self.__counts.items():
+            copy.__counts[future] = {
+                question: list(row) for question, row in questions.items()
+            }
+        return copy
+
+    def add(self, question: str, answer: Any, future: bool = False) -> None:
+        """Counts the first answer of an agent to a question. Answers that are not Likert levels
+        1-5 are not counted, but the question is added.
+
+        Args:
+            question (str): The question.
+            answer: The answer, e.g. 4 or "4".
+            future (bool): True if the answer is given by a future agent.
+        """
+        row = self.__counts[future].get(question)
+        if row is None:
+            row = self.__counts[future][question] = [0] * len(LIKERT_LABELS)
+
+        index = LEVEL_INDEX.get(str(answer))
+        if index is not None:
+            row[index] += 1
+
+    def get_counts(self, question: str, future: bool = False) -> Optional[np.ndarray]:
+        """Returns the counts of a question on the Likert levels 1-5, or None if the question has
+        not been answered."""
+        row = self.__counts[future].get(question)
+        return np.array(row) if row is not None else None
+
+    def get_distributions(self, future: bool = False) -> List[Dict[str, Any]]:
+        """Returns the distributions of all questions in the same form as
+        `GetData.get_answer_distributions`. The statistics are calculated from the counts, so
+        the time taken depends only on the number of questions.
+
+        Args:
+            future (bool): True for the future agents, False for the current agents.
+
+        Returns:
+            list: The distributions in the order the questions were first answered.
+        """
+        distributions = []
+        for question, row in self.__counts[future].items():
+            distributions.append(
+                {
+                    "question": question,
+                    "data": [
+                        {"label": label, "value": value}
+                        for label, value in zip(LIKERT_LABELS, row)
+                    ],
+                    "statistics": statistics_from_counts(np.array(row)),
+                }
+            )
+        return distributions
+
+    def get_all_distributions(
+        self,
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Returns both current and future distributions. If there are no future answers, the
+        future distributions is an empty list.
+
+        Returns:
+            Tuple: (current_distributions, future_distributions)
+        """
+        return self.get_distributions(), self.get_distributions(future=True)
@@ -1,6 +1,23 @@
 import asyncio
+import datetime
+import re
 import threading
-from typing import List, Any
+import time
+from typing import List, Dict, Any, Tuple, Optional
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+from .cancellation import CancellationToken, RequestCancelled, wait_for
+
+# A cached prefix is not used during the last minute of its lifetime, so that no request refers
+# to cached content that has expired by the time it reaches Gemini
+CACHE_EXPIRY_MARGIN = 60.0
+
+# Gemini creates cached content only for a prefix of at least this many tokens, and only for a
+# model name with a version suffix such as "gemini-1.5-flash-002". Shorter prefixes and
+# unversioned models are not sent to be cached at all; they rely on Gemini's implicit caching.
+MIN_CACHED_TOKENS = 32768
+CHARS_PER_TOKEN = 4
+VERSIONED_MODEL = re.compile(r"-\d{3}$")
 
 
 class Gemini:
@@ -13,6 +30,20 @@ class Gemini:
 
     def __init__(self, ai_model: Any) -> None:
         self.__ai_model = ai_model
+        self.model = getattr(ai_model, "model_name", "gemini")
+        # Set to False if the model rejects the candidate_count generation parameter. Not locked:
+        # the flag only changes from True to False, so at worst a concurrent request still sends
+        # the parameter once more and falls back in the same way.
+        self.candidate_count_supported = True
+        # Cached prompt prefixes: (the model that uses the cached content or None if caching
+        # failed, the time.monotonic() after which the entry is not used)
+        self.__cached_prefixes: Dict[str, Tuple[Any, float]] = {}
+        # Prefixes whose cached content is being created by some thread
+        self.__caching_prefixes = set()
+        self.__cache_lock = threading.Lock()
+        self.__usage_lock = threading.Lock()
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
         self.loop = asyncio.new_event_loop()  # Create a persistent event loop
         self.thread = threading.Thread(target=self._start_event_loop, daemon=True)
         self.thread.start()  # Start the loop in a separate thread
@@ -22,31 +53,169 @@ class Gemini:
         asyncio.set_event_loop(self.loop)
         self.loop.run_forever()  # Keep the loop running
 
-    def get_response(self, prompt: str) -> str:
+    def get_response(
+        self, prompt: str, cancellation: Optional[CancellationToken] = None
+    ) -> str:
         """
         Returns a response to the given prompt generated by Gemini. This method allows
         only stateless conversation, meaning Gemini will not remember your previous
         queries.
+
+        If a cancellation token is given, the request is sent from the event loop, so that it
+        can be cancelled when the token is cancelled.
         """
-        response = self.__ai_model.generate_content(prompt)
+        if cancellation is not None:
+            future = asyncio.run_coroutine_threadsafe(
+                self._generate_answer(prompt), self.loop
+            )
+            return wait_for(future, cancellation)
+
+        model, content = self._model_for(prompt)
+        try:
+            response = model.generate_content(content)
+        except (google_exceptions.NotFound, google_exceptions.PermissionDenied):
+            if model is self.__ai_model:
+                raise
+            # The cached content has been deleted: send the whole prompt
+            self._forget_cached_model(model)
+            response = self.__ai_model.generate_content(prompt)
+        self._record_usage(response)
         return response.text
 
-    def get_parallel_responses(self, prompts: List[str]) -> str:
+    def cache_prefix(self, prefix: str, ttl_minutes: int = 60) -> bool:
+        """Stores a prompt prefix as Gemini cached content. The following prompts that start with
+        the prefix send only the rest of the prompt, and the cached tokens are billed at a lower
+        rate. Gemini caches explicitly only prefixes of at least `MIN_CACHED_TOKENS` tokens for
+        a versioned model, so the prompts of this application usually rely on implicit caching
+        only. If caching is not possible or fails, the prompts are sent in full as before.
+
+        The cached content expires after `ttl_minutes`. After that the prompts are sent in full
+        until the prefix is cached again by the next call. The cached content is created once
+        even if several threads call this at the same time; the other threads send their
+        prompts in full while it is being created.
+
+        Args:
+            prefix (str): The static beginning of the prompts.
+            ttl_minutes (int): How long the cached content is kept.
+
+        Returns:
+            bool: True if the prefix is cached.
+        """
+        if not self._can_cache(prefix):
+            return False
+
+        with self.__cache_lock:
+            model, expires_at = self.__cached_prefixes.get(prefix, (None, 0.0))
+            if time.monotonic() < expires_at or prefix in self.__caching_prefixes:
+                return model is not None
+            self.__caching_prefixes.add(prefix)
+
+        try:
+            cached_content = genai.caching.CachedContent.create(
+                model=self.model,
+                contents=[prefix],
+                ttl=datetime.timedelta(minutes=ttl_minutes),
+            )
+            model = genai.GenerativeModel.from_cached_content(cached_content)
+        except Exception:
+            # Caching is tried again when the entry expires
+            model = None
+
+        with self.__cache_lock:
+            self.__cached_prefixes[prefix] = (
+                model,
+                time.monotonic() + ttl_minutes * 60 - CACHE_EXPIRY_MARGIN,
+            )
+            self.__caching_prefixes.discard(prefix)
+        return model is not None
+
+    def _can_cache(self, prefix: str) -> bool:
+        """Returns True if Gemini can create cached content for the prefix: the model name has
+        a version suffix and the prefix is estimated to have at least `MIN_CACHED_TOKENS`
+        tokens."""
+        return (
+            VERSIONED_MODEL.search(self.model) is not None
+            and len(prefix) / CHARS_PER_TOKEN >= MIN_CACHED_TOKENS
+        )
+
+    def get_cache_statistics(self) -> Dict[str, float]:
+        """Returns the number of prompt tokens, the number of them read from the cache and the
+        hit rate."""
+        return {
+            "prompt tokens": self.prompt_tokens,
+            "cached tokens": self.cached_tokens,
+            "hit rate": (
+                self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+            ),
+        }
+
+    def _model_for(self, prompt: str) -> Tuple[Any, str]:
+        """Returns the model for a prompt and the content to send: the model of the cached
+        prefix and the rest of the prompt, if the prompt starts with a prefix whose cached
+        content has not expired."""
+        now = time.monotonic()
+        with self.__cache_lock:
+            for prefix, (model, expires_at) in self.__cached_prefixes.items():
+                if model is not None and now < expires_at and prompt.startswith(prefix):
+                    return model, prompt[len(prefix) :]
+        return self.__ai_model, prompt
+
+    def _forget_cached_model(self, model: Any) -> None:
+        """Stops using a cached prefix whose cached content Gemini no longer has. The prefix is
+        cached again by the next call to `cache_prefix`."""
+        with self.__cache_lock:
+            for prefix, (cached_model, _) in list(self.__cached_prefixes.items()):
+                if cached_model is model:
+                    del self.__cached_prefixes[prefix]
+
+    async def _generate_content_async(self, prompt: str, **kwargs: Any) -> Any:
+        """Sends a prompt with the cached prefix left out, if there is one. If Gemini no longer
+        has the cached content, the whole prompt is sent instead."""
+        model, content = self._model_for(prompt)
+        try:
+            response = await model.generate_content_async(content, **kwargs)
+        except (google_exceptions.NotFound, google_exceptions.PermissionDenied):
+            if model is self.__ai_model:
+                raise
+            self._forget_cached_model(model)
+            response = await self.__ai_model.generate_content_async(prompt, **kwargs)
+        self._record_usage(response)
+        return response
+
+    def _record_usage(self, response: Any) -> None:
+        """Adds the token counts of a response to the usage statistics."""
+        usage = getattr(response, "usage_metadata", None)
+        if usage is None:
+            return
+        with self.__usage_lock:
+            self.prompt_tokens += getattr(usage, "prompt_token_count", 0) or 0
+            self.cached_tokens += getattr(usage, "cached_content_token_count", 0) or 0
+
+    def get_parallel_responses(
+        self, prompts: List[str], cancellation: Optional[CancellationToken] = None
+    ) -> str:
         """Send multiple prompts to Gemini in parallel.
 
         Args:
             list: A list of prompts.
+            cancellation (CancellationToken, optional): The cancellation token of the request.
+                The pending requests are cancelled when it is cancelled.
 
         Returns:
             list: A list of responses by Gemini or if an error occurs, returns the error
-            message."""
+            message.
+
+        Raises:
+            RequestCancelled: If the request is cancelled."""
 
         try:
             future = asyncio.run_coroutine_threadsafe(
                 self._create_responses(prompts), self.loop
             )
-            response = future.result()  # Wait for the result
+            response = wait_for(future, cancellation)  # Wait for the result
             response = self._format_response(response)
+        except RequestCancelled:
+            raise
         except Exception as e:
             if str(e).startswith("429 Resource has been exhausted"):
                 return f"## Error\n\nError message: {e}\n\nYou probably exceeded the 15 requests per minute limit for the API-key"
@@ -54,6 +223,37 @@ class Gemini:
 
         return response
 
+    def get_parallel_multiple_responses(
+        self,
+        prompts: List[str],
+        n: int,
+        cancellation: Optional[CancellationToken] = None,
+    ) -> List[List[str]]:
+        """Send multiple prompts to Gemini in parallel and get `n` alternative responses
+        (candidates) for each of them.
+
+        Args:
+            prompts (list): A list of prompts.
+            n (int): The number of responses per prompt.
+            cancellation (CancellationToken, optional): The cancellation token of the request.
+
+        Returns:
+            list: A list of responses for each prompt or an empty list if an error occurs.
+
+        Raises:
+            RequestCancelled: If the request is cancelled.
+        """
+
+        try:
+            future = asyncio.run_coroutine_threadsafe(
+                self._create_multiple_responses(prompts, n), self.loop
+            )
+            return wait_for(future, cancellation)
+        except RequestCancelled:
+            raise
+        except Exception:
+            return []
+
     async def _create_responses(self, prompts: List[str]) -> List[str]:
         """Create the asyncio tasks and run them concurrently."""
         tasks = [self._generate_answer(prompt) for prompt in prompts]
@@ -63,9 +263,40 @@ class Gemini:
 
     async def _generate_answer(self, prompt: str) -> str:
         """Send a single text prompt to the API and return the response."""
-        response = await self.__ai_model.generate_content_async(prompt)
+        response = await self._generate_content_async(prompt)
         return response.text
 
+    async def _create_multiple_responses(
+        self, prompts: List[str], n: int
+    ) -> List[List[str]]:
+        """Create the asyncio tasks for multiple candidates and run them concurrently."""
+        tasks = [self._generate_candidates(prompt, n) for prompt in prompts]
+        results = await asyncio.gather(*tasks)
+
+        return results
+
+    async def _generate_candidates(self, prompt: str, n: int) -> List[str]:
+        """Request `n` candidates to a prompt in one request. If the model does not support
+        multiple candidates, send `n` separate requests instead. Other errors, e.g. rate limits
+        and network errors, are raised and do not disable multiple candidates."""
+        if self.candidate_count_supported and n > 1:
+            try:
+                response = await self._generate_content_async(
+                    prompt, generation_config={"candidate_count": n}
+                )
+                return [
+                    "".join(part.text for part in candidate.content.parts)
+                    for candidate in response.candidates
+                ]
+            except google_exceptions.InvalidArgument as error:
+                if "candidate" not in str(error).lower():
+                    raise
+                # The model rejects the parameter: ask for the candidates one by one
+                self.candidate_count_supported = False
+
+        tasks = [self._generate_answer(prompt) for _ in range(n)]
+        return list(await asyncio.gather(*tasks))
+
     def _format_response(self, responses: List[str]) -> str:
         """Turns the response to markdown text and returns it."""
         text = ""
@@ -1,5 +1,10 @@
-from statistics import mode, median
+from statistics import mode, median, NormalDist
 from typing import Tuple, Dict, List, Any
+import numpy as np
+from .training_data import age_band
+
+LIKERT_LEVELS = np.arange(1, 6)
+LIKERT_LABELS = ["Strongly Disagree", "Disagree", "Neutral", "Agree", "Strongly Agree"]
 
 
 class GetData:
@@ -94,6 +99,260 @@ class GetData:
         distribution = add_statistics(distribution)
         return distribution
 
+    def get_all_repeated_distributions(
+        self, agents: List[Any], confidence: float = 0.95
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Returns both current and future distributions computed over all the repeated answers of
+        the agents. If there are no future agents, the future distributions is an empty list.
+
+        Args:
+            agents (list): List of Agent objects
+            confidence (float): The confidence level of the confidence intervals (default 0.95)
+
+        Returns:
+            Tuple: (current_distributions, future_distributions)
+        """
+        current = self.get_repeated_distributions(agents, confidence=confidence)
+
+        if agents and agents[0].future_questions:
+            future = self.get_repeated_distributions(
+                agents, future=True, confidence=confidence
+            )
+        else:
+            future = []
+
+        return current, future
+
+    def get_repeated_distributions(
+        self, agents: List[Any], future: bool = False, confidence: float = 0.95
+    ) -> List[Dict[str, Any]]:
+        """Returns the answer distributions over all repetitions of each question. The value of
+        each Likert level is the mean count per repetition and it has a confidence interval. The
+        statistics are calculated from the answers of all repetitions.
+
+        Args:
+            agents (list): A list of agents
+            future (boolean): True if future agents, false if not
+            confidence (float): The confidence level of the confidence intervals
+
+        Returns:
+            distributions (list): A list of dictionaries. An example of one distribution:
+                {
+                    "question": "I like pasta",
+                    "data": [
+                        {"label": "Strongly Disagree", "value": 1.5,
+                         "confidence interval": [0.5, 2.5]},
+                        ...
+                    ],
+                    "statistics": {
+                        "median": 3, "mode": 2, "variation ratio": 0.7,
+                        "mean": 3.1, "mean confidence interval": [2.9, 3.3],
+                        "repetitions": 4
+                    }
+                }
+        """
+        distributions = []
+        agent = agents[0]
+        questions = agent.future_questions if future else agent.questions
+
+        for question in dict.fromkeys(question for question, _ in questions.items()):
+            matrix = answer_matrix(agents, question, future=future)
+            counts = repetition_counts(matrix)
+
+            count_mean, count_half = mean_confidence_interval(counts, confidence)
+            answer_mean, answer_half = mean_confidence_interval(
+                repetition_means(counts), confidence
+            )
+
+            statistics = statistics_from_counts(counts.sum(axis=0))
+            statistics["mean"] = float(answer_mean)
+            statistics["mean confidence interval"] = [
+                float(answer_mean - answer_half),
+                float(answer_mean + answer_half),
+            ]
+            statistics["repetitions"] = int(counts.shape[0])
+
+            distributions.append(
+                {
+                    "question": question,
+                    "data": [
+                        {
+                            "label": label,
+                            "value": float(value),
+                            "confidence interval": [
+                                float(value - half),
+                                float(value + half),
+                            ],
+                        }
+                        for label, value, half in zip(
+                            LIKERT_LABELS, count_mean, count_half
+                        )
+                    ],
+                    "statistics": statistics,
+                }
+            )
+
+        return distributions
+
+    def get_all_expected_distributions(
+        self, agents: List[Any]
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Returns both current and future expected distributions calculated from the agents'
+        answer probabilities. If there are no future agents, the future distributions is an empty
+        list.
+
+        Args:
+            agents (list): List of Agent objects
+
+        Returns:
+            Tuple: (current_distributions, future_distributions)
+        """
+        current = self.get_expected_distributions(agents)
+
+        if agents and agents[0].future_answer_probabilities:
+            future = self.get_expected_distributions(agents, future=True)
+        else:
+            future = []
+
+        return current, future
+
+    def get_expected_distributions(
+        self, agents: List[Any], future: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Returns the expected answer distributions. The value of each Likert level is the sum
+        of the agents' probabilities for that level.
+
+        Args:
+            agents (list): A list of agents
+            future (boolean): True if future agents, false if not
+
+        Returns:
+            distributions (list): A list of dictionaries in the same form as
+            `get_answer_distributions` gives. The statistics also include the expected mean.
+        """
+        distributions = []
+        agent = agents[0]
+        probabilities = (
+            agent.future_answer_probabilities if future else agent.answer_probabilities
+        )
+
+        for question in probabilities:
+            expected = probability_matrix(agents, question, future=future).sum(axis=0)
+
+            distributions.append(
+                {
+                    "question": question,
+                    "data": [
+                        {"label": label, "value": float(value)}
+                        for label, value in zip(LIKERT_LABELS, expected)
+                    ],
+                    "statistics": expected_statistics(expected),
+                }
+            )
+
+        return distributions
+
+    def get_all_segmented_distributions(
+        self, agents: List[Any], segment_by: str, index: int = 0
+    ) -> List[Dict[str, Any]]:
+        """
+        Returns the current and future distributions separately for each segment of the agents,
+        e.g. for each gender. The answers of all segments are counted in one grouped bincount, so
+        segmenting costs about the same as one whole-population distribution. If there are no
+        future agents, the future distributions of each segment are an empty list.
+
+        Args:
+            agents (list): List of Agent objects
+            segment_by (str): "Gender", "Age" (segments by ten-year age bands) or the name of
+                another categorical column of the training data
+            index (int): Which index of responses to use (default 0)
+
+        Returns:
+            list: A dictionary for each segment in the order of the segment labels, e.g.
+                {
+                    "segment": "Female",
+                    "agents": 12,
+                    "distributions": [...],
+                    "future_distributions": [...]
+                }
+            The distributions are in the same form as `get_answer_distributions` gives.
+
+        Raises:
+            ValueError: If the agents do not have the column or it is not categorical.
+        """
+        if not agents:
+            return []
+
+        segments, groups = np.unique(
+            segment_labels(agents, segment_by), return_inverse=True
+        )
+        sizes = np.bincount(groups, minlength=len(segments))
+
+        current = self.get_segmented_distributions(agents, groups, len(segments), index)
+        if agents[0].future_questions:
+            future = self.get_segmented_distributions(
+                agents, groups, len(segments), index, future=True
+            )
+        else:
+            future = [[] for _ in segments]
+
+        return [
+            {
+                "segment": str(segment),
+                "agents": int(size),
+                "distributions": current_distributions,
+                "future_distributions": future_distributions,
+            }
+            for segment, size, current_distributions, future_distributions in zip(
+                segments, sizes, current, future
+            )
+        ]
+
+    def get_segmented_distributions(
+        self,
+        agents: List[Any],
+        groups: np.ndarray,
+        number_of_groups: int,
+        index: int = 0,
+        future: bool = False,
+    ) -> List[List[Dict[str, Any]]]:
+        """Returns the answer distributions of each group of agents.
+
+        Args:
+            agents (list): A list of agents
+            groups (np.ndarray): The group number (0, 1, ...) of each agent
+            number_of_groups (int): The number of groups
+            index (int): Index number
+            future (boolean): True if future agents, false if not
+
+        Returns:
+            list: The distributions of each group in the same form as `get_answer_distributions`
+            gives.
+        """
+        agent = agents[0]
+        questions = list(
+            dict.fromkeys(agent.future_questions if future else agent.questions)
+        )
+        matrix = first_answer_matrix(agents, questions, index, future=future)
+        counts = grouped_counts(matrix, groups, number_of_groups)
+
+        return [
+            [
+                {
+                    "question": question,
+                    "data": [
+                        {"label": label, "value": int(value)}
+                        for label, value in zip(LIKERT_LABELS, group_counts[j])
+                    ],
+                    "statistics": statistics_from_counts(group_counts[j]),
+                }
+                for j, question in enumerate(questions)
+            ]
+            for group_counts in counts
+        ]
+
     def _convert_to_frontend_form(
         self, distributions: List[Dict[str, Any]]
     ) -> List[Dict[str, Any]]:
@@ -181,3 +440,241 @@ def calculate_variation_ratio(data: List[int]) -> float:
     mode_observations = data.count(moodi)
     total_observations = len(data)
     return 1 - (mode_observations / total_observations)
+
+
+def answer_matrix(agents: List[Any], question: str, future: bool = False) -> np.ndarray:
+    """Collects all repeated answers of the agents to a question into a matrix.
+
+    Args:
+        agents (list): A list of agents
+        question (str): The question
+        future (boolean): True if future agents, false if not
+
+    Returns:
+        np.ndarray: An integer matrix of shape (agents, repetitions). Missing answers are 0.
+    """
+    answer_lists = []
+    for agent in agents:
+        answers_dict = agent.future_questions if future else agent.questions
+        answer_lists.append(answers_dict.get(question, []))
+
+    repetitions = max((len(answers) for answers in answer_lists), default=0)
+    matrix = np.zeros((len(agents), repetitions), dtype=np.int64)
+    for i, answers in enumerate(answer_lists):
+        for j, answer in enumerate(answers):
+            if str(answer).isdigit():
+                matrix[i, j] = int(answer)
+
+    return matrix
+
+
+def first_answer_matrix(
+    agents: List[Any], questions: List[str], index: int = 0, future: bool = False
+) -> np.ndarray:
+    """Collects the answers of the agents to the questions into a matrix.
+
+    Args:
+        agents (list): A list of agents
+        questions (list): The questions
+        index (int): Which index of responses to use
+        future (boolean): True if future agents, false if not
+
+    Returns:
+        np.ndarray: An integer matrix of shape (agents, questions). Missing answers are 0.
+    """
+    rows = []
+    for agent in agents:
+        answers_dict = agent.future_questions if future else agent.questions
+        row = []
+        for question in questions:
+            answers = answers_dict.get(question, ())
+            answer = str(answers[index]) if len(answers) > index else ""
+            row.append(int(answer) if answer.isdigit() else 0)
+        rows.append(row)
+
+    return np.array(rows, dtype=np.int64).reshape(len(agents), len(questions))
+
+
+def grouped_counts(
+    matrix: np.ndarray, groups: np.ndarray, number_of_groups: int
+) -> np.ndarray:
+    """Counts the answers of each group of agents to each question on every Likert level with
+    one bincount.
+
+    Args:
+        matrix (np.ndarray): The answers in a matrix of shape (agents, questions).
+        groups (np.ndarray): The group number (0, 1, ...) of each agent.
+        number_of_groups (int): The number of groups.
+
+    Returns:
+        np.ndarray: The counts in an array of shape (groups, questions, 5).
+    """
+    levels = len(LIKERT_LEVELS)
+    number_of_questions = matrix.shape[1]
+    valid = (matrix >= 1) & (matrix <= levels)
+
+    # The position of each answer in the flattened (groups, questions, levels) array
+    keys = (
+        np.asarray(groups)[:, np.newaxis] * number_of_questions
+        + np.arange(number_of_questions)
+    ) * levels + (matrix - 1)
+
+    return np.bincount(
+        keys[valid], minlength=number_of_groups * number_of_questions * levels
+    ).reshape(number_of_groups, number_of_questions, levels)
+
+
+def segment_labels(agents: List[Any], segment_by: str) -> List[str]:
+    """Returns the segment of each agent.
+
+    Args:
+        agents (list): A list of agents
+        segment_by (str): "Gender", "Age" (segments by ten-year age bands) or the name of
+            another categorical column of the training data
+
+    Returns:
+        list: The segment labels. Agents without a value are in the segment "unknown".
+
+    Raises:
+        ValueError: If no agent has the column or it contains fractional numbers, which are not
+            categories. Whole numbers, e.g. 1.0, are labelled like integers ("1").
+    """
+    if segment_by == "Age":
+        return [age_band(agent.get_agent_info().get("Age")) for agent in agents]
+
+    if segment_by == "Gender":
+        values = [agent.get_agent_info().get("Gender") for agent in agents]
+    else:
+        values = [
+            agent.get_agent_info().get("Answers", {}).get(segment_by, None)
+            for agent in agents
+        ]
+        if all(value is None for value in values):
+            raise ValueError(f"The agents do not have the column '{segment_by}'")
+
+    labels = []
+    for value in values:
+        if value is None or (isinstance(value, float) and np.isnan(value)):
+            labels.append("unknown")
+        elif isinstance(value, float):
+            if not value.is_integer():
+                raise ValueError(f"The column '{segment_by}' is not categorical")
+            # Codes read as floats, e.g. 1.0, are the categories 1, 2, ...
+            labels.append(str(int(value)))
+        else:
+            labels.append(str(value))
+    return labels
+
+
+def repetition_counts(matrix: np.ndarray) -> np.ndarray:
+    """Counts the answers of each repetition on every Likert level in one pass.
+
+    Args:
+        matrix (np.ndarray): The answers in a matrix of shape (agents, repetitions).
+
+    Returns:
+        np.ndarray: The counts in a matrix of shape (repetitions, 5).
+    """
+    return (matrix[:, :, np.newaxis] == LIKERT_LEVELS).sum(axis=0)
+
+
+def repetition_means(counts: np.ndarray) -> np.ndarray:
+    """Returns the mean Likert answer of each repetition. Repetitions without answers get the
+    value NaN."""
+    totals = counts.sum(axis=-1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (counts * LIKERT_LEVELS).sum(axis=-1) / totals
+
+
+def mean_confidence_interval(
+    samples: np.ndarray, confidence: float = 0.95
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Returns the mean of the samples along the first axis and the half width of its
+    confidence interval using the normal approximation. NaN samples are ignored.
+
+    Args:
+        samples (np.ndarray): The samples, one row per repetition.
+        confidence (float): The confidence level.
+
+    Returns:
+        Tuple: (mean, half width). The half width is infinite if there are fewer than two samples.
+    """
+    samples = np.asarray(samples, dtype=float)
+    valid = ~np.isnan(samples)
+    n = valid.sum(axis=0)
+    mean = np.where(n > 0, np.nansum(samples, axis=0) / np.maximum(n, 1), np.nan)
+
+    squared = np.where(valid, (samples - mean) ** 2, 0.0).sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        std = np.sqrt(squared / (n - 1))
+        half = NormalDist().inv_cdf((1 + confidence) / 2) * std / np.sqrt(n)
+    half = np.where(n > 1, half, np.inf)
+
+    return mean, half
+
+
+def statistics_from_counts(counts: np.ndarray) -> Dict[str, Any]:
+    """Returns the median, mode and variation ratio of a distribution given as counts per Likert
+    level. Gives the same results as `add_statistics`."""
+    total = int(counts.sum())
+    if total == 0:
+        return {"median": 0, "mode": 0, "variation ratio": 0}
+
+    cumulative = np.cumsum(counts)
+    lower, upper = np.searchsorted(
+        cumulative, [(total - 1) // 2, total // 2], side="right"
+    )
+    if total % 2 == 1:
+        median_value = int(LIKERT_LEVELS[upper])
+    else:
+        median_value = float(LIKERT_LEVELS[lower] + LIKERT_LEVELS[upper]) / 2
+
+    mode_index = int(np.argmax(counts))
+    return {
+        "median": median_value,
+        "mode": int(LIKERT_LEVELS[mode_index]),
+        "variation ratio": 1 - (int(counts[mode_index]) / total),
+    }
+
+
+def probability_matrix(
+    agents: List[Any], question: str, future: bool = False
+) -> np.ndarray:
+    """Collects the agents' Likert level probabilities for a question into a matrix. If an
+    agent has several probability vectors for the question, their mean is used.
+
+    Args:
+        agents (list): A list of agents
+        question (str): The question
+        future (boolean): True if future agents, false if not
+
+    Returns:
+        np.ndarray: A matrix of shape (agents, 5). Agents without probabilities have zero rows.
+    """
+    matrix = np.zeros((len(agents), len(LIKERT_LEVELS)))
+    for i, agent in enumerate(agents):
+        probabilities = (
+            agent.future_answer_probabilities if future else agent.answer_probabilities
+        )
+        vectors = probabilities.get(question)
+        if vectors:
+            matrix[i] = np.mean(vectors, axis=0)
+
+    return matrix
+
+
+def expected_statistics(expected: np.ndarray) -> Dict[str, Any]:
+    """Returns the median, mode, variation ratio and mean of an expected distribution, where
+    the counts of the Likert levels can be fractional."""
+    total = float(expected.sum())
+    if total == 0:
+        return {"median": 0, "mode": 0, "variation ratio": 0, "mean": 0}
+
+    median_index = int(np.searchsorted(np.cumsum(expected), total / 2))
+    mode_index = int(np.argmax(expected))
+    return {
+        "median": int(LIKERT_LEVELS[min(median_index, len(LIKERT_LEVELS) - 1)]),
+        "mode": int(LIKERT_LEVELS[mode_index]),
+        "variation ratio": 1 - float(expected[mode_index]) / total,
+        "mean": float((expected * LIKERT_LEVELS).sum() / total),
+    }
@@ -0,0 +1,384 @@
+import statistics
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Dict, Any, Callable, Optional
+from .cancellation import CancellationToken, RequestCancelled, POLL_INTERVAL
+
+# Fallback hedging delay (seconds) until enough latencies have been observed for a p95 estimate
+DEFAULT_HEDGE_DELAY = 10.0
+MIN_LATENCY_SAMPLES = 20
+
+
+class CircuitBreaker:
+    """Stops sending requests to a provider that keeps failing. After `failure_threshold`
+    consecutive failures the circuit opens and the provider is skipped. After `reset_timeout`
+    seconds one trial request is let through (half-open); a success closes the circuit again and
+    a failure keeps it open for another `reset_timeout`.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 3,
+        reset_timeout: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Constructor for CircuitBreaker.
+
+        Args:
+            failure_threshold (int): The number of consecutive failures that opens the circuit.
+            reset_timeout (float): The number of seconds the circuit stays open.
+            clock (callable): Returns the current time in seconds.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.__clock = clock
+        self.__lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+
+    def allow_request(self) -> bool:
+        """Returns True if a request may be sent to the provider."""
+        with self.__lock:
+            if self.opened_at is None:
+                return True
+            if self.__clock() - self.opened_at >= self.reset_timeout:
+                # Half-open: let one trial request through and wait for its outcome
+                self.opened_at = self.__clock()
+                return True
+            return False
+
+    def record_success(self) -> None:
+        """Closes the circuit."""
+        with self.__lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self) -> None:
+        """Counts a failure and opens the circuit if there have been too many in a row."""
+        with self.__lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = self.__clock()
+
+    def is_open(self) -> bool:
+        """Returns True if the provider is currently being skipped."""
+        with self.__lock:
+            return (
+                self.opened_at is not None
+                and self.__clock() - self.opened_at < self.reset_timeout
+            )
+
+
+def is_valid_response(response: Any) -> bool:
+    """Returns False for the error values the providers return instead of raising: error
+    messages and empty lists."""
+    if isinstance(response, str):
+        return not (response.startswith("OpenAI Error") or "## Error" in response)
+    if isinstance(response, list):
+        return len(response) > 0
+    return response is not None
+
+
+class HedgedLLM:
+    """Sends each request to the primary provider and, if it has not answered within the hedging
+    delay, a duplicate request to the next provider. The first valid response is returned and
+    the other requests are cancelled. A response is valid if it is not an error and, when the
+    caller gives an `is_valid` check (e.g. that the response can be parsed), passes the check.
+    Providers that keep failing are skipped by a circuit breaker.
+
+    Each request gets a cancellation token of its own, a child of the caller's token, and the
+    tokens of the slower requests are cancelled when a response has been accepted. The providers
+    then cancel their pending HTTP requests, so the slower requests do not keep running.
+
+    Has the same interface as the _Gemini_ and _OpenAI_ classes, so it can be used in their place.
+    The responses of the providers differ, so the answers must be cached under the model that
+    gave them: `get_answering_model` returns the model of the last response of the calling
+    thread.
+
+    Attributes:
+        model (str): The model of the primary provider.
+        models (list): The models of all providers in the order of preference.
+    """
+
+    def __init__(
+        self,
+        providers: List[Any],
+        hedge_delay: Optional[float] = None,
+        is_valid: Callable[[Any], bool] = is_valid_response,
+        failure_threshold: int = 3,
+        reset_timeout: float = 30.0,
+        max_concurrent_requests: int = 32,
+    ) -> None:
+        """Constructor for HedgedLLM.
+
+        Args:
+            providers (list): The LLM providers in the order of preference.
+            hedge_delay (float, optional): The number of seconds to wait for a provider before
+                hedging to the next one. Defaults to **None**, when the p95 latency of the recent
+                successful requests is used.
+            is_valid (callable): Returns True if a response is not an error.
+            failure_threshold (int): The number of consecutive failures that opens a circuit.
+            reset_timeout (float): The number of seconds a provider is skipped after its circuit
+                opens.
+            max_concurrent_requests (int): The number of callers that may wait for a response
+                at the same time, e.g. the number of worker threads of the server. Each caller
+                may have a request to every provider running.
+        """
+        if not providers:
+            raise ValueError("At least one provider is required")
+
+        self.providers = providers
+        self.hedge_delay = hedge_delay
+        self.is_valid = is_valid
+        self.breakers = [
+            CircuitBreaker(failure_threshold, reset_timeout) for _ in providers
+        ]
+        self.models = [
+            str(getattr(provider, "model", type(provider).__name__))
+            for provider in providers
+        ]
+        self.model = self.models[0]
+        self.__answered = threading.local()
+        self.__latencies = deque(maxlen=200)
+        self.__executor = ThreadPoolExecutor(
+            max_workers=max_concurrent_requests * len(providers)
+        )
+
+    def get_response(
+        self,
+        prompt: str,
+        cancellation: Optional[CancellationToken] = None,
+        is_valid: Optional[Callable[[str], bool]] = None,
+    ) -> str:
+        return self._hedged_call(
+            "get_response", prompt, cancellation=cancellation, is_valid=is_valid
+        )
+
+    def get_parallel_responses(
+        self,
+        prompts: List[str],
+        cancellation: Optional[CancellationToken] = None,
+        is_valid: Optional[Callable[[List[str]], bool]] = None,
+    ) -> str:
+        return self._hedged_call(
+            "get_parallel_responses",
+            prompts,
+            cancellation=cancellation,
+            is_valid=is_valid,
+        )
+
+    def get_parallel_multiple_responses(
+        self,
+        prompts: List[str],
+        n: int,
+        cancellation: Optional[CancellationToken] = None,
+        is_valid: Optional[Callable[[List[List[str]]], bool]] = None,
+    ) -> List[List[str]]:
+        return self._hedged_call(
+            "get_parallel_multiple_responses",
+            prompts,
+            n,
+            cancellation=cancellation,
+            is_valid=is_valid,
+        )
+
+    def get_parallel_token_logprobs(
+        self,
+        prompts: List[str],
+        top_logprobs: int = 5,
+        cancellation: Optional[CancellationToken] = None,
+    ):
+        return self._hedged_call(
+            "get_parallel_token_logprobs",
+            prompts,
+            top_logprobs,
+            cancellation=cancellation,
+        )
+
+    def cache_prefix(self, prefix: str) -> None:
+        """Caches a prompt prefix in the providers that support explicit context caching."""
+        for provider in self.providers:
+            if hasattr(provider, "cache_prefix"):
+                provider.cache_prefix(prefix)
+
+    def get_cache_statistics(self) -> Dict[str, float]:
+        """Returns the prompt cache statistics summed over the providers."""
+        statistics_list = [
+            provider.get_cache_statistics()
+            for provider in self.providers
+            if hasattr(provider, "get_cache_statistics")
+        ]
+        prompt_tokens = sum(stats["prompt tokens"] for stats in statistics_list)
+        cached_tokens = sum(stats["cached tokens"] for stats in statistics_list)
+        return {
+            "prompt tokens": prompt_tokens,
+            "cached tokens": cached_tokens,
+            "hit rate": cached_tokens / prompt_tokens if prompt_tokens else 0.0,
+        }
+
+    def get_answering_model(self) -> str:
+        """Returns the model of the provider that gave the last response to the calling thread,
+        or the model of the primary provider if no response has been given."""
+        return getattr(self.__answered, "model", self.model)
+
+    def get_hedge_delay(self) -> float:
+        """Returns the current hedging delay: the configured delay or the p95 latency of the
+        recent successful requests."""
+        if self.hedge_delay is not None:
+            return self.hedge_delay
+        latencies = list(self.__latencies)
+        if len(latencies) < MIN_LATENCY_SAMPLES:
+            return DEFAULT_HEDGE_DELAY
+        return statistics.quantiles(latencies, n=20)[-1]
+
+    def _hedged_call(
+        self,
+        method: str,
+        *args: Any,
+        cancellation: Optional[CancellationToken] = None,
+        is_valid: Optional[Callable[[Any], bool]] = None,
+    ) -> Any:
+        """Calls `method` of the providers with hedging and returns the first valid response.
+        The model of the provider that gave it is recorded for `get_answering_model`.
+
+        If every provider fails, the last invalid response is returned, or the last exception
+        is raised, in the same way as a single provider would do. Each request to a provider is
+        given a child of the cancellation token, so the requests that lose are cancelled, and no
+        more duplicates are sent after the token is cancelled.
+
+        Args:
+            method (str): The name of the method of the providers.
+            *args: The arguments of the method.
+            cancellation (CancellationToken, optional): The cancellation token of the request.
+            is_valid (callable, optional): Returns True if a response can be used, e.g. if it
+                can be parsed. Checked after the responses that are errors have been rejected.
+
+        Raises:
+            ValueError: If no provider has the method.
+            RequestCancelled: If the request is cancelled.
+        """
+        candidates = [
+            index
+            for index, provider in enumerate(self.providers)
+            if hasattr(provider, method)
+        ]
+        if not candidates:
+            raise ValueError(f"No LLM provider supports {method}")
+
+        queue = list(candidates)
+        pending = {}
+        last_result = None
+        last_index = None
+        last_exception = None
+        hedge_at = 0.0
+        # The providers with an open circuit are skipped, unless all of them are open
+        check_breakers = True
+
+        def start_next() -> bool:
+            """Sends the request to the next provider whose circuit allows it. The circuit is
+            checked only now, so that a half-open provider spends its trial request only when
+            the request is really sent."""
+            nonlocal hedge_at
+            while queue:
+                index = queue.pop(0)
+                if check_breakers and not self.breakers[index].allow_request():
+                    continue
+                token = (
+                    cancellation.child()
+                    if cancellation is not None
+                    else CancellationToken()
+                )
+                future = self.__executor.submit(
+                    self._timed_call,
+                    self.providers[index],
+                    method,
+                    args,
+                    token,
+                    time.monotonic(),
+                )
+                pending[future] = (index, token)
+                hedge_at = time.monotonic() + self.get_hedge_delay()
+                return True
+            return False
+
+        if not start_next():
+            check_breakers = False
+            queue.extend(candidates)
+            start_next()
+
+        while pending:
+            timeout = max(hedge_at - time.monotonic(), 0.0) if queue else None
+            if cancellation is not None:
+                # Wake up regularly to notice the cancellation
+                timeout = min(timeout, POLL_INTERVAL) if queue else POLL_INTERVAL
+            done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+
+            if cancellation is not None and cancellation.is_cancelled():
+                self._abandon(pending, cancellation.reason)
+                raise RequestCancelled(cancellation.reason)
+
+            if not done:
+                if queue and time.monotonic() >= hedge_at:
+                    # The slowest requests are in the tail: send a duplicate to the next provider
+                    start_next()
+                continue
+
+            for future in done:
+                index, _ = pending.pop(future)
+                try:
+                    result, latency = future.result()
+                except RequestCancelled as error:
+                    self._abandon(pending, str(error))
+                    raise
+                except Exception as exc:
+                    last_exception = exc
+                    self.breakers[index].record_failure()
+                    continue
+
+                if self.is_valid(result) and (is_valid is None or is_valid(result)):
+                    self.breakers[index].record_success()
+                    self.__latencies.append(latency)
+                    self._abandon(pending)
+                    self.__answered.model = self.models[index]
+                    return result
+
+                last_result = result
+                last_index = index
+                self.breakers[index].record_failure()
+
+            if not pending and queue:
+                # Every started request failed: fail over to the next provider immediately
+                start_next()
+
+        if last_result is None and last_exception is not None:
+            raise last_exception
+        if last_index is not None:
+            self.__answered.model = self.models[last_index]
+        return last_result
+
+    def _timed_call(
+        self,
+        provider: Any,
+        method: str,
+        args: tuple,
+        cancellation: CancellationToken,
+        submitted: float,
+    ) -> tuple:
+        """Calls the provider and returns its response with the latency in seconds. The latency
+        is counted from the submission, so the time spent waiting for a free thread is included.
+        """
+        result = getattr(provider, method)(*args, cancellation=cancellation)
+        return result, time.monotonic() - submitted
+
+    def _abandon(
+        self, pending: dict, reason: str = "Another provider answered first"
+    ) -> None:
+        """Cancels the requests that are still pending. The requests that have not started are
+        not sent, and the tokens of the running ones are cancelled, so the providers cancel their
+        HTTP requests."""
+        for future, (_, token) in pending.items():
+            future.cancel()
+            token.cancel(reason)
+        pending.clear()
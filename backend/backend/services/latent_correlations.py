@@ -0,0 +1,223 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+import numpy as np
+from ..entities.population import Population
+from .get_data import LIKERT_LEVELS, first_answer_matrix
+from .surrogate_model import latent_matrix
+
+METHODS = ("spearman", "pearson")
+
+
+class LatentCorrelations:
+    """Relates the agents' latent variable values to their answers: the correlation of each
+    latent variable with the answers to each question, for the current and the future agents.
+    Populations are not modified after they are published, so the results are cached by the
+    version of the population and calculated again only when a new version is published.
+
+    Attributes:
+        max_versions (int): The number of (version, method) results kept in the cache.
+    """
+
+    def __init__(self, max_versions: int = 8) -> None:
+        self.max_versions = max_versions
+        self.__cache = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get_correlations(
+        self, population: Population, method: str = "spearman"
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Returns the correlations of the population, from the cache if they have been
+        calculated for its version.
+
+        Args:
+            population (Population): The agents.
+            method (str): "spearman" for the rank correlation, which suits the ordinal answers,
+                or "pearson".
+
+        Returns:
+            Tuple: (current_correlations, future_correlations) in the form
+            `get_all_correlations` gives.
+
+        Raises:
+            ValueError: If the method is unknown.
+        """
+        if method not in METHODS:
+            raise ValueError(f"'method' must be one of {', '.join(METHODS)}")
+
+        key = (population.version, method)
+        with self.__lock:
+            if key in self.__cache:
+                self.__cache.move_to_end(key)
+                return self.__cache[key]
+
+        # Calculated without the lock, so that other versions can be served meanwhile
+        correlations = get_all_correlations(population.agents, method)
+
+        with self.__lock:
+            self.__cache[key] = correlations
+            while len(self.__cache) > self.max_versions:
+                self.__cache.popitem(last=False)
+        return correlations
+
+
+def get_all_correlations(
+    agents: List[Any], method: str = "spearman"
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Returns the correlations of the latent variables with the answers of the current agents
+    and, if the agents have been transformed to the future, of the future agents. The future
+    answers are related to the future latent variable values.
+
+    Args:
+        agents (list): List of Agent objects
+        method (str): "spearman" or "pearson"
+
+    Returns:
+        Tuple: (current_correlations, future_correlations). The future correlations are an empty
+        list if there are no future agents. An example of the correlations of one question:
+            {
+                "question": "I like pasta",
+                "agents": 50,
+                "correlations": [
+                    {"variable": "Future Awareness", "value": 0.42},
+                    ...
+                ]
+            }
+        A correlation is None if it cannot be calculated, e.g. every agent gave the same answer.
+    """
+    if not agents:
+        return [], []
+
+    # The latent variables are the numeric values of the training data. Integer-coded columns
+    # are stored as strings by `dataframe_to_agents`, so the values are converted like in
+    # `latent_matrix`.
+    variables = [
+        variable
+        for variable, value in agents[0].get_agent_info().get("Answers", {}).items()
+        if _is_number(value)
+    ]
+
+    current = _correlations(agents, variables, method)
+    future = []
+    if agents[0].future_questions and agents[0].get_agent_future_info().get("Answers"):
+        future = _correlations(agents, variables, method, future=True)
+
+    return current, future
+
+
+def _is_number(value: Any) -> bool:
+    """Returns True if the value can be converted into a number."""
+    try:
+        float(value)
+    except (TypeError, ValueError):
+        return False
+    return True
+
+
+def _correlations(
+    agents: List[Any], variables: List[str], method: str, future: bool = False
+) -> List[Dict[str, Any]]:
+    agent = agents[0]
+    questions = list(
+        dict.fromkeys(agent.future_questions if future else agent.questions)
+    )
+    X = latent_matrix(agents, variables, future=future)
+    Y = first_answer_matrix(agents, questions, future=future)
+
+    correlations, counts = latent_answer_correlations(X, Y, method)
+
+    return [
+        {
+            "question": question,
+            "agents": int(counts[j]),
+            "correlations": [
+                {
+                    "variable": variable,
+                    "value": (
+                        None
+                        if np.isnan(correlations[i, j])
+                        else float(correlations[i, j])
+                    ),
+                }
+                for i, variable in enumerate(variables)
+            ],
+        }
+        for j, question in enumerate(questions)
+    ]
+
+
+def latent_answer_correlations(
+    X: np.ndarray, Y: np.ndarray, method: str = "spearman"
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Correlates every latent variable with the answers to every question. The sums needed
+    by all the correlations are calculated with three matrix products. Agents without an answer
+    to a question are left out of the correlations of that question.
+
+    With the method "spearman", the values are replaced by their average ranks before the
+    correlations are calculated. The latent values are ranked among all agents and the answers
+    among the agents that answered, so with missing answers the result approximates the
+    Spearman correlation.
+
+    Args:
+        X (np.ndarray): The latent variable values, shape (agents, variables).
+        Y (np.ndarray): The answers, shape (agents, questions). Missing answers are 0.
+        method (str): "spearman" or "pearson".
+
+    Returns:
+        Tuple: (the correlations, shape (variables, questions), the number of agents that
+        answered each question). Correlations that cannot be calculated are NaN.
+    """
+    valid = ((Y >= 1) & (Y <= len(LIKERT_LEVELS))).astype(float)
+    X = np.asarray(X, dtype=float)
+    Y = np.asarray(Y, dtype=float)
+
+    if method == "spearman":
+        X = average_ranks(X)
+        Y = answer_ranks(Y.astype(np.int64), valid.astype(bool))
+
+    # Centering does not change the correlations, but keeps the sums small
+    X = X - X.mean(axis=0) if len(X) else X
+    Y = np.where(valid > 0, Y - LIKERT_LEVELS.mean(), 0.0)
+
+    n = valid.sum(axis=0)
+    sum_x = X.T @ valid
+    sum_xx = (X * X).T @ valid
+    sum_xy = X.T @ Y
+    sum_y = Y.sum(axis=0)
+    sum_yy = (Y * Y).sum(axis=0)
+
+    covariance = n * sum_xy - sum_x * sum_y
+    variance_x = n * sum_xx - sum_x**2
+    variance_y = n * sum_yy - sum_y**2
+    with np.errstate(invalid="ignore", divide="ignore"):
+        correlations = covariance / np.sqrt(variance_x * variance_y)
+    # Constant values have no correlation
+    correlations[~(variance_x * variance_y > 1e-12)] = np.nan
+
+    return np.clip(correlations, -1, 1), n.astype(np.int64)
+
+
+def average_ranks(X: np.ndarray) -> np.ndarray:
+    """Returns the ranks (1, 2, ...) of the values in each column. Equal values get their
+    average rank."""
+    ranks = np.empty_like(X, dtype=float)
+    for j in range(X.shape[1]):
+        _, inverse, counts = np.unique(X[:, j], return_inverse=True, return_counts=True)
+        ranks[:, j] = (np.cumsum(counts) - (counts - 1) / 2)[inverse]
+    return ranks
+
+
+def answer_ranks(Y: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    """Returns the average ranks of the answers to each question among the agents that
+    answered. Since the answers are Likert levels, the ranks are calculated from the counts of
+    the levels. Missing answers get the rank 0."""
+    levels = len(LIKERT_LEVELS)
+    number_of_questions = Y.shape[1]
+    keys = np.arange(number_of_questions) * levels + (Y - 1)
+
+    counts = np.bincount(keys[valid], minlength=number_of_questions * levels).reshape(
+        number_of_questions, levels
+    )
+    level_ranks = np.cumsum(counts, axis=1) - (counts - 1) / 2
+
+    return np.where(valid, level_ranks.ravel()[np.where(valid, keys, 0)], 0.0)
@@ -1,24 +1,86 @@
-from typing import List, Dict, Any, Optional
+import math
+import re
+import threading
+import numpy as np
+from typing import List, Dict, Any, Callable, Optional, Tuple
 from ..llm_config import get_llm_connection
+from ..key_config import ANSWER_MODEL, ESCALATION_MODEL
 from ..entities.agent import Agent
 from ..services.agent_transformer import AgentTransformer
+from ..services.get_data import (
+    answer_matrix,
+    repetition_counts,
+    repetition_means,
+    mean_confidence_interval,
+)
+from ..services.answer_cache import AnswerCache
+from ..services.hedged_llm import HedgedLLM
+from ..services.cancellation import CancellationToken, cancellation_kwargs
+from ..services.distribution_counts import DistributionCounts
+from ..services.response_parser import parse_likert_answers
+from ..services.surrogate_model import (
+    OrdinalRegression,
+    latent_matrix,
+    select_diverse,
+    uncertainty,
+)
+from ..services.agent_deduplicator import (
+    format_latent_value,
+    latent_vector_key,
+    group_identical_agents,
+    get_representatives,
+    expand_group_responses,
+)
+
+LIKERT_TOKENS = ("1", "2", "3", "4", "5")
+
+# Matches the text of a response line before a Likert answer, e.g. "Agent 3: 4, 2, ". The second
+# group contains the earlier answers on the line.
+ANSWER_PREFIX = re.compile(r"\s*Agent (\d+):((?:\s*[1-5]\s*,)*)\s*")
 
 
 class LlmHandler:
     """This class is responsible of asking questions from the LLM and saving the answers into the
-    agent-objects. This is implemented by method `get_agents_responses`."""
+    agent-objects. This is implemented by method `get_agents_responses`.
+
+    Attributes:
+        deduplicate (bool): If True, agents with equal (rounded) latent variable values are asked
+            only once and the answer is copied to all of them.
+        answer_cache (AnswerCache): A persistent store of earlier answers. Agents whose answers
+            are found in the cache are not asked from the LLM. None if no cache is used.
+        escalation_llm: A larger LLM that is asked when the response of `llm` cannot be parsed
+            into an answer for every agent and statement. None if there is no escalation.
+        escalations (int): The number of prompts that have been escalated.
+    """
+
+    # Change the version when the prompt changes, so that answers to the old prompt are not
+    # served from the answer cache
+    PROMPT_VERSION = "3"
 
-    def __init__(self) -> None:
-        """Initializes the LLM connection using `llm_config.py`."""
-        self.llm = get_llm_connection()
+    def __init__(
+        self, deduplicate: bool = True, answer_cache: Optional[AnswerCache] = None
+    ) -> None:
+        """Initializes the LLM connection using `llm_config.py`. The questions are answered with
+        ANSWER_MODEL and escalated to ESCALATION_MODEL, if they are set in the .env file.
+        """
+        self.llm = get_llm_connection(ANSWER_MODEL)
+        self.escalation_llm = (
+            get_llm_connection(ESCALATION_MODEL) if ESCALATION_MODEL else None
+        )
+        self.escalations = 0
+        # The handler is shared by the threads of the server
+        self.__escalations_lock = threading.Lock()
 
         self.transformer = AgentTransformer()
+        self.deduplicate = deduplicate
+        self.answer_cache = answer_cache
 
     def create_prompt(
         self, agents: List[Agent], questions: List[str], future: bool = False
     ) -> str:
         """
-        Creates a prompt for all agents and all questions.
+        Creates a prompt for all agents and all questions. The static parts of the prompt come
+        first, so that every prompt starts with the same prefix, which the LLM provider can cache.
 
         Args:
             agents (list): List of Agent objects.
@@ -28,15 +90,39 @@ class LlmHandler:
             str: The generated prompt.
         """
 
-        prompt = self.create_intro()
-
         latent_variables = self._get_latent_variables(agents[0])
-        prompt += self.add_latent_variables_to_prompt(latent_variables)
+        prompt = self.create_prompt_prefix(latent_variables)
         prompt += self.add_agents_info(agents, latent_variables, future)
-        prompt += self.add_questions_and_instructions(questions)
+        prompt += self.add_questions(questions)
 
         return prompt
 
+    def create_prompt_prefix(self, latent_variables: List[str]) -> str:
+        """
+        Creates the part of the prompt that is the same for all agents and questions: the intro,
+        the latent variables and the instructions.
+
+        Args:
+            latent_variables (list): List of latent variable names.
+
+        Returns:
+            str: The prefix of the prompt.
+        """
+        prefix = self.create_intro()
+        prefix += self.add_latent_variables_to_prompt(latent_variables)
+        prefix += self.add_instructions()
+
+        return prefix
+
+    def _cache_prompt_prefix(self, agents: List[Agent]) -> None:
+        """Caches the prefix of the agents' prompts in the LLM, if it supports explicit context
+        caching. Called before the prompts are sent; the LLM keeps track of the prefixes that
+        have already been cached."""
+        if agents and hasattr(self.llm, "cache_prefix"):
+            self.llm.cache_prefix(
+                self.create_prompt_prefix(self._get_latent_variables(agents[0]))
+            )
+
     def create_intro(self) -> str:
         """
         Creates the introductory part of the prompt explaining latent variables.
@@ -112,44 +198,44 @@ class LlmHandler:
             # prompt += f"Gender: {agent_info['Gender']}\n"
             prompt += "Latent variable values:\n"
 
-            # Only include the values of latent variables in order
+            # Only include the values of latent variables in order. They are rounded like in
+            # the transformation prompts, so agents grouped by the rounded values get the same
+            # prompt
             for var_name in latent_variables:
-                prompt += f"{info['Answers'].get(var_name, 'N/A')}\n"
+                value = info["Answers"].get(var_name, "N/A")
+                prompt += f"{format_latent_value(value)}\n"
             prompt += "\n"
         return prompt
 
     def add_questions_and_instructions(self, questions: List[str]) -> str:
         """
-        Adds the questions and response format instructions to the prompt.
+        Adds the response format instructions and the questions to the prompt.
 
         Args:
             questions (list): List of statements to be answered.
 
         Returns:
-            str: A string with the questions and instructions for the responses.
+            str: A string with the instructions for the responses and the questions.
+        """
+        return self.add_instructions() + self.add_questions(questions)
+
+    def add_instructions(self) -> str:
+        """
+        Creates the Likert scale and the response format instructions, which do not depend on
+        the agents or the questions.
+
+        Returns:
+            str: The instructions for the responses.
         """
-        prompt = (
+        return (
             "The Likert scale is as follows:\n"
             "1 = Strongly Disagree\n"
             "2 = Disagree\n"
             "3 = Neutral\n"
             "4 = Agree\n"
             "5 = Strongly Agree\n\n"
-        )
-
-        if len(questions) == 1:
-            prompt += "The statement to be answered by each agent on a Likert scale:\n"
-        else:
-            prompt += "The following are the statements to be answered by each agent on a Likert scale:\n"
-
-        for question in questions:
-            prompt += f"- {question}\n"
-
-        prompt += f"\nThere are {len(questions)} statements to answer.\n"
-
-        prompt += (
-            "\nIMPORTANT: Each agent must provide exactly one numerical response per statement.\n"
-            "The number of responses must match the number of statements given above.\n"
+            "IMPORTANT: Each agent must provide exactly one numerical response per statement.\n"
+            "The number of responses must match the number of statements given at the end.\n"
             "Responses should be given in a single line per agent, separated by commas.\n"
             "Each agent's response should begin with 'Agent X:', where X is the agent's number.\n"
             "Do not provide any additional explanation or text.\n"
@@ -159,18 +245,66 @@ class LlmHandler:
             "Agent 2: 4, 1, 3, 2\n"
             "Agent 3: 2, 5, 4, 3\n"
             "...\n"
-            "Nothing else should be included in the response, such as explanations or extra details."
+            "Nothing else should be included in the response, such as explanations or extra details.\n\n"
+            "These are the agents:\n\n"
         )
+
+    def add_questions(self, questions: List[str]) -> str:
+        """
+        Adds the questions to the end of the prompt.
+
+        Args:
+            questions (list): List of statements to be answered.
+
+        Returns:
+            str: A string with the questions.
+        """
+        if len(questions) == 1:
+            prompt = "The statement to be answered by each agent on a Likert scale:\n"
+        else:
+            prompt = "The following are the statements to be answered by each agent on a Likert scale:\n"
+
+        for question in questions:
+            prompt += f"- {question}\n"
+
+        prompt += f"\nThere are {len(questions)} statements to answer.\n"
         return prompt
 
     def get_agents_responses(
-        self, agents: List[Agent], questions: List[str]
-    ) -> Optional[Dict[str, Dict[Any, Dict[str, int]]]]:
+        self,
+        agents: List[Agent],
+        questions: List[str],
+        samples: int = 1,
+        cancellation: Optional[CancellationToken] = None,
+        distribution_counts: Optional[DistributionCounts] = None,
+    ) -> Optional[Dict[str, Any]]:
         """
         Creates a prompt, sends it to the LLM, receives the LLM's answer (which includes a Likert-
         value between 1 and 5 for each agent) and saves each agent's answer to the agent-object. If
         agents have been transformed to the future, does everything for both the original and future
-        agents.
+        agents. If the original agents already have answers to the questions from before the
+        scenario changed, those answers are reused and only the future agents are asked. Answers
+        found in the answer cache are not asked from the LLM either. Agents
+        with identical latent variable values are included in the prompt only once and the answer
+        is copied to all of them. If the response does not contain a valid answer for every agent
+        and statement, the prompt is escalated to the larger model, if one is configured, and the
+        response that answers more agents is used.
+
+        If `samples` is greater than 1, the LLM is asked for that many alternative responses to
+        each prompt in one request, and every parsed response is appended to the agents' answer
+        lists. In this case the values of the returned dictionary are lists with one dictionary
+        of answers per response. The samples are not escalated: a sample that cannot be parsed is
+        left out like in `get_repeated_agents_responses`, and the larger model could not give
+        several samples in one request anyway.
+
+        Args:
+            agents (list): List of Agent objects.
+            questions (list): List of statements to be answered.
+            samples (int): The number of responses requested per prompt. Defaults to 1.
+            cancellation (CancellationToken, optional): The cancellation token of the request.
+                The pending LLM requests are cancelled when it is cancelled.
+            distribution_counts (DistributionCounts, optional): The running answer counts of
+                the agents, updated with the saved answers.
 
         Returns:
             dict:
@@ -186,111 +320,958 @@ class LlmHandler:
                         <Agent object_2>: {'Question': 4}
                     }
                 }
+
+        Raises:
+            RequestCancelled: If the request is cancelled.
         """
 
         future_variables_exists = self.transformer.future_variables_exist(agents)
 
+        # Agents with identical latent values are asked only once
+        prompt_groups = self._get_prompt_groups(agents)
+
+        if samples > 1:
+            cached = None
+            if future_variables_exists:
+                cached = self._cached_original_answers(agents, questions, samples)
+            if cached is not None:
+                # The original agents have already answered: only the future agents are asked
+                prompt_groups = prompt_groups[1:]
+
+            results = self._get_multiple_agents_responses(
+                prompt_groups, questions, samples, cancellation, distribution_counts
+            )
+            if results is not None and cached is not None:
+                results["original"] = cached
+            return results
+
+        results = {}
         if future_variables_exists:
-            # Create two prompts: one for original latent values, one for updated values
-            prompts = [
-                self.create_prompt(agents, questions, future=False),
-                self.create_prompt(agents, questions, future=True),
-            ]
-            responses = self.llm.get_parallel_responses(prompts)
+            cached = self._cached_original_answers(agents, questions)
+            if cached is not None:
+                # The original agents have already answered: only the future agents are asked
+                prompt_groups = prompt_groups[1:]
+                results["original"] = cached[0]
 
-            # If response is a single string, split it manually into two parts
-            if isinstance(responses, str):
-                responses = responses.split("## Answer")
-                responses = [r.strip() for r in responses if r.strip()]
+        # Answers found in the answer cache are not asked from the LLM
+        new_answers = {}
+        asked_groups = []
+        for groups, future in prompt_groups:
+            new_answers[future], missing_groups = self._get_cached_answers(
+                groups, questions, future
+            )
+            if missing_groups:
+                asked_groups.append((missing_groups, future))
 
-            if not responses or len(responses) != 2:
-                # Expected 2 responses from LLM, got len(responses)
+        prompts = [
+            self.create_prompt(get_representatives(groups), questions, future=future)
+            for groups, future in asked_groups
+        ]
+        if prompts:
+            self._cache_prompt_prefix(agents)
+        responses = self._get_llm_responses(
+            prompts,
+            cancellation,
+            [get_representatives(groups) for groups, _ in asked_groups],
+            questions,
+        )
+        if responses is None:
+            if self.escalation_llm is None:
                 return None
+            # Escalate every prompt, since the responses cannot be matched to the prompts
+            responses = [None] * len(prompts)
 
-            original_response = responses[0]
-            future_response = responses[1]
+        for (groups, future), prompt, response in zip(asked_groups, prompts, responses):
+            representatives = get_representatives(groups)
+            parsed = (
+                self.parse_responses(response, representatives, questions)
+                if response is not None
+                else None
+            )
+            model = self._get_answering_model()
 
-            # Parse both responses
-            original_parsed = self.parse_responses(original_response, agents, questions)
-            future_parsed = self.parse_responses(future_response, agents, questions)
+            if self.escalation_llm is not None and not self._is_complete(
+                parsed, representatives, questions
+            ):
+                # The cheap model failed: ask the larger model
+                with self.__escalations_lock:
+                    self.escalations += 1
+                escalated = self.parse_responses(
+                    self.escalation_llm.get_response(
+                        prompt,
+                        **cancellation_kwargs(cancellation),
+                        **self._hedging_kwargs(
+                            self._parses(representatives, questions),
+                            self.escalation_llm,
+                        ),
+                    ),
+                    representatives,
+                    questions,
+                )
+                # The larger model's response is used only if it answers more
+                if self._count_answers(
+                    escalated, representatives, questions
+                ) > self._count_answers(parsed, representatives, questions):
+                    parsed = escalated
+                    model = self._get_answering_model(self.escalation_llm)
 
-            if original_parsed is None or future_parsed is None:
+            if parsed is None:
                 # Parsing failed for one or both responses
                 return None
 
-            self.save_responses_to_agents(original_parsed, future=False)
-            self.save_responses_to_agents(future_parsed, future=True)
+            self._save_answers_to_cache(parsed, questions, future, model)
+            new_answers[future].update(expand_group_responses(parsed, groups))
 
-            return {
-                "original": original_parsed,
-                "future": future_parsed,
-            }
+        for future, answers in new_answers.items():
+            self.save_responses_to_agents(answers, future, distribution_counts)
+            results["future" if future else "original"] = answers
 
-        else:
-            # No future scenario: only one prompt
-            prompt = self.create_prompt(agents, questions, future=False)
-            response = self.llm.get_response(prompt)
+        return results
 
-            parsed = self.parse_responses(response, agents, questions)
-            if parsed is None:
-                return None
+    def _get_llm_responses(
+        self,
+        prompts: List[str],
+        cancellation: Optional[CancellationToken] = None,
+        prompt_agents: Optional[List[List[Agent]]] = None,
+        questions: Optional[List[str]] = None,
+    ) -> Optional[List[str]]:
+        """Sends the prompts to the LLM. One prompt is sent with `get_response` and several
+        prompts in parallel with `get_parallel_responses`. If the agents of each prompt are
+        given, a hedged LLM uses only responses that can be parsed into answers.
 
-            self.save_responses_to_agents(parsed, future=False)
-            return {"original": parsed}
+        Args:
+            prompts (list): The prompts.
+            cancellation (CancellationToken, optional): The cancellation token of the request.
+            prompt_agents (list, optional): The agents of each prompt.
+            questions (list, optional): The statements of the prompts.
 
-    def parse_responses(
-        self, response: str, agents: List[Agent], questions: List[str]
-    ) -> Optional[Dict[Agent, Dict[str, int]]]:
-        """Extracts and parses the responses from the LLM into structured data."""
-        if not response:
-            # LLM returned an empty response
+        Returns:
+            list: The responses in the same order as the prompts, or None if the LLM did not give
+            a response to every prompt.
+        """
+        if not prompts:
+            return []
+
+        kwargs = cancellation_kwargs(cancellation)
+        checks = (
+            [self._parses(agents, questions) for agents in prompt_agents]
+            if prompt_agents is not None
+            else None
+        )
+
+        if len(prompts) == 1:
+            if checks is not None:
+                kwargs.update(self._hedging_kwargs(checks[0]))
+            return [self.llm.get_response(prompts[0], **kwargs)]
+
+        if checks is not None:
+
+            def all_parse(responses: Any) -> bool:
+                responses = self._split_responses(responses)
+                return len(responses) == len(checks) and all(
+                    check(response) for check, response in zip(checks, responses)
+                )
+
+            kwargs.update(self._hedging_kwargs(all_parse))
+
+        responses = self._split_responses(
+            self.llm.get_parallel_responses(prompts, **kwargs)
+        )
+
+        if not responses or len(responses) != len(prompts):
+            # Expected a response for every prompt
             return None
 
-        lines = response.strip().split("\n")
-        return self.process_lines(lines, agents, questions)
+        return responses
 
-    def process_lines(
-        self, lines: List[str], agents: List[Agent], questions: List[str]
-    ) -> Dict[Agent, Dict[str, int]]:
-        """Processes each line of the LLM's response, assigning each parsed line to the corresponding agent."""
-        agent_responses = {}
-        for i, line in enumerate(lines):
-            if i >= len(agents):
-                # Skipping response line i+1 due to insufficient agent count
+    def _split_responses(self, responses: Any) -> Any:
+        """Splits the responses to parallel prompts if the LLM gave them as a single string."""
+        if isinstance(responses, str):
+            responses = responses.split("## Answer")
+            responses = [r.strip() for r in responses if r.strip()]
+        return responses
+
+    def _parses(
+        self, agents: List[Agent], questions: List[str]
+    ) -> Callable[[str], bool]:
+        """Returns a check of whether a response to a prompt of the agents can be parsed into
+        answers."""
+        return lambda response: bool(
+            isinstance(response, str)
+            and self.parse_responses(response, agents, questions)
+        )
+
+    def _hedging_kwargs(
+        self, is_valid: Callable[[Any], bool], llm: Any = None
+    ) -> Dict[str, Any]:
+        """Returns the keyword arguments that give a hedged LLM the check of whether a response
+        can be used, so that a response that cannot be parsed does not win the race. Other LLMs
+        return the response they get, so they are given nothing. Defaults to the LLM used first.
+        """
+        llm = llm or self.llm
+        return {"is_valid": is_valid} if isinstance(llm, HedgedLLM) else {}
+
+    def _get_cached_answers(
+        self, groups: List[List[Agent]], questions: List[str], future: bool = False
+    ) -> Tuple[Dict[Agent, Dict[str, int]], List[List[Agent]]]:
+        """Looks up the answers of the agent groups from the answer cache. A group is served from
+        the cache only if all the questions are found and none of its agents has answered them
+        yet, so that repeated questions still get new answers from the LLM.
+
+        Args:
+            groups (list): The agent groups.
+            questions (list): List of statements to be answered.
+            future (bool): Whether the future (True) or original (False) agents are asked.
+
+        Returns:
+            Tuple: (answers of all agents found in the cache, groups that must be asked)
+        """
+        if self.answer_cache is None:
+            return {}, groups
+
+        latent_variables = self._get_latent_variables(groups[0][0])
+        models = self._get_model_names()
+        found = {}
+        missing_groups = []
+
+        for group in groups:
+            targets = [
+                agent.future_questions if future else agent.questions for agent in group
+            ]
+            if any(question in target for target in targets for question in questions):
+                missing_groups.append(group)
                 continue
-            agent_response = self.parse_line(line, i, questions)
-            if agent_response:
-                agent_responses[agents[i]] = agent_response
-        return agent_responses
-
-    def parse_line(self, line: str, index: int, questions: List[str]) -> Dict[str, int]:
-        """Parses an individual line from the LLM response and constructs a dictionary of answers."""
-        if not line.startswith(f"Agent {index+1}:"):
+
+            latent_key = latent_vector_key(group[0], latent_variables, future=future)
+            answers = {}
+            for question in questions:
+                answer = None
+                for model in models:
+                    answer = self.answer_cache.get(
+                        latent_key, question, model, self.PROMPT_VERSION
+                    )
+                    if answer is not None:
+                        break
+                if answer is None:
+                    break
+                answers[question] = answer
+
+            if len(answers) == len(questions):
+                found[group[0]] = answers
+            else:
+                missing_groups.append(group)
+
+        return expand_group_responses(found, groups), missing_groups
+
+    def _save_answers_to_cache(
+        self,
+        agent_responses: Dict[Agent, Dict[str, int]],
+        questions: List[str],
+        future: bool = False,
+        model: Optional[str] = None,
+    ) -> None:
+        """Saves the answers of the prompted agents into the answer cache, if it is in use. The
+        answers are saved for the given model, by default the model of `llm`."""
+        if self.answer_cache is None or not agent_responses:
+            return
+
+        latent_variables = self._get_latent_variables(next(iter(agent_responses)))
+        model = model or self._get_model_name()
+
+        for agent, responses in agent_responses.items():
+            latent_key = latent_vector_key(agent, latent_variables, future=future)
+            for question, answer in responses.items():
+                self.answer_cache.set(
+                    latent_key, question, model, self.PROMPT_VERSION, answer
+                )
+
+    def _get_model_name(self, llm: Any = None) -> str:
+        """Returns the name of the given LLM model, by default the one used first."""
+        llm = llm or self.llm
+        return str(getattr(llm, "model", type(llm).__name__))
+
+    def _get_model_names(self) -> List[str]:
+        """Returns the names of the models whose answers are looked up from the answer cache.
+        The answers of escalated prompts are saved under the larger model, and a hedged LLM may
+        have answered with any of its providers."""
+        models = []
+        for llm in (self.llm, self.escalation_llm):
+            if isinstance(llm, HedgedLLM):
+                models.extend(llm.models)
+            elif llm is not None:
+                models.append(self._get_model_name(llm))
+        return list(dict.fromkeys(models))
+
+    def _get_answering_model(self, llm: Any = None) -> str:
+        """Returns the name of the model that gave the last response of the given LLM, by
+        default the one used first. Differs from `_get_model_name` only for a hedged LLM.
+        """
+        llm = llm or self.llm
+        if isinstance(llm, HedgedLLM):
+            return llm.get_answering_model()
+        return self._get_model_name(llm)
+
+    def _count_answers(
+        self,
+        agent_responses: Optional[Dict[Agent, Dict[str, int]]],
+        agents: List[Agent],
+        questions: List[str],
+    ) -> int:
+        """Returns the number of agents that have a Likert answer between 1 and 5 to every
+        statement in the parsed responses."""
+        if not agent_responses:
+            return 0
+        return sum(
+            len(agent_responses.get(agent, {})) == len(questions)
+            and all(1 <= answer <= 5 for answer in agent_responses[agent].values())
+            for agent in agents
+        )
+
+    def _is_complete(
+        self,
+        agent_responses: Optional[Dict[Agent, Dict[str, int]]],
+        agents: List[Agent],
+        questions: List[str],
+    ) -> bool:
+        """Returns True if the parsed responses have a Likert answer between 1 and 5 for every
+        agent and statement."""
+        if not agent_responses:
+            return False
+        return self._count_answers(agent_responses, agents, questions) == len(agents)
+
+    def _cached_original_answers(
+        self,
+        agents: List[Agent],
+        questions: List[str],
+        samples: int = 1,
+        probabilities: bool = False,
+    ) -> Optional[List[Dict[Agent, Dict[str, Any]]]]:
+        """Returns the saved answers of the original agents that pair with the next `samples`
+        answers of the future agents. The original answers do not depend on the future scenario,
+        so after a scenario change they can be reused instead of asking the original agents again.
+
+        Args:
+            agents (list): List of Agent objects.
+            questions (list): List of statements to be answered.
+            samples (int): The number of future answers that will be added.
+            probabilities (bool): Whether to use the answer probabilities instead of the answers.
+
+        Returns:
+            list: One dictionary of original answers per sample, or None if some agent does not
+            have enough saved answers.
+        """
+        cached = [{} for _ in range(samples)]
+
+        for agent in agents:
+            if probabilities:
+                original = agent.answer_probabilities
+                future = agent.future_answer_probabilities
+            else:
+                original = agent.questions
+                future = agent.future_questions
+
+            for question in questions:
+                start = len(future.get(question, []))
+                answers = original.get(question, [])
+                if len(answers) < start + samples:
+                    return None
+                for sample in range(samples):
+                    cached[sample].setdefault(agent, {})[question] = answers[
+                        start + sample
+                    ]
+
+        return cached
+
+    def get_agents_surrogate_responses(
+        self,
+        agents: List[Agent],
+        questions: List[str],
+        initial_size: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        max_rounds: int = 3,
+        uncertainty_threshold: float = 0.3,
+        agents_per_prompt: int = 25,
+        cancellation: Optional[CancellationToken] = None,
+        distribution_counts: Optional[DistributionCounts] = None,
+    ) -> Optional[Dict[str, Dict[Agent, Dict[str, int]]]]:
+        """
+        Answers the questions for a large population by asking only some of the agents from the
+        LLM (active learning). First a diverse subset of agents that covers the latent space is
+        asked. An ordinal regression from the latent variable values to the answers is fitted to
+        their answers and used to predict the answers of the other agents. The agents whose
+        predictions are the most uncertain are then asked from the LLM and the model is refitted,
+        for at most `max_rounds` rounds. The answers are saved into the agents like in
+        `get_agents_responses`, and the questions whose answers were predicted are added to the
+        agents' `predicted_questions` (or `future_predicted_questions`).
+
+        Args:
+            agents (list): List of Agent objects.
+            questions (list): List of statements to be answered.
+            initial_size (int, optional): The number of agents asked before the first fit. If
+                there are at most this many distinct agents, all of them are asked. Defaults to
+                **None**, when a fifth of the distinct agents (at least 10) is asked.
+            batch_size (int, optional): The maximum number of uncertain agents asked per round.
+                Defaults to **None**, when a tenth of the distinct agents (at least 5) is used.
+            max_rounds (int): The maximum number of rounds of asking uncertain agents.
+            uncertainty_threshold (float): Agents whose most probable answer has a probability
+                less than 1 - `uncertainty_threshold` for some question are uncertain.
+            agents_per_prompt (int): The maximum number of agents in one prompt.
+            cancellation (CancellationToken, optional): The cancellation token of the request.
+            distribution_counts (DistributionCounts, optional): The running answer counts of
+                the agents, updated with the saved answers.
+
+        Returns:
+            dict: The answers under the keys 'original' and 'future' like in
+            `get_agents_responses`, or None if the first agents could not be asked.
+        """
+        results = {}
+
+        for groups, future in self._get_prompt_groups(agents):
+            representatives = get_representatives(groups)
+            latent_variables = self._get_latent_variables(representatives[0])
+            X = latent_matrix(representatives, latent_variables, future=future)
+
+            # With the defaults, at most half of the distinct agents are asked
+            if initial_size is None:
+                initial_size = max(10, math.ceil(len(representatives) / 5))
+            if batch_size is None:
+                batch_size = max(5, math.ceil(len(representatives) / 10))
+
+            labels = self._ask_agents(
+                [representatives[i] for i in select_diverse(X, initial_size)],
+                questions,
+                future,
+                agents_per_prompt,
+                cancellation,
+            )
+            if not labels:
+                return None
+
+            for round_number in range(max_rounds + 1):
+                predictions, uncertainties = self._predict_answers(
+                    representatives, X, labels, questions
+                )
+                candidates = [
+                    i
+                    for i in np.argsort(-uncertainties)[:batch_size]
+                    if uncertainties[i] > uncertainty_threshold
+                ]
+                if not candidates or round_number == max_rounds:
+                    break
+
+                # Ask the LLM where the model is the most uncertain
+                labels.update(
+                    self._ask_agents(
+                        [representatives[i] for i in candidates],
+                        questions,
+                        future,
+                        agents_per_prompt,
+                        cancellation,
+                    )
+                )
+
+            predicted = expand_group_responses(
+                {
+                    agent: answers
+                    for agent, answers in predictions.items()
+                    if agent not in labels
+                },
+                groups,
+            )
+            for agent in predicted:
+                target = agent.future_questions if future else agent.questions
+                predicted_questions = (
+                    agent.future_predicted_questions
+                    if future
+                    else agent.predicted_questions
+                )
+                # Marked only if the predicted answer becomes the first answer
+                predicted_questions.update(
+                    question for question in questions if question not in target
+                )
+
+            answers = {**predictions, **labels}
+            answers = expand_group_responses(answers, groups)
+            self.save_responses_to_agents(answers, future, distribution_counts)
+            results["future" if future else "original"] = answers
+
+        return results
+
+    def _ask_agents(
+        self,
+        agents: List[Agent],
+        questions: List[str],
+        future: bool,
+        agents_per_prompt: int,
+        cancellation: Optional[CancellationToken] = None,
+    ) -> Dict[Agent, Dict[str, int]]:
+        """Asks the questions from the given agents in prompts of at most `agents_per_prompt`
+        agents, and returns the answers of the agents that answered every question."""
+        chunks = [
+            agents[i : i + agents_per_prompt]
+            for i in range(0, len(agents), agents_per_prompt)
+        ]
+        prompts = [
+            self.create_prompt(chunk, questions, future=future) for chunk in chunks
+        ]
+        self._cache_prompt_prefix(agents)
+        responses = (
+            self._get_llm_responses(prompts, cancellation, chunks, questions) or []
+        )
+
+        answers = {}
+        for chunk, response in zip(chunks, responses):
+            parsed = self.parse_responses(response, chunk, questions) or {}
+            answers.update(
+                {
+                    agent: agent_answers
+                    for agent, agent_answers in parsed.items()
+                    if len(agent_answers) == len(questions)
+                }
+            )
+        return answers
+
+    def _predict_answers(
+        self,
+        agents: List[Agent],
+        X: np.ndarray,
+        labels: Dict[Agent, Dict[str, int]],
+        questions: List[str],
+    ) -> Tuple[Dict[Agent, Dict[str, int]], np.ndarray]:
+        """Fits an ordinal regression per question to the answers of the asked agents and
+        predicts the answers of the other agents.
+
+        Returns:
+            Tuple: (the predicted answers of the agents that have not been asked, the largest
+            uncertainty of each agent's predictions, zero for the asked agents)
+        """
+        labeled = np.array([agent in labels for agent in agents])
+        uncertainties = np.zeros(len(agents))
+        predictions = {}
+
+        if labeled.all():
+            return predictions, uncertainties
+
+        unlabeled = np.flatnonzero(~labeled)
+        for question in questions:
+            y = np.array(
+                [labels[agent][question] for agent in agents if agent in labels]
+            )
+            model = OrdinalRegression().fit(X[labeled], y)
+            probabilities = model.predict_proba(X[unlabeled])
+            uncertainties[unlabeled] = np.maximum(
+                uncertainties[unlabeled], uncertainty(probabilities)
+            )
+            for i, answer in zip(unlabeled, probabilities.argmax(axis=1) + 1):
+                predictions.setdefault(agents[i], {})[question] = int(answer)
+
+        return predictions, uncertainties
+
+    def get_agents_probability_responses(
+        self,
+        agents: List[Agent],
+        questions: List[str],
+        distribution_counts: Optional[DistributionCounts] = None,
+        cancellation: Optional[CancellationToken] = None,
+    ) -> Optional[Dict[str, Dict[Agent, Dict[str, List[float]]]]]:
+        """
+        Asks the questions from the agents and requests the log probabilities of the response
+        tokens. The probabilities of the alternative Likert digits after "Agent X:" give a
+        probability for each Likert level. The probabilities are saved into the agents'
+        `answer_probabilities` (or `future_answer_probabilities`) and the most probable answer
+        into `questions` (or `future_questions`). One call gives the spread of the answers that
+        would otherwise need many repeated samples.
+
+        Args:
+            agents (list): List of Agent objects.
+            questions (list): List of statements to be answered.
+            distribution_counts (DistributionCounts, optional): The running answer counts of
+                the agents, updated with the most probable answers.
+            cancellation (CancellationToken, optional): The cancellation token of the request.
+                The pending LLM requests are cancelled when it is cancelled.
+
+        Returns:
+            dict: The probabilities of the Likert levels 1-5 under the keys 'original' and
+            'future', e.g. {'original': {<Agent object_1>: {'Question': [0.1, 0.6, 0.3, 0, 0]}}},
+            or None if a response could not be parsed.
+
+        Raises:
+            ValueError: If the LLM does not provide token log probabilities.
+            RequestCancelled: If the request is cancelled.
+        """
+        if not hasattr(self.llm, "get_parallel_token_logprobs"):
+            raise ValueError(
+                "The LLM provider does not return token log probabilities. Use OpenAI."
+            )
+
+        prompt_groups = self._get_prompt_groups(agents)
+        results = {}
+
+        if len(prompt_groups) == 2:
+            cached = self._cached_original_answers(
+                agents, questions, probabilities=True
+            )
+            if cached is not None:
+                # The original agents have already answered: only the future agents are asked
+                prompt_groups = prompt_groups[1:]
+                results["original"] = cached[0]
+
+        prompts = [
+            self.create_prompt(get_representatives(groups), questions, future=future)
+            for groups, future in prompt_groups
+        ]
+        self._cache_prompt_prefix(agents)
+        token_lists = self.llm.get_parallel_token_logprobs(
+            prompts, **cancellation_kwargs(cancellation)
+        )
+
+        if not token_lists or len(token_lists) != len(prompts):
             return None
 
-        parts = line.split(":")
-        if len(parts) < 2:
-            # Invalid response format at line index+1
+        for (groups, future), tokens in zip(prompt_groups, token_lists):
+            parsed = self.parse_token_logprobs(
+                tokens, get_representatives(groups), questions
+            )
+            if not parsed:
+                return None
+
+            parsed = expand_group_responses(parsed, groups)
+            self.save_probabilities_to_agents(parsed, future=future)
+            self.save_responses_to_agents(
+                {
+                    agent: {
+                        question: probabilities.index(max(probabilities)) + 1
+                        for question, probabilities in answers.items()
+                    }
+                    for agent, answers in parsed.items()
+                },
+                future,
+                distribution_counts,
+            )
+            results["future" if future else "original"] = parsed
+
+        return results
+
+    def parse_token_logprobs(
+        self,
+        tokens: List[Tuple[str, Dict[str, float]]],
+        agents: List[Agent],
+        questions: List[str],
+    ) -> Dict[Agent, Dict[str, List[float]]]:
+        """Finds the Likert answers from the tokens of a response and turns the log
+        probabilities of their alternatives into probabilities of the Likert levels 1-5.
+
+        Args:
+            tokens (list): The response tokens as tuples (token, {alternative: log probability}).
+            agents (list): List of Agent objects in the order they were given in the prompt.
+            questions (list): List of statements in the order they were given in the prompt.
+
+        Returns:
+            dict: The probabilities of the Likert levels for each agent and question.
+        """
+        agent_probabilities = {}
+        line = ""
+
+        for token, alternatives in tokens:
+            match = ANSWER_PREFIX.fullmatch(line)
+            if token.strip() in LIKERT_TOKENS and match:
+                agent_number = int(match.group(1))
+                answer_index = match.group(2).count(",")
+                probabilities = self._likert_probabilities(alternatives)
+
+                if (
+                    1 <= agent_number <= len(agents)
+                    and answer_index < len(questions)
+                    and probabilities
+                ):
+                    agent = agents[agent_number - 1]
+                    agent_probabilities.setdefault(agent, {})[
+                        questions[answer_index]
+                    ] = probabilities
+
+            line = (line + token).rsplit("\n", 1)[-1]
+
+        return agent_probabilities
+
+    def _likert_probabilities(
+        self, alternatives: Dict[str, float]
+    ) -> Optional[List[float]]:
+        """Returns the normalized probabilities of the Likert levels 1-5 from the log
+        probabilities of alternative tokens, or None if no alternative is a Likert digit.
+        """
+        probabilities = [0.0] * len(LIKERT_TOKENS)
+        for token, logprob in alternatives.items():
+            token = token.strip()
+            if token in LIKERT_TOKENS:
+                probabilities[LIKERT_TOKENS.index(token)] += math.exp(logprob)
+
+        total = sum(probabilities)
+        if total == 0:
             return None
 
-        try:
-            answers = [
-                int(x.strip()) for x in parts[1].split(",") if x.strip().isdigit()
+        return [probability / total for probability in probabilities]
+
+    def save_probabilities_to_agents(
+        self,
+        agent_probabilities: Dict[Agent, Dict[str, List[float]]],
+        future: bool = False,
+    ) -> None:
+        """
+        Stores the Likert level probabilities in each agent's `answer_probabilities` or
+        `future_answer_probabilities` dictionary. Like the answers, the probabilities of each
+        question are kept in a list.
+
+        Args:
+            agent_probabilities (dict): The probabilities of each agent.
+            future (bool): Whether to save to the future (True) or original (False) agent.
+        """
+        for agent, probabilities in agent_probabilities.items():
+            target = (
+                agent.future_answer_probabilities
+                if future
+                else agent.answer_probabilities
+            )
+            for question, levels in probabilities.items():
+                target.setdefault(question, []).append(levels)
+
+    def _get_prompt_groups(
+        self, agents: List[Agent]
+    ) -> List[Tuple[List[List[Agent]], bool]]:
+        """Returns the agent groups for the original prompt and, if the agents have been
+        transformed to the future, for the future prompt.
+
+        Returns:
+            list: A tuple (agent groups, future) for each prompt.
+        """
+        prompt_groups = [(self._group_agents(agents, future=False), False)]
+        if self.transformer.future_variables_exist(agents):
+            prompt_groups.append((self._group_agents(agents, future=True), True))
+        return prompt_groups
+
+    def _get_multiple_agents_responses(
+        self,
+        prompt_groups: List[Tuple[List[List[Agent]], bool]],
+        questions: List[str],
+        samples: int,
+        cancellation: Optional[CancellationToken] = None,
+        distribution_counts: Optional[DistributionCounts] = None,
+    ) -> Optional[Dict[str, List[Dict[Agent, Dict[str, int]]]]]:
+        """Asks the LLM for `samples` responses to the original (and future) prompt in one round
+        trip, and saves all parsed responses into the agents. Nothing is saved unless the
+        responses to every prompt could be parsed, so the agents are not left half-updated.
+
+        Args:
+            prompt_groups (list): A tuple (agent groups, future) for each prompt.
+            questions (list): List of statements to be answered.
+            samples (int): The number of responses per prompt.
+            cancellation (CancellationToken, optional): The cancellation token of the request.
+            distribution_counts (DistributionCounts, optional): The running answer counts of
+                the agents, updated with the saved answers.
+
+        Returns:
+            dict: The parsed responses under the keys 'original' and 'future', or None if the LLM
+            did not give a response to every prompt or no response could be parsed.
+        """
+        prompts = [
+            self.create_prompt(get_representatives(groups), questions, future=future)
+            for groups, future in prompt_groups
+        ]
+        self._cache_prompt_prefix([groups[0][0] for groups, _ in prompt_groups])
+        checks = [
+            self._parses(get_representatives(groups), questions)
+            for groups, _ in prompt_groups
+        ]
+
+        def every_prompt_parses(responses: Any) -> bool:
+            # Each prompt needs at least one sample that can be parsed
+            return len(responses) == len(checks) and all(
+                any(check(candidate) for candidate in candidates)
+                for check, candidates in zip(checks, responses)
+            )
+
+        responses = self.llm.get_parallel_multiple_responses(
+            prompts,
+            samples,
+            **cancellation_kwargs(cancellation),
+            **self._hedging_kwargs(every_prompt_parses),
+        )
+
+        if not responses or len(responses) != len(prompts):
+            return None
+
+        results = {}
+        for (groups, future), candidates in zip(prompt_groups, responses):
+            representatives = get_representatives(groups)
+            parsed_candidates = []
+
+            for candidate in candidates:
+                parsed = self.parse_responses(candidate, representatives, questions)
+                if not parsed:
+                    continue
+                parsed_candidates.append(expand_group_responses(parsed, groups))
+
+            if not parsed_candidates:
+                return None
+
+            results["future" if future else "original"] = parsed_candidates
+
+        # Every prompt has been answered: save the answers
+        for key, parsed_candidates in results.items():
+            for parsed in parsed_candidates:
+                self.save_responses_to_agents(
+                    parsed, key == "future", distribution_counts
+                )
+
+        return results
+
+    def get_repeated_agents_responses(
+        self,
+        agents: List[Agent],
+        questions: List[str],
+        max_repetitions: int = 5,
+        min_repetitions: int = 3,
+        tolerance: float = 0.1,
+        confidence: float = 0.95,
+        samples_per_request: int = 1,
+        cancellation: Optional[CancellationToken] = None,
+        distribution_counts: Optional[DistributionCounts] = None,
+    ) -> Dict[str, int]:
+        """
+        Asks the questions from the agents repeatedly with `get_agents_responses`. Every round
+        appends a new answer to the agents' answer lists. A question is no longer asked once the
+        confidence interval of its mean answer is narrow enough (for both the original and the
+        future agents), or when it has been asked `max_repetitions` times.
+
+        Args:
+            agents (list): List of Agent objects.
+            questions (list): List of statements to be answered.
+            max_repetitions (int): The maximum number of times a question is asked.
+            min_repetitions (int): The minimum number of times a question is asked.
+            tolerance (float): A question has converged when the half width of the confidence
+                interval of its mean Likert answer is at most this.
+            confidence (float): The confidence level of the confidence intervals.
+            samples_per_request (int): The number of responses requested from the LLM in one
+                round trip. Each response counts as one repetition.
+            cancellation (CancellationToken, optional): The cancellation token of the request.
+                No more rounds are asked after it is cancelled.
+            distribution_counts (DistributionCounts, optional): The running answer counts of
+                the agents, updated with the first answers.
+
+        Returns:
+            dict: The number of times each question was asked, e.g. {'Question': 3}
+        """
+        rounds = {question: 0 for question in questions}
+        remaining = list(rounds)
+
+        while remaining:
+            samples = min(
+                samples_per_request,
+                max_repetitions - min(rounds[question] for question in remaining),
+            )
+            self.get_agents_responses(
+                agents,
+                remaining,
+                samples=samples,
+                cancellation=cancellation,
+                distribution_counts=distribution_counts,
+            )
+
+            for question in remaining:
+                rounds[question] += samples
+
+            remaining = [
+                question
+                for question in remaining
+                if rounds[question] < max_repetitions
+                and (
+                    rounds[question] < min_repetitions
+                    or not self._has_converged(agents, question, tolerance, confidence)
+                )
             ]
-            return dict(zip(questions, answers))
-        except ValueError:
-            # Conversion to integer failed at line index+1
+
+        return rounds
+
+    def _has_converged(
+        self, agents: List[Agent], question: str, tolerance: float, confidence: float
+    ) -> bool:
+        """Checks whether the confidence interval of the mean answer to the question is at most
+        `tolerance` wide on each side, for the original and (if they exist) the future agents.
+        """
+        future_options = [False]
+        if self.transformer.future_variables_exist(agents):
+            future_options.append(True)
+
+        for future in future_options:
+            counts = repetition_counts(answer_matrix(agents, question, future=future))
+            _, half_width = mean_confidence_interval(
+                repetition_means(counts), confidence
+            )
+            if not half_width <= tolerance:
+                return False
+
+        return True
+
+    def _group_agents(
+        self, agents: List[Agent], future: bool = False
+    ) -> List[List[Agent]]:
+        """Groups agents with identical latent variable values. If deduplication is turned off,
+        every agent forms a group of its own.
+
+        Args:
+            agents (list): List of Agent objects.
+            future (bool): Whether to group by the future or the original latent variables.
+
+        Returns:
+            list: The agent groups. The first agent of each group is the one that is prompted.
+        """
+        if not self.deduplicate:
+            return [[agent] for agent in agents]
+
+        latent_variables = self._get_latent_variables(agents[0])
+        return group_identical_agents(agents, latent_variables, future=future)
+
+    def parse_responses(
+        self, response: str, agents: List[Agent], questions: List[str]
+    ) -> Optional[Dict[Agent, Dict[str, int]]]:
+        """Extracts and parses the responses from the LLM into structured data. The answers are
+        matched to the agents by the agent numbers, so the order of the lines does not matter.
+        Agents without a valid line are left out.
+
+        Args:
+            response (str): The response of the LLM.
+            agents (list): The agents in the order they were numbered in the prompt.
+            questions (list): The statements in the order they were given in the prompt.
+
+        Returns:
+            dict: The answers of each agent, e.g. {<Agent object_1>: {'Question': 3}}, or None if
+            the response is empty.
+        """
+        if not response:
+            # LLM returned an empty response
             return None
 
+        answers, counts = parse_likert_answers(response, len(agents), len(questions))
+        return {
+            agent: dict(zip(questions, row[:count]))
+            for agent, row, count in zip(agents, answers.tolist(), counts.tolist())
+            if count
+        }
+
     def save_responses_to_agents(
-        self, agent_responses: Dict[Agent, Dict[str, int]], future: bool = False
+        self,
+        agent_responses: Dict[Agent, Dict[str, int]],
+        future: bool = False,
+        distribution_counts: Optional[DistributionCounts] = None,
     ) -> Dict[str, Dict[str, int]]:
         """
-        Stores the responses in each agent's `questions` or `future_questions` dictionary.
+        Stores the responses in each agent's `questions` or `future_questions` dictionary. The
+        first answer of an agent to a question is also counted in `distribution_counts`.
 
         Args:
             agent_responses (dict): A dictionary of agents responses.
             future (bool): Whether to save to future_questions (True) or questions (False).
+            distribution_counts (DistributionCounts, optional): The running answer counts of
+                the agents.
 
         Returns:
             dict: Each agent's responses.
@@ -303,6 +1284,8 @@ class LlmHandler:
             for question, answer in responses.items():
                 if question not in target:
                     target[question] = [answer]
+                    if distribution_counts is not None:
+                        distribution_counts.add(question, answer, future=future)
                 else:
                     target[question].append(answer)
 
@@ -0,0 +1,124 @@
+import os
+import threading
+from typing import List, Any, Optional
+from .cancellation import CancellationToken, RequestCancelled
+
+
+class LocalLLM:
+    """
+    Handles a local model that runs on the CPU with llama.cpp (the `llama-cpp-python` package).
+    No network connection or API-key is needed, so simulations can be run offline and without
+    rate limits.
+
+    Attributes:
+        ai_model: A `llama_cpp.Llama` instance.
+    """
+
+    def __init__(self, ai_model: Any, max_tokens: int = 1024) -> None:
+        """Constructor for LocalLLM.
+
+        Args:
+            ai_model: A `llama_cpp.Llama` instance. The number of CPU threads is set when the
+                instance is created.
+            max_tokens (int): The maximum number of tokens in a response.
+        """
+        self.__ai_model = ai_model
+        self.max_tokens = max_tokens
+        self.model = os.path.basename(getattr(ai_model, "model_path", "local"))
+        # A llama.cpp context can evaluate only one sequence at a time
+        self.__lock = threading.Lock()
+
+        try:
+            from llama_cpp import LlamaRAMCache
+
+            # The prompts share a long intro: keep the evaluated prefix in memory, so that only
+            # the agent-specific part of the next prompt has to be evaluated
+            ai_model.set_cache(LlamaRAMCache())
+        except ImportError:
+            pass
+
+    def get_response(
+        self, prompt: str, cancellation: Optional[CancellationToken] = None
+    ) -> str:
+        """Returns a response to the given prompt generated by the local model."""
+        return self._generate_answers(prompt, 1, cancellation)[0]
+
+    def get_parallel_responses(
+        self, prompts: List[str], cancellation: Optional[CancellationToken] = None
+    ) -> str:
+        """Generates responses to a batch of prompts. The prompts are evaluated one after another
+        in the same context, so the shared beginning of the prompts is evaluated only once.
+
+        Args:
+            prompts (list): A list of prompts.
+            cancellation (CancellationToken, optional): The cancellation token of the request.
+                The remaining prompts are not evaluated after it is cancelled.
+
+        Returns:
+            str: The responses as markdown text or if an error occurs, the error message.
+
+        Raises:
+            RequestCancelled: If the request is cancelled.
+        """
+        try:
+            responses = [self.get_response(prompt, cancellation) for prompt in prompts]
+        except RequestCancelled:
+            raise
+        except Exception as e:
+            return f"## Error\n\nError message: {e}"
+
+        return self._format_response(responses)
+
+    def get_parallel_multiple_responses(
+        self,
+        prompts: List[str],
+        n: int,
+        cancellation: Optional[CancellationToken] = None,
+    ) -> List[List[str]]:
+        """Generates `n` responses to each of the prompts.
+
+        Args:
+            prompts (list): A list of prompts.
+            n (int): The number of responses per prompt.
+            cancellation (CancellationToken, optional): The cancellation token of the request.
+
+        Returns:
+            list: A list of responses for each prompt or an empty list if an error occurs.
+
+        Raises:
+            RequestCancelled: If the request is cancelled.
+        """
+        try:
+            return [
+                self._generate_answers(prompt, n, cancellation) for prompt in prompts
+            ]
+        except RequestCancelled:
+            raise
+        except Exception:
+            return []
+
+    def _generate_answers(
+        self, prompt: str, n: int, cancellation: Optional[CancellationToken] = None
+    ) -> List[str]:
+        """Generates `n` responses to a prompt. After the first response the prompt is found in
+        the cache, so only the new tokens are generated. A generation that has started cannot be
+        interrupted, so the cancellation token is checked before each one."""
+        answers = []
+        with self.__lock:
+            for _ in range(n):
+                if cancellation is not None:
+                    cancellation.raise_if_cancelled()
+                completion = self.__ai_model.create_chat_completion(
+                    messages=[{"role": "user", "content": prompt}],
+                    max_tokens=self.max_tokens,
+                )
+                answers.append(completion["choices"][0]["message"]["content"])
+        return answers
+
+    def _format_response(self, responses: List[str]) -> str:
+        """Turns the response to markdown text and returns it."""
+        text = ""
+        for response in responses:
+            text += "## Answer\n\n"
+            text += response.strip() + "\n"
+        return text
@@ -1,10 +1,11 @@
 import asyncio
 import threading
-from typing import List
+from typing import List, Dict, Tuple, Any, Optional
 
 from openai import OpenAI as GritOpenAI, AsyncOpenAI as GritAsyncOpenAI
 
 from ..key_config import OPENAI_API_KEY
+from .cancellation import CancellationToken, RequestCancelled, wait_for
 
 client = GritOpenAI(api_key=OPENAI_API_KEY)
 aclient = GritAsyncOpenAI(api_key=OPENAI_API_KEY)
@@ -24,6 +25,11 @@ class OpenAI:
         """
         self.openai_api_key = openai_api_key or OPENAI_API_KEY
         self.model = model
+        # OpenAI caches the prompt prefixes automatically. The usage of each completion tells how
+        # many prompt tokens were read from the cache.
+        self.__usage_lock = threading.Lock()
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
 
         self.loop = asyncio.new_event_loop()
         self.thread = threading.Thread(target=self._start_event_loop, daemon=True)
@@ -33,24 +39,113 @@ class OpenAI:
         asyncio.set_event_loop(self.loop)
         self.loop.run_forever()
 
-    def get_response(self, prompt: str) -> str:
+    def get_response(
+        self, prompt: str, cancellation: Optional[CancellationToken] = None
+    ) -> str:
+        """Returns a response to the prompt. If a cancellation token is given, the request is
+        sent from the event loop, so that it can be cancelled when the token is cancelled.
+        """
+        if cancellation is not None:
+            try:
+                future = asyncio.run_coroutine_threadsafe(
+                    self._generate_answer(prompt), self.loop
+                )
+                return wait_for(future, cancellation)
+            except RequestCancelled:
+                raise
+            except Exception as e:
+                return f"OpenAI Error: {e}"
+
         try:
             completion = client.chat.completions.create(
                 model=self.model, messages=[{"role": "user", "content": prompt}]
             )
+            self._record_usage(completion)
             return completion.choices[0].message.content
         except Exception as e:
             return f"OpenAI Error: {e}"
 
-    def get_parallel_responses(self, prompts: List[str]) -> str:
+    def get_parallel_multiple_responses(
+        self,
+        prompts: List[str],
+        n: int,
+        cancellation: Optional[CancellationToken] = None,
+    ) -> List[List[str]]:
+        """Sends multiple prompts in parallel and requests `n` completions for each of them.
+
+        Args:
+            prompts (list): A list of prompts.
+            n (int): The number of completions per prompt.
+            cancellation (CancellationToken, optional): The cancellation token of the request.
+
+        Returns:
+            list: A list of completions for each prompt or an empty list if an error occurs.
+
+        Raises:
+            RequestCancelled: If the request is cancelled.
+        """
+        try:
+            future = asyncio.run_coroutine_threadsafe(
+                self._create_multiple_responses(prompts, n), self.loop
+            )
+            return wait_for(future, cancellation)
+        except RequestCancelled:
+            raise
+        except Exception:
+            return []
+
+    def get_parallel_token_logprobs(
+        self,
+        prompts: List[str],
+        top_logprobs: int = 5,
+        cancellation: Optional[CancellationToken] = None,
+    ) -> List[List[Tuple[str, Dict[str, float]]]]:
+        """Sends multiple prompts in parallel and returns the log probabilities of the tokens
+        of each response.
+
+        Args:
+            prompts (list): A list of prompts.
+            top_logprobs (int): The number of most likely alternatives returned for each token.
+            cancellation (CancellationToken, optional): The cancellation token of the request.
+                The pending requests are cancelled when it is cancelled.
+
+        Returns:
+            list: For each prompt, the tokens of the response as tuples (token, alternatives),
+            where alternatives maps the most likely tokens to their log probabilities. Returns an
+            empty list if an error occurs.
+
+        Raises:
+            RequestCancelled: If the request is cancelled.
+        """
+        try:
+            future = asyncio.run_coroutine_threadsafe(
+                self._create_token_logprobs(prompts, top_logprobs), self.loop
+            )
+            return wait_for(future, cancellation)
+        except RequestCancelled:
+            raise
+        except Exception:
+            return []
+
+    def get_parallel_responses(
+        self, prompts: List[str], cancellation: Optional[CancellationToken] = None
+    ) -> str:
+        """Sends multiple prompts in parallel. The pending requests are cancelled when the
+        cancellation token is cancelled.
+
+        Raises:
+            RequestCancelled: If the request is cancelled.
+        """
         try:
             future = asyncio.run_coroutine_threadsafe(
                 self._create_responses(prompts), self.loop
             )
 
-            results = future.result()
+            results = wait_for(future, cancellation)
 
             return self._format_response(results)
+        except RequestCancelled:
+            raise
         except Exception as e:
             return f"OpenAI Error: {e}"
 
@@ -63,8 +158,69 @@ class OpenAI:
         completion = await aclient.chat.completions.create(
             model=self.model, messages=[{"role": "user", "content": prompt}]
         )
+        self._record_usage(completion)
         return completion.choices[0].message.content
 
+    async def _create_multiple_responses(
+        self, prompts: List[str], n: int
+    ) -> List[List[str]]:
+        tasks = [self._generate_answers(prompt, n) for prompt in prompts]
+        results = await asyncio.gather(*tasks)
+        return results
+
+    async def _generate_answers(self, prompt: str, n: int) -> List[str]:
+        completion = await aclient.chat.completions.create(
+            model=self.model, messages=[{"role": "user", "content": prompt}], n=n
+        )
+        self._record_usage(completion)
+        return [choice.message.content for choice in completion.choices]
+
+    async def _create_token_logprobs(
+        self, prompts: List[str], top_logprobs: int
+    ) -> List[List[Tuple[str, Dict[str, float]]]]:
+        tasks = [
+            self._generate_token_logprobs(prompt, top_logprobs) for prompt in prompts
+        ]
+        results = await asyncio.gather(*tasks)
+        return results
+
+    async def _generate_token_logprobs(
+        self, prompt: str, top_logprobs: int
+    ) -> List[Tuple[str, Dict[str, float]]]:
+        completion = await aclient.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+            logprobs=True,
+            top_logprobs=top_logprobs,
+        )
+        self._record_usage(completion)
+        content = completion.choices[0].logprobs.content or []
+        return [
+            (entry.token, {alt.token: alt.logprob for alt in entry.top_logprobs})
+            for entry in content
+        ]
+
+    def get_cache_statistics(self) -> Dict[str, float]:
+        """Returns the number of prompt tokens, the number of them read from the cache and the
+        hit rate."""
+        return {
+            "prompt tokens": self.prompt_tokens,
+            "cached tokens": self.cached_tokens,
+            "hit rate": (
+                self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+            ),
+        }
+
+    def _record_usage(self, completion: Any) -> None:
+        """Adds the token counts of a completion to the usage statistics."""
+        usage = getattr(completion, "usage", None)
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        with self.__usage_lock:
+            self.prompt_tokens += getattr(usage, "prompt_tokens", 0) or 0
+            self.cached_tokens += getattr(details, "cached_tokens", 0) or 0
+
     def _format_response(self, responses: List[str]) -> str:
         text = ""
         for response in responses:
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from .cancellation import POLL_INTERVAL, CancellationToken, RequestCancelled
+
+
+class PipelineNode:
+    """One stage of a pipeline, e.g. the answers of the agents to one question. The result of a
+    node depends only on its parameters and the results of its input nodes, so the node is
+    identified by a hash of them. Nodes with the same key are computed once and the result is
+    reused.
+
+    Attributes:
+        name (str): The name of the stage, e.g. "answers".
+        function (callable): Computes the result from the results of the inputs (as positional
+            arguments) and the parameters (as keyword arguments).
+        inputs (list): The nodes whose results the node needs.
+        params (dict): The parameters. They must be JSON serializable.
+        key (str): The hash of the name, the parameters and the keys of the inputs.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        function: Callable[..., Any],
+        inputs: Sequence["PipelineNode"] = (),
+        params: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        self.name = name
+        self.function = function
+        self.inputs = list(inputs)
+        self.params = params or {}
+        self.key = hashlib.sha256(
+            json.dumps(
+                {
+                    "name": name,
+                    "params": self.params,
+                    "inputs": [node.key for node in self.inputs],
+                },
+                sort_keys=True,
+            ).encode("utf-8")
+        ).hexdigest()
+
+    def __repr__(self) -> str:
+        return f"PipelineNode({self.name}, {self.key[:12]})"
+
+
+class Pipeline:
+    """Runs pipeline nodes and memoizes their results by key. Running a node runs its inputs
+    first, so when one parameter changes, only the nodes that depend on it are computed again
+    and the results of the others are reused.
+
+    The results are kept in memory, the least recently used are dropped first. If several
+    threads run the same node at the same time, it is computed only once and the other threads
+    wait for the result. Failed nodes are not memoized. If the thread computing a node is
+    cancelled, the waiting threads compute the node themselves instead of being cancelled too.
+    A waiting thread stops waiting when its own request is cancelled; the computation it was
+    waiting for goes on for the other threads.
+
+    Attributes:
+        max_results (int): The maximum number of memoized results.
+    """
+
+    def __init__(self, max_results: int = 512) -> None:
+        self.max_results = max_results
+        self.__results = OrderedDict()
+        self.__running: Dict[str, Future] = {}
+        self.__lock = threading.Lock()
+
+    def run(
+        self,
+        node: PipelineNode,
+        trace: Optional[List[Dict[str, str]]] = None,
+        cancellation: Optional[CancellationToken] = None,
+    ) -> Any:
+        """Returns the result of the node, computing it and its inputs if needed.
+
+        Args:
+            node (PipelineNode): The node.
+            trace (list, optional): If given, a dictionary is appended for each node that is
+                run: {"stage": name, "key": key, "status": "computed" or "reused"}.
+            cancellation (CancellationToken, optional): The cancellation token of the request.
+                It stops the waiting for a node that another thread is computing.
+
+        Returns:
+            The result of the node.
+
+        Raises:
+            RequestCancelled: If the request is cancelled while waiting for another thread.
+        """
+        while True:
+            with self.__lock:
+                if node.key in self.__results:
+                    self.__results.move_to_end(node.key)
+                    _record(trace, node, "reused")
+                    return self.__results[node.key]
+
+                running = self.__running.get(node.key)
+                if running is None:
+                    running = self.__running[node.key] = Future()
+                    break
+
+            try:
+                result = _wait(running, cancellation)
+            except RequestCancelled:
+                if cancellation is not None and cancellation.is_cancelled():
+                    raise
+                # The request that computed the node was cancelled, which says nothing about
+                # this one: compute the node again with its own cancellation token
+                continue
+            _record(trace, node, "reused")
+            return result
+
+        try:
+            inputs = [
+                self.run(input_node, trace, cancellation) for input_node in node.inputs
+            ]
+            result = node.function(*inputs, **node.params)
+        except BaseException as error:
+            with self.__lock:
+                del self.__running[node.key]
+            running.set_exception(error)
+            raise
+
+        with self.__lock:
+            self.__results[node.key] = result
+            while len(self.__results) > self.max_results:
+                self.__results.popitem(last=False)
+            del self.__running[node.key]
+        running.set_result(result)
+
+        _record(trace, node, "computed")
+        return result
+
+    def __contains__(self, node: PipelineNode) -> bool:
+        """Returns True if the result of the node is memoized."""
+        return node.key in self.__results
+
+
+def _wait(running: Future, cancellation: Optional[CancellationToken]) -> Any:
+    """Waits for the result of a node that another thread is computing. Unlike `wait_for`, the
+    future is not cancelled when the request is, since other threads may wait for it too.
+    """
+    if cancellation is None:
+        return running.result()
+
+    while True:
+        cancellation.raise_if_cancelled()
+        remaining = cancellation.remaining()
+        timeout = POLL_INTERVAL if remaining is None else min(POLL_INTERVAL, remaining)
+        try:
+            return running.result(timeout=timeout)
+        except FutureTimeout:
+            continue
+
+
+def _record(
+    trace: Optional[List[Dict[str, str]]], node: PipelineNode, status: str
+) -> None:
+    if trace is not None:
+        trace.append({"stage": node.name, "key": node.key, "status": status})
@@ -0,0 +1,57 @@
+import threading
+from typing import Iterable, Optional
+from ..entities.agent import Agent
+from ..entities.population import Population
+from .distribution_counts import DistributionCounts
+
+
+class PopulationStore:
+    """Holds the current version of the agents of the session. Readers take the current
+    _Population_ once and use it until the end of the request, so a long transformation does not
+    change the agents under them. Writers copy the agents, modify the copies and publish them as
+    a new version, which replaces the current one atomically.
+
+    Reading the current version does not take a lock. Publishing takes a short lock, so that a
+    writer can check that no other writer has published since it read its base version.
+    """
+
+    def __init__(self) -> None:
+        self.__current = Population([])
+        self.__lock = threading.Lock()
+
+    def current(self) -> Population:
+        """Returns the current version of the agents."""
+        return self.__current
+
+    def publish(
+        self,
+        agents: Iterable[Agent],
+        base: Optional[Population] = None,
+        distribution_counts: Optional[DistributionCounts] = None,
+    ) -> Optional[Population]:
+        """Publishes the agents as the new current version.
+
+        Args:
+            agents (iterable): The agents of the new version.
+            base (Population, optional): The version the agents were copied from. If another
+                version has been published since, nothing is published. Defaults to **None**,
+                when the agents replace any version (e.g. new agents are created).
+            distribution_counts (DistributionCounts, optional): The answer counts of the agents,
+                if they have been kept up to date while the answers were saved. Otherwise the
+                answers are counted from the agents.
+
+        Returns:
+            Population: The published version, or None if `base` is no longer current.
+        """
+        agents = list(agents)
+        if distribution_counts is None:
+            # Counted before taking the lock, so that readers and writers are not delayed
+            distribution_counts = DistributionCounts.from_agents(agents)
+
+        with self.__lock:
+            if base is not None and base.version != self.__current.version:
+                return None
+            self.__current = Population(
+                agents, self.__current.version + 1, distribution_counts
+            )
+            return self.__current
@@ -0,0 +1,143 @@
+import re
+from itertools import chain
+from typing import Tuple
+import numpy as np
+
+# The line of an agent, e.g. "Agent 3: 4, 2". The second group is the comma-separated list of
+# whole numbers at the beginning of the answers. The numbers have at most 9 digits, so that
+# they fit in the NumPy integers; longer numbers are not answers. The pattern starts with a line
+# break, so the regular expression engine can skip quickly from one line to the next.
+AGENT_LINE = re.compile(
+    r"\n[ \t]*Agent[ \t]*(\d{1,9})[ \t]*:[ \t]*"
+    r"((?:\d{1,9}(?![\w.])[ \t]*,[ \t]*)*\d{1,9}(?![\w.]))?"
+)
+
+# The header of a respondent, e.g. "Respondent 2:". Splitting at the headers leaves the values
+# of each respondent in a block of their own. Like the agent numbers, the respondent numbers
+# have at most 9 digits.
+RESPONDENT = re.compile(r"Respondent[ \t]*(\d{1,9})(?!\d)[ \t]*:?")
+# A line that contains only a number
+VALUE_LINE = re.compile(
+    r"^[ \t]*([-+]?(?:\d+(?:\.\d*)?|\.\d+))[ \t]*\r?$", re.MULTILINE
+)
+
+
+def parse_likert_answers(
+    response: str, number_of_agents: int, number_of_questions: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Parses the answers of the agents from a response of the LLM. The lines are found with one
+    regular expression and all answers are converted into a NumPy array at once, so responses of
+    thousands of agents are parsed quickly. The answers of "Agent N" are written to row N - 1.
+    Lines of unknown agents and other text are skipped, and only the first line of each agent is
+    used.
+
+    Args:
+        response (str): The response of the LLM.
+        number_of_agents (int): The number of agents in the prompt.
+        number_of_questions (int): The number of statements in the prompt.
+
+    Returns:
+        Tuple: (the answers, shape (agents, questions), the number of answers given by each
+        agent). The answers of agent i are in the first `counts[i]` columns of row i.
+    """
+    answers = np.zeros((number_of_agents, number_of_questions), dtype=np.int64)
+    counts = np.zeros(number_of_agents, dtype=np.int32)
+
+    lines = AGENT_LINE.findall("\n" + response)
+    if not lines:
+        return answers, counts
+
+    rows = np.array([agent_id for agent_id, _ in lines], dtype=np.int64) - 1
+    line_counts = np.array([text.count(",") + 1 if text else 0 for _, text in lines])
+    texts = ",".join(text for _, text in lines if text)
+    values = np.array(texts.split(",") if texts else [], dtype=np.int64)
+
+    # The position of each answer on its line
+    line_of_value = np.repeat(np.arange(len(lines)), line_counts)
+    position = np.arange(len(values)) - np.repeat(
+        np.cumsum(line_counts) - line_counts, line_counts
+    )
+
+    # Only the first line of each known agent is used
+    known = (rows >= 0) & (rows < number_of_agents)
+    _, first = np.unique(np.where(known, rows, -1), return_index=True)
+    used = np.zeros(len(lines), dtype=bool)
+    used[first[known[first]]] = True
+
+    selected = used[line_of_value] & (position < number_of_questions)
+    answers[rows[line_of_value[selected]], position[selected]] = values[selected]
+    counts[rows[used]] = np.minimum(line_counts[used], number_of_questions)
+
+    return answers, counts
+
+
+def parse_latent_values(
+    response: str, number_of_agents: int, number_of_variables: int
+) -> np.ndarray:
+    """Parses the new latent variable values of the respondents from a response of the LLM. The
+    response is split at the respondent headers with one regular expression and all values are
+    converted into a NumPy array at once. The values that follow "Respondent N" are written to
+    row N - 1, so the respondents may come in any order. Lines that are not numbers (e.g.
+    "Latent variable values:") are skipped.
+
+    Args:
+        response (str): The response of the LLM.
+        number_of_agents (int): The number of respondents in the prompt.
+        number_of_variables (int): The number of latent variables.
+
+    Returns:
+        np.ndarray: The values, shape (respondents, latent variables).
+
+    Raises:
+        RuntimeError: If the LLM gives a respondent number that does not match any respondent or
+            gives the values of a respondent twice.
+        RuntimeError: If, for some respondent, the LLM gives more or fewer values than there
+            are latent variables.
+    """
+    # [text before the first respondent, number, values, number, values, ...]
+    parts = RESPONDENT.split(response)
+    rows = np.array(parts[1::2], dtype=np.int64) - 1
+
+    unknown = (rows < 0) | (rows >= number_of_agents)
+    if unknown.any():
+        raise RuntimeError(
+            f"The LLM gave values for respondent {rows[unknown][0] + 1}, but there were "
+            f"{number_of_agents} respondents"
+        )
+    repeated = np.flatnonzero(np.bincount(rows, minlength=number_of_agents) > 1)
+    if len(repeated):
+        raise RuntimeError(
+            f"The LLM gave values for respondent {repeated[0] + 1} twice"
+        )
+
+    blocks = [block.split() for block in parts[2::2]]
+    try:
+        values = np.array(list(chain.from_iterable(blocks)), dtype=float)
+        if not np.isfinite(values).all():
+            # Words like "nan" are not values
+            raise ValueError("Not a number")
+    except ValueError:
+        # Some lines contain text: keep only the lines that are numbers
+        blocks = [VALUE_LINE.findall(block) for block in parts[2::2]]
+        values = np.array(list(chain.from_iterable(blocks)), dtype=float)
+
+    block_counts = np.array([len(block) for block in blocks], dtype=np.int64)
+    counts = np.zeros(number_of_agents, dtype=np.int64)
+    counts[rows] = block_counts
+
+    too_many = np.flatnonzero(counts > number_of_variables)
+    if len(too_many):
+        raise RuntimeError(
+            f"Respondent {too_many[0] + 1} got too many new latent values"
+        )
+    too_few = np.flatnonzero(counts < number_of_variables)
+    if len(too_few):
+        raise RuntimeError(
+            f"Respondent {too_few[0] + 1} got {counts[too_few[0]]} new latent values, "
+            f"but there are {number_of_variables} latent variables"
+        )
+
+    # Every respondent has exactly one value per variable: place the blocks as rows
+    result = np.empty((number_of_agents, number_of_variables))
+    result[rows] = values.reshape(len(rows), number_of_variables)
+    return result
@@ -0,0 +1,138 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
+from ..entities.agent import Agent
+from .cancellation import CancellationToken
+from .get_data import GetData
+
+
+class ScenarioComparison:
+    """This class compares the answers of the agents under several future scenarios. Call the
+    method `compare` to transform copies of the agents into each scenario concurrently and ask
+    the same questions from all of them in parallel.
+
+    Attributes:
+        llm_handler: The LlmHandler used to ask the questions.
+        transformer: The AgentTransformer used to transform the agents into the future.
+    """
+
+    def __init__(self, llm_handler: Any, transformer: Any) -> None:
+        """Initializes the comparison.
+
+        Args:
+            llm_handler: The LlmHandler used to ask the questions.
+            transformer: The AgentTransformer used to transform the agents into the future.
+        """
+        self.llm_handler = llm_handler
+        self.transformer = transformer
+
+    def compare(
+        self,
+        agents: List[Agent],
+        scenarios: List[str],
+        questions: List[str],
+        cancellation: Optional[CancellationToken] = None,
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Transforms a copy of the agents into each future scenario and asks the questions from the
+        original agents and every scenario variant. The transformations run concurrently with
+        the questions to the original agents. The original answers are then copied to every
+        variant, so that each scenario only costs the calls for its future agents, and all
+        scenarios are asked in parallel. The given agents are not modified.
+
+        Args:
+            agents (list): A list of Agent objects.
+            scenarios (list): The future scenarios.
+            questions (list): The statements to be answered.
+            cancellation (CancellationToken, optional): The cancellation token of the request.
+                It is passed to every transformation and question.
+
+        Returns:
+            Tuple: (current_distributions, scenario_distributions), where
+            scenario_distributions has one entry per scenario, in the same order:
+                [{"scenario": "Scenario text", "future_distributions": [...]}]
+
+        Raises:
+            RuntimeError: If the transformation into some scenario fails.
+            RequestCancelled: If the request is cancelled.
+        """
+        original_agents = [agent.create_variant() for agent in agents]
+        scenario_agents = [
+            [agent.create_variant() for agent in agents] for _ in scenarios
+        ]
+
+        with ThreadPoolExecutor(max_workers=len(scenarios) + 1) as executor:
+            transformations = [
+                executor.submit(
+                    self.transformer.transform_agents_to_future,
+                    variants,
+                    scenario,
+                    cancellation,
+                )
+                for variants, scenario in zip(scenario_agents, scenarios)
+            ]
+            original_answering = executor.submit(
+                self._ask_original_questions, original_agents, questions, cancellation
+            )
+
+            for transformation in transformations:
+                transformation.result()
+            original_answering.result()
+
+            for variants in scenario_agents:
+                self._copy_original_answers(original_agents, variants)
+
+            answering = [
+                executor.submit(self._ask_questions, variants, questions, cancellation)
+                for variants in scenario_agents
+            ]
+            for future in answering:
+                future.result()
+
+        get_data = GetData()
+        current_distributions, _ = get_data.get_all_distributions(original_agents)
+        scenario_distributions = [
+            {
+                "scenario": scenario,
+                "future_distributions": get_data.get_all_distributions(variants)[1],
+            }
+            for variants, scenario in zip(scenario_agents, scenarios)
+        ]
+
+        return current_distributions, scenario_distributions
+
+    def _ask_original_questions(
+        self,
+        agents: List[Agent],
+        questions: List[str],
+        cancellation: Optional[CancellationToken] = None,
+    ) -> None:
+        """Asks the questions that the agents have not answered yet, one by one."""
+        unanswered = [
+            question
+            for question in questions
+            if not all(question in agent.questions for agent in agents)
+        ]
+        self._ask_questions(agents, unanswered, cancellation)
+
+    def _ask_questions(
+        self,
+        agents: List[Agent],
+        questions: List[str],
+        cancellation: Optional[CancellationToken] = None,
+    ) -> None:
+        """Asks the questions from the agents one by one. The answers are saved into the
+        agents."""
+        for question in questions:
+            self.llm_handler.get_agents_responses(
+                agents, [question], cancellation=cancellation
+            )
+
+    def _copy_original_answers(
+        self, source_agents: List[Agent], target_agents: List[Agent]
+    ) -> None:
+        """Copies the original answers of each source agent to the corresponding target agent."""
+        for source, target in zip(source_agents, target_agents):
+            target.questions = {
+                question: list(answers)
+                for question, answers in source.questions.items()
+            }
@@ -0,0 +1,292 @@
+import math
+from statistics import NormalDist
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from .get_data import LIKERT_LEVELS, first_answer_matrix
+
+# The possible changes of a Likert answer, from -4 (5 -> 1) to 4 (1 -> 5)
+SHIFTS = np.arange(1 - len(LIKERT_LEVELS), len(LIKERT_LEVELS))
+
+
+def get_shift_statistics(
+    agents: List[Any],
+    confidence: float = 0.95,
+    resamples: int = 2000,
+    rng: Optional[np.random.Generator] = None,
+) -> List[Dict[str, Any]]:
+    """Compares the answers of each agent before and after the transformation to the future.
+    For each question, returns the mean shift of the answers, the share of agents that changed
+    their answer, bootstrap confidence intervals of both, the Wilcoxon signed-rank test of the
+    shifts and Bowker's chi-square test of symmetry of the paired answers. All questions are
+    handled at once with NumPy.
+
+    Args:
+        agents (list): List of Agent objects
+        confidence (float): The confidence level of the confidence intervals (default 0.95)
+        resamples (int): The number of bootstrap resamples (default 2000)
+        rng (np.random.Generator, optional): The random number generator of the bootstrap
+
+    Returns:
+        list: The statistics of each question answered by both the current and future agents,
+        or an empty list if there are no future answers. An example of one question:
+            {
+                "question": "I like pasta",
+                "agents": 50,
+                "mean shift": 0.4,
+                "mean shift confidence interval": [0.2, 0.6],
+                "changed share": 0.5,
+                "changed share confidence interval": [0.36, 0.64],
+                "increased share": 0.4,
+                "decreased share": 0.1,
+                "wilcoxon": {"statistic": 280.5, "z": 3.1, "p value": 0.002},
+                "symmetry test": {"chi-square": 12.3, "degrees of freedom": 6,
+                                  "p value": 0.06}
+            }
+        Values that cannot be calculated, e.g. the tests of a question that no agent changed
+        their answer to, are None.
+    """
+    if not agents or not agents[0].future_questions:
+        return []
+
+    questions = [
+        question
+        for question in dict.fromkeys(agents[0].questions)
+        if question in agents[0].future_questions
+    ]
+    if not questions:
+        return []
+
+    current = first_answer_matrix(agents, questions)
+    future = first_answer_matrix(agents, questions, future=True)
+    return shift_statistics(current, future, questions, confidence, resamples, rng)
+
+
+def shift_statistics(
+    current: np.ndarray,
+    future: np.ndarray,
+    questions: List[str],
+    confidence: float = 0.95,
+    resamples: int = 2000,
+    rng: Optional[np.random.Generator] = None,
+) -> List[Dict[str, Any]]:
+    """Returns the statistics of `get_shift_statistics` from the paired answers.
+
+    Args:
+        current (np.ndarray): The current answers, shape (agents, questions). Missing answers
+            are 0.
+        future (np.ndarray): The future answers of the same agents, shape (agents, questions).
+        questions (list): The questions.
+        confidence (float): The confidence level of the confidence intervals.
+        resamples (int): The number of bootstrap resamples.
+        rng (np.random.Generator, optional): The random number generator of the bootstrap.
+
+    Returns:
+        list: The statistics of each question.
+    """
+    shift_counts = paired_shift_counts(current, future)
+    agents = shift_counts.sum(axis=1)
+    zero = len(SHIFTS) // 2
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_shift = (shift_counts * SHIFTS).sum(axis=1) / agents
+        changed = 1 - shift_counts[:, zero] / agents
+        increased = shift_counts[:, zero + 1 :].sum(axis=1) / agents
+        decreased = shift_counts[:, :zero].sum(axis=1) / agents
+
+    mean_interval, changed_interval = bootstrap_shift_intervals(
+        shift_counts, confidence, resamples, rng
+    )
+    wilcoxon, z, wilcoxon_p = wilcoxon_signed_rank(shift_counts)
+    chi_square, degrees, symmetry_p = symmetry_test(current, future)
+
+    return [
+        {
+            "question": question,
+            "agents": int(agents[j]),
+            "mean shift": _value(mean_shift[j]),
+            "mean shift confidence interval": _interval(mean_interval[:, j]),
+            "changed share": _value(changed[j]),
+            "changed share confidence interval": _interval(changed_interval[:, j]),
+            "increased share": _value(increased[j]),
+            "decreased share": _value(decreased[j]),
+            "wilcoxon": {
+                "statistic": _value(wilcoxon[j]),
+                "z": _value(z[j]),
+                "p value": _value(wilcoxon_p[j]),
+            },
+            "symmetry test": {
+                "chi-square": _value(chi_square[j]),
+                "degrees of freedom": int(degrees[j]),
+                "p value": _value(symmetry_p[j]),
+            },
+        }
+        for j, question in enumerate(questions)
+    ]
+
+
+def paired_shift_counts(current: np.ndarray, future: np.ndarray) -> np.ndarray:
+    """Counts the agents of each question by the shift of their answer, from -4 to 4. Agents
+    without both answers are left out.
+
+    Returns:
+        np.ndarray: The counts in a matrix of shape (questions, 9).
+    """
+    number_of_questions = current.shape[1]
+    valid = _answered(current) & _answered(future)
+    keys = np.arange(number_of_questions) * len(SHIFTS) + (future - current - SHIFTS[0])
+
+    return np.bincount(
+        keys[valid], minlength=number_of_questions * len(SHIFTS)
+    ).reshape(number_of_questions, len(SHIFTS))
+
+
+def bootstrap_shift_intervals(
+    shift_counts: np.ndarray,
+    confidence: float = 0.95,
+    resamples: int = 2000,
+    rng: Optional[np.random.Generator] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Returns the percentile bootstrap confidence intervals of the mean shift and the share of
+    changed answers. Resampling the agents with replacement is the same as drawing the counts of
+    the shifts from a multinomial distribution, so all resamples of all questions are drawn at
+    once and the time taken does not depend on the number of agents.
+
+    Args:
+        shift_counts (np.ndarray): The counts of the shifts, shape (questions, 9).
+        confidence (float): The confidence level.
+        resamples (int): The number of bootstrap resamples.
+        rng (np.random.Generator, optional): The random number generator.
+
+    Returns:
+        Tuple: (the interval of the mean shift, the interval of the changed share), each of shape
+        (2, questions). The intervals of questions without agents are NaN.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    agents = shift_counts.sum(axis=1)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        probabilities = np.where(
+            agents[:, np.newaxis] > 0,
+            shift_counts / agents[:, np.newaxis],
+            1 / len(SHIFTS),
+        )
+        samples = rng.multinomial(agents, probabilities, size=(resamples, len(agents)))
+        means = (samples * SHIFTS).sum(axis=2) / agents
+        changed = 1 - samples[:, :, len(SHIFTS) // 2] / agents
+
+    quantiles = [(1 - confidence) / 2, (1 + confidence) / 2]
+    return np.quantile(means, quantiles, axis=0), np.quantile(
+        changed, quantiles, axis=0
+    )
+
+
+def wilcoxon_signed_rank(
+    shift_counts: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """The Wilcoxon signed-rank test of the shifts of each question, with the normal
+    approximation and the correction for ties. Unchanged answers are left out. Since the
+    absolute shifts are 1-4, the average ranks of the ties are calculated from the counts.
+
+    Args:
+        shift_counts (np.ndarray): The counts of the shifts, shape (questions, 9).
+
+    Returns:
+        Tuple: (the sum of the ranks of the positive shifts, z, the two-sided p value), each of
+        shape (questions,). z and p are NaN if no answer changed.
+    """
+    zero = len(SHIFTS) // 2
+    positive = shift_counts[:, zero + 1 :]
+    negative = shift_counts[:, :zero][:, ::-1]
+    ties = positive + negative
+
+    # The average rank of each absolute shift 1-4
+    ranks = np.cumsum(ties, axis=1) - (ties - 1) / 2
+    statistic = (positive * ranks).sum(axis=1)
+
+    n = ties.sum(axis=1)
+    mean = n * (n + 1) / 4
+    variance = n * (n + 1) * (2 * n + 1) / 24 - (ties**3 - ties).sum(axis=1) / 48
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        z = np.where(variance > 0, (statistic - mean) / np.sqrt(variance), np.nan)
+    p = np.array(
+        [
+            2 * (1 - NormalDist().cdf(abs(value))) if not np.isnan(value) else np.nan
+            for value in z
+        ]
+    )
+    return statistic, z, p
+
+
+def symmetry_test(
+    current: np.ndarray, future: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Bowker's chi-square test of symmetry of the paired answers of each question. The test
+    tells whether the answers moved in some direction more than in the opposite one.
+
+    Args:
+        current (np.ndarray): The current answers, shape (agents, questions).
+        future (np.ndarray): The future answers, shape (agents, questions).
+
+    Returns:
+        Tuple: (chi-square, degrees of freedom, p value), each of shape (questions,). The p
+        value is NaN if no answer changed.
+    """
+    levels = len(LIKERT_LEVELS)
+    number_of_questions = current.shape[1]
+    valid = _answered(current) & _answered(future)
+
+    # The 5 x 5 table of the (current, future) answers of each question
+    keys = (np.arange(number_of_questions) * levels + current - 1) * levels + future - 1
+    tables = np.bincount(
+        keys[valid], minlength=number_of_questions * levels * levels
+    ).reshape(number_of_questions, levels, levels)
+
+    opposite = tables.transpose(0, 2, 1)
+    pairs = (tables + opposite) * np.triu(np.ones((levels, levels)), k=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        terms = np.where(pairs > 0, (tables - opposite) ** 2 / pairs, 0.0)
+
+    chi_square = terms.sum(axis=(1, 2))
+    degrees = (pairs > 0).sum(axis=(1, 2))
+    p = np.array(
+        [
+            chi_square_sf(value, int(df)) if df > 0 else np.nan
+            for value, df in zip(chi_square, degrees)
+        ]
+    )
+    return chi_square, degrees, p
+
+
+def chi_square_sf(x: float, degrees: int) -> float:
+    """Returns the probability that a chi-square distributed variable with an integer number of
+    degrees of freedom is greater than x."""
+    if x <= 0:
+        return 1.0
+
+    if degrees % 2 == 0:
+        term = total = math.exp(-x / 2)
+        for i in range(1, degrees // 2):
+            term *= x / (2 * i)
+            total += term
+    else:
+        total = math.erfc(math.sqrt(x / 2))
+        term = math.sqrt(2 * x / math.pi) * math.exp(-x / 2)
+        for i in range(1, (degrees + 1) // 2):
+            total += term
+            term *= x / (2 * i + 1)
+
+    return min(total, 1.0)
+
+
+def _answered(answers: np.ndarray) -> np.ndarray:
+    return (answers >= 1) & (answers <= len(LIKERT_LEVELS))
+
+
+def _value(value: float) -> Optional[float]:
+    """Converts a NumPy value to a float, or None if it is NaN."""
+    return None if np.isnan(value) else float(value)
+
+
+def _interval(interval: np.ndarray) -> Optional[List[float]]:
+    return None if np.isnan(interval).any() else [float(value) for value in interval]
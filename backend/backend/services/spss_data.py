@@ -0,0 +1,68 @@
+import hashlib
+from typing import Any, Dict, Iterator
+import pandas as pd
+import pyreadstat
+
+# SPSS variables that are renamed to the demographic fields of the agents
+DEMOGRAPHIC_FIELDS = {"age": "Age", "gender": "Gender", "sex": "Gender"}
+
+
+def file_hash(path: str) -> str:
+    """Returns the SHA-256 hash of a file, read in blocks of 1 MB."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_sav_metadata(sav_path: str) -> Dict[str, Any]:
+    """Reads the metadata of an SPSS file without reading the data.
+
+    Returns:
+        dict: The variable labels ("column_labels"), the value labels of the variables
+        ("value_labels") and the number of rows ("rows").
+    """
+    _, meta = pyreadstat.read_sav(sav_path, metadataonly=True)
+    return {
+        "column_labels": dict(zip(meta.column_names, meta.column_labels)),
+        "value_labels": {
+            column: {str(value): label for value, label in labels.items()}
+            for column, labels in meta.variable_value_labels.items()
+        },
+        "rows": meta.number_rows,
+    }
+
+
+def column_names_from_metadata(metadata: Dict[str, Any]) -> Dict[str, str]:
+    """Returns the names of the training data columns for the SPSS variables. The demographic
+    variables become "Age" and "Gender", and the other variables are named by their variable
+    labels (e.g. "Tech Orientation - Trust in food production technology"), which are shown to
+    the LLM as the names of the latent variables."""
+    names = {}
+    for column, label in metadata["column_labels"].items():
+        demographic = DEMOGRAPHIC_FIELDS.get(column.lower()) or DEMOGRAPHIC_FIELDS.get(
+            (label or "").lower()
+        )
+        names[column] = demographic or label or column
+    return names
+
+
+def read_sav_chunks(sav_path: str, chunksize: int = 100_000) -> Iterator[pd.DataFrame]:
+    """Reads an SPSS file in chunks, so that a large file is never in memory as a whole. Coded
+    categorical values (e.g. 1 = Male) are replaced by their value labels and the columns are
+    renamed with `column_names_from_metadata`.
+
+    Args:
+        sav_path (str): The path of the SPSS file.
+        chunksize (int): The number of rows read at a time.
+
+    Yields:
+        DataFrame: The rows of one chunk.
+    """
+    names = column_names_from_metadata(read_sav_metadata(sav_path))
+    for chunk, meta in pyreadstat.read_file_in_chunks(
+        pyreadstat.read_sav, sav_path, chunksize=chunksize
+    ):
+        chunk = pyreadstat.set_value_labels(chunk, meta, formats_as_category=False)
+        yield chunk.rename(columns=names)
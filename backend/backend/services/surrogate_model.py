@@ -0,0 +1,143 @@
+from typing import List, Optional
+import numpy as np
+from ..entities.agent import Agent
+
+LIKERT_LEVELS = 5
+
+
+class OrdinalRegression:
+    """A lightweight ordinal regression from latent variable values to Likert answers. For each
+    threshold k = 1..4 a logistic regression estimates P(answer > k) (the method of Frank and
+    Hall), and the probability of each Likert level is the difference of consecutive thresholds.
+    The features are standardized and the weights are fitted with gradient descent, so fitting a
+    few hundred agents takes milliseconds on the CPU.
+    """
+
+    def __init__(
+        self, l2: float = 0.01, learning_rate: float = 1.0, iterations: int = 300
+    ) -> None:
+        """Constructor for OrdinalRegression.
+
+        Args:
+            l2 (float): The strength of the L2 regularization of the weights.
+            learning_rate (float): The step size of gradient descent.
+            iterations (int): The number of gradient descent steps.
+        """
+        self.l2 = l2
+        self.learning_rate = learning_rate
+        self.iterations = iterations
+        self.mean = None
+        self.scale = None
+        self.weights = None
+
+    def fit(self, X: np.ndarray, y: np.ndarray) -> "OrdinalRegression":
+        """Fits the model.
+
+        Args:
+            X (np.ndarray): The latent variable values, shape (agents, latent variables).
+            y (np.ndarray): The Likert answers 1-5 of the agents.
+
+        Returns:
+            OrdinalRegression: The fitted model.
+        """
+        self.mean = X.mean(axis=0)
+        self.scale = X.std(axis=0)
+        self.scale[self.scale == 0] = 1.0
+        features = self._features(X)
+
+        # targets[i, k] = 1 if the answer of agent i is greater than k + 1
+        targets = (y[:, None] > np.arange(1, LIKERT_LEVELS)).astype(float)
+        self.weights = np.zeros((features.shape[1], LIKERT_LEVELS - 1))
+        # Start the intercepts from the observed frequencies
+        frequencies = np.clip(targets.mean(axis=0), 0.01, 0.99)
+        self.weights[0] = np.log(frequencies / (1 - frequencies))
+
+        penalty = np.full((features.shape[1], 1), self.l2)
+        penalty[0] = 0.0
+        for _ in range(self.iterations):
+            predictions = _sigmoid(features @ self.weights)
+            gradient = features.T @ (predictions - targets) / len(y)
+            gradient += penalty * self.weights
+            self.weights -= self.learning_rate * gradient
+
+        return self
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Returns the probabilities of the Likert levels, shape (agents, 5)."""
+        exceed = _sigmoid(self._features(X) @ self.weights)
+        # P(answer > k) cannot grow with k
+        exceed = np.minimum.accumulate(exceed, axis=1)
+        ones = np.ones((len(X), 1))
+        zeros = np.zeros((len(X), 1))
+        cumulative = np.hstack([ones, exceed, zeros])
+        return cumulative[:, :-1] - cumulative[:, 1:]
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """Returns the most probable Likert answer of each agent."""
+        return self.predict_proba(X).argmax(axis=1) + 1
+
+    def _features(self, X: np.ndarray) -> np.ndarray:
+        """Returns the standardized features with a constant column for the intercept."""
+        return np.hstack([np.ones((len(X), 1)), (X - self.mean) / self.scale])
+
+
+def _sigmoid(values: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-np.clip(values, -30, 30)))
+
+
+def latent_matrix(
+    agents: List[Agent], latent_variables: List[str], future: bool = False
+) -> np.ndarray:
+    """Returns the latent variable values of the agents as a matrix. Values that are not numbers
+    are replaced by zero, the neutral value."""
+    rows = []
+    for agent in agents:
+        info = agent.get_agent_future_info() if future else agent.get_agent_info()
+        values = info.get("Answers", {})
+        row = []
+        for var_name in latent_variables:
+            try:
+                row.append(float(values.get(var_name)))
+            except (TypeError, ValueError):
+                row.append(0.0)
+        rows.append(row)
+
+    return np.nan_to_num(np.array(rows, dtype=float).reshape(len(agents), -1))
+
+
+def select_diverse(
+    X: np.ndarray, size: int, selected: Optional[List[int]] = None
+) -> List[int]:
+    """Selects rows that cover the latent space evenly: each new row is the one farthest from the
+    rows selected so far (farthest-point sampling). The first row is the one closest to the mean.
+
+    Args:
+        X (np.ndarray): The latent variable values.
+        size (int): The number of rows to select.
+        selected (list, optional): Rows that have already been selected.
+
+    Returns:
+        list: The indices of the newly selected rows.
+    """
+    selected = list(selected or [])
+    new = []
+    if not selected:
+        first = int(np.argmin(((X - X.mean(axis=0)) ** 2).sum(axis=1)))
+        selected.append(first)
+        new.append(first)
+
+    distances = np.full(len(X), np.inf)
+    for index in selected:
+        distances = np.minimum(distances, ((X - X[index]) ** 2).sum(axis=1))
+    while len(new) < size and distances.max() > 0:
+        index = int(distances.argmax())
+        new.append(index)
+        distances = np.minimum(distances, ((X - X[index]) ** 2).sum(axis=1))
+
+    return new
+
+
+def uncertainty(probabilities: np.ndarray) -> np.ndarray:
+    """Returns the uncertainty of each prediction: one minus the probability of the most
+    probable Likert level."""
+    return 1.0 - probabilities.max(axis=1)
@@ -0,0 +1,271 @@
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from ..entities.agent import Agent
+from .pipeline import Pipeline, PipelineNode
+from .llm_handler import LlmHandler
+from .agent_transformer import AgentTransformer
+from .training_data import TrainingData, dataframe_to_agents
+from .spss_data import file_hash
+from .cancellation import CancellationToken
+from .get_data import (
+    LIKERT_LABELS,
+    first_answer_matrix,
+    grouped_counts,
+    statistics_from_counts,
+)
+
+
+class SurveyPipeline:
+    """The workflow of the application as an explicit pipeline: sample the agents, transform
+    them to the future scenario, ask each question and make the distributions. Each stage is a
+    _PipelineNode_ keyed by a hash of its inputs, and the results are memoized in a _Pipeline_.
+
+        population -> original answers (one node per question) ---------> distributions
+             |                     |                                          ^
+             +-> transformation -> future answers (one node per question) ----+
+
+    The original answers do not depend on the scenario, so changing the scenario asks only the
+    future agents again, and changing one question asks only that question.
+
+    Attributes:
+        llm_handler (LlmHandler): Asks the questions.
+        transformer (AgentTransformer): Transforms the agents to the future.
+        training_data (TrainingData): The training data the agents are sampled from.
+        pipeline (Pipeline): The memoized results.
+    """
+
+    def __init__(
+        self,
+        llm_handler: LlmHandler,
+        transformer: AgentTransformer,
+        training_data: TrainingData,
+        pipeline: Optional[Pipeline] = None,
+    ) -> None:
+        self.llm_handler = llm_handler
+        self.transformer = transformer
+        self.training_data = training_data
+        self.pipeline = pipeline if pipeline is not None else Pipeline()
+        self.__training_data_hash = None
+
+    def run(
+        self,
+        questions: List[str],
+        scenario: Optional[str] = None,
+        agent_count: int = 50,
+        seed: int = 0,
+        stratified: bool = False,
+        cancellation: Optional[CancellationToken] = None,
+    ) -> Dict[str, Any]:
+        """Runs the pipeline and returns the distributions.
+
+        Args:
+            questions (list): The statements to be answered.
+            scenario (str, optional): The future scenario. Defaults to **None** (no future
+                agents).
+            agent_count (int): The number of agents sampled from the training data.
+            seed (int): The seed of the sample. The same seed gives the same agents.
+            stratified (bool): Whether to keep the proportions of genders and age bands.
+            cancellation (CancellationToken, optional): The cancellation token of the request.
+
+        Returns:
+            dict: The distributions in the form `/receive_user_csv` gives them, and the stages
+            that were run:
+                {
+                    "distributions": [...],
+                    "future_distributions": [...],
+                    "stages": [{"stage": "population", "key": "...", "status": "reused"}, ...]
+                }
+
+        Raises:
+            RuntimeError: If the LLM does not answer a question or the transformation fails.
+            RequestCancelled: If the request is cancelled.
+        """
+        population = self.population_node(agent_count, seed, stratified)
+        transformation = (
+            self.transformation_node(population, scenario, cancellation)
+            if scenario is not None
+            else None
+        )
+
+        original_nodes = []
+        future_nodes = []
+        for question in dict.fromkeys(questions):
+            original = self.original_answers_node(population, question, cancellation)
+            original_nodes.append(original)
+            if transformation is not None:
+                future_nodes.append(
+                    self.future_answers_node(
+                        transformation, original, question, cancellation
+                    )
+                )
+
+        trace = []
+        current, future = self.pipeline.run(
+            self.distributions_node(original_nodes, future_nodes), trace, cancellation
+        )
+        return {
+            "distributions": current,
+            "future_distributions": future,
+            "stages": trace,
+        }
+
+    def population_node(
+        self, agent_count: int, seed: int, stratified: bool
+    ) -> PipelineNode:
+        """The agents sampled from the training data."""
+
+        def sample(agent_count: int, seed: int, stratified: bool, **_) -> Tuple[Agent]:
+            df = self.training_data.sample(
+                agent_count, stratified=stratified, seed=seed
+            )
+            return tuple(dataframe_to_agents(df))
+
+        return PipelineNode(
+            "population",
+            sample,
+            params={
+                "agent_count": agent_count,
+                "seed": seed,
+                "stratified": stratified,
+                "training_data": self._training_data_hash(),
+            },
+        )
+
+    def transformation_node(
+        self,
+        population: PipelineNode,
+        scenario: str,
+        cancellation: Optional[CancellationToken] = None,
+    ) -> PipelineNode:
+        """Copies of the agents transformed into the future scenario."""
+
+        def transform(agents: Tuple[Agent], scenario: str, **_) -> Tuple[Agent]:
+            variants = [agent.create_variant() for agent in agents]
+            self.transformer.transform_agents_to_future(
+                variants, scenario, cancellation
+            )
+            return tuple(variants)
+
+        return PipelineNode(
+            "transformation",
+            transform,
+            [population],
+            {"scenario": scenario, "prompt_version": self.transformer.PROMPT_VERSION},
+        )
+
+    def original_answers_node(
+        self,
+        population: PipelineNode,
+        question: str,
+        cancellation: Optional[CancellationToken] = None,
+    ) -> PipelineNode:
+        """The answers of the agents to one question, one per agent (0 if missing)."""
+
+        def answer(agents: Tuple[Agent], question: str, **_) -> np.ndarray:
+            copies = [agent.copy() for agent in agents]
+            return self._ask(copies, question, cancellation)
+
+        return PipelineNode(
+            "original answers", answer, [population], self._answer_params(question)
+        )
+
+    def future_answers_node(
+        self,
+        transformation: PipelineNode,
+        original: PipelineNode,
+        question: str,
+        cancellation: Optional[CancellationToken] = None,
+    ) -> PipelineNode:
+        """The answers of the transformed agents to one question, one per agent (0 if
+        missing)."""
+
+        def answer(
+            agents: Tuple[Agent], original_answers: np.ndarray, question: str, **_
+        ) -> np.ndarray:
+            copies = [agent.copy() for agent in agents]
+            # With the original answers in place, only the future agents are asked
+            for agent, original_answer in zip(copies, original_answers.tolist()):
+                if original_answer:
+                    agent.questions[question] = [original_answer]
+            return self._ask(copies, question, cancellation, future=True)
+
+        return PipelineNode(
+            "future answers",
+            answer,
+            [transformation, original],
+            self._answer_params(question),
+        )
+
+    def distributions_node(
+        self, original_nodes: List[PipelineNode], future_nodes: List[PipelineNode]
+    ) -> PipelineNode:
+        """The current and future distributions of all questions."""
+
+        def aggregate(*answers: np.ndarray, questions: List[str]) -> Tuple[list, list]:
+            current = _distributions(questions, answers[: len(questions)])
+            future = _distributions(questions, answers[len(questions) :])
+            return current, future
+
+        return PipelineNode(
+            "distributions",
+            aggregate,
+            original_nodes + future_nodes,
+            {"questions": [node.params["question"] for node in original_nodes]},
+        )
+
+    def _ask(
+        self,
+        agents: List[Agent],
+        question: str,
+        cancellation: Optional[CancellationToken] = None,
+        future: bool = False,
+    ) -> np.ndarray:
+        """Asks the question from the agents and returns their answers.
+
+        Raises:
+            RuntimeError: If the LLM does not answer.
+        """
+        if (
+            self.llm_handler.get_agents_responses(
+                agents, [question], cancellation=cancellation
+            )
+            is None
+        ):
+            raise RuntimeError(f"The LLM did not answer the question '{question}'")
+        return first_answer_matrix(agents, [question], future=future)[:, 0]
+
+    def _answer_params(self, question: str) -> Dict[str, Any]:
+        return {
+            "question": question,
+            "model": self.llm_handler._get_model_name(),
+            "prompt_version": self.llm_handler.PROMPT_VERSION,
+        }
+
+    def _training_data_hash(self) -> str:
+        """Returns the hash of the training data file, calculated once."""
+        if self.__training_data_hash is None:
+            self.__training_data_hash = file_hash(self.training_data.csv_path)
+        return self.__training_data_hash
+
+
+def _distributions(
+    questions: List[str], answers: Tuple[np.ndarray, ...]
+) -> List[Dict[str, Any]]:
+    """Makes the distributions of the questions from the answer arrays, in the same form as
+    `GetData.get_answer_distributions` gives."""
+    if not answers:
+        return []
+
+    matrix = np.column_stack(answers)
+    counts = grouped_counts(matrix, np.zeros(len(matrix), dtype=np.int64), 1)[0]
+    return [
+        {
+            "question": question,
+            "data": [
+                {"label": label, "value": int(value)}
+                for label, value in zip(LIKERT_LABELS, counts[j])
+            ],
+            "statistics": statistics_from_counts(counts[j]),
+        }
+        for j, question in enumerate(questions)
+    ]
@@ -0,0 +1,505 @@
+import io
+import os
+from typing import List, Dict, Tuple, Any, Callable, Iterator, Optional, Sequence
+import numpy as np
+import pandas as pd
+from ..entities.agent import Agent
+from .spss_data import file_hash, read_sav_chunks
+
+
+def dataframe_to_agents(df: pd.DataFrame) -> List[Agent]:
+    """Creates an Agent object from each row of the training data. The info of an agent contains
+    the "Age", "Gender" and "Answers" fields. Answers is a dictionary with the column name as key
+    and the value (e.g. a latent variable value) as value.
+
+    Args:
+        df (DataFrame): The training data, one row per respondent.
+
+    Returns:
+        list: The agents in the same order as the rows.
+    """
+    # Convert integer columns to strings
+    df = df.copy()
+    int_cols = df.select_dtypes(include=["int"]).columns
+    df[int_cols] = df[int_cols].astype(str)
+
+    agents = []
+
+    # Create Agent objects: info includes Age, Gender, and Answers.
+    for record in df.to_dict(orient="records"):
+        info = {
+            "Age": record.get("Age"),
+            "Gender": record.get("Gender"),
+            "Answers": {
+                question_text: answer_value
+                for question_text, answer_value in record.items()
+                if question_text not in ["Age", "Gender"]
+            },
+        }
+
+        agents.append(Agent(info))
+        # Example Agent-object now: Agent(Age=24, Answers={'Q1': 1, 'Q2': 3}, Gender=Male)
+
+    return agents
+
+
+def npy_path_for(csv_path: str) -> str:
+    """Returns the path of the binary copy of a training data CSV file."""
+    return os.path.splitext(csv_path)[0] + ".npy"
+
+
+def convert_csv_to_npy(csv_path: str, npy_path: Optional[str] = None) -> str:
+    """Writes the training data CSV file into a binary .npy file: a structured NumPy array with
+    one field per column. Integer and float columns keep their types and other columns (e.g.
+    Gender) are stored as fixed-width strings. The file can be memory-mapped, so all processes
+    that load it share one copy of the data in the page cache.
+
+    Args:
+        csv_path (str): The path of the CSV file.
+        npy_path (str, optional): The path of the written file. Defaults to the path of the CSV
+            file with the extension .npy.
+
+    Returns:
+        str: The path of the written file.
+    """
+    npy_path = npy_path or npy_path_for(csv_path)
+    return dataframe_to_npy(pd.read_csv(csv_path), npy_path)
+
+
+def dataframe_to_npy(df: pd.DataFrame, npy_path: str) -> str:
+    """Writes the training data into a .npy file as a structured array (see
+    `convert_csv_to_npy`) and returns the path of the file."""
+    return chunks_to_npy(lambda: iter([df]), npy_path)
+
+
+def chunks_to_npy(
+    read_chunks: Callable[[], Iterator[pd.DataFrame]],
+    npy_path: str,
+    whole_number_columns: Sequence[str] = (),
+) -> str:
+    """Writes training data that is read in chunks into a .npy file like `dataframe_to_npy`,
+    holding only one chunk in memory at a time. The chunks are read twice: first to find the
+    type of each column and the number of rows, then to write the rows into the memory-mapped
+    output file.
+
+    Args:
+        read_chunks (callable): Returns an iterator over the chunks. Called once per pass.
+        npy_path (str): The path of the written file.
+        whole_number_columns (list): Float columns that are stored as integers if every value
+            is a whole number, e.g. the ages of an SPSS file, which stores all numbers as floats.
+
+    Returns:
+        str: The path of the written file.
+    """
+    # The order of the kinds: a column that is a float in some chunk is a float, and a column
+    # that is text in some chunk is text
+    kinds: Dict[str, int] = {}
+    lengths: Dict[str, int] = {}
+    whole = {column: True for column in whole_number_columns}
+    rows = 0
+    for chunk in read_chunks():
+        rows += len(chunk)
+        for column in chunk.columns:
+            values = chunk[column]
+            kind = _column_kind(values)
+            kinds[column] = max(kinds.get(column, 0), kind)
+            lengths[column] = max(
+                lengths.get(column, 1), int(_as_text(values).str.len().max() or 1)
+            )
+            if column in whole and kind > 0:
+                whole[column] = whole[column] and bool(
+                    kind == 1 and values.notna().all() and values.mod(1).eq(0).all()
+                )
+
+    fields = []
+    for column, kind in kinds.items():
+        if kind == 0 or (kind == 1 and whole.get(column)):
+            fields.append((column, "<i8"))
+        elif kind == 1:
+            fields.append((column, "<f8"))
+        else:
+            fields.append((column, f"<U{lengths[column]}"))
+
+    # Write to a temporary file first, so that readers never map a half-written file
+    temporary_path = npy_path + ".tmp"
+    records = np.lib.format.open_memmap(
+        temporary_path, mode="w+", dtype=fields, shape=(rows,)
+    )
+    start = 0
+    for chunk in read_chunks():
+        end = start + len(chunk)
+        for column, dtype in fields:
+            values = chunk[column]
+            records[column][start:end] = (
+                _as_text(values).to_numpy()
+                if dtype.startswith("<U")
+                else values.to_numpy()
+            )
+        start = end
+    records.flush()
+    del records
+    os.replace(temporary_path, npy_path)
+
+    return npy_path
+
+
+def _column_kind(values: pd.Series) -> int:
+    """Returns 0 for integer, 1 for float and 2 for other columns."""
+    if pd.api.types.is_integer_dtype(values):
+        return 0
+    if pd.api.types.is_float_dtype(values):
+        return 1
+    return 2
+
+
+def _as_text(values: pd.Series) -> pd.Series:
+    """Returns the values as strings, with missing values as empty strings."""
+    return values.fillna("").astype(str)
+
+
+def convert_sav_to_npy(sav_path: str, cache_dir: Optional[str] = None) -> str:
+    """Converts an SPSS file into a memory-mappable .npy file like `convert_csv_to_npy`, unless
+    it has already been converted. The file is read in chunks and the rows are written into the
+    output as they are read, so large files are never in memory as a whole. The converted file
+    is cached under the hash of the SPSS file, so a changed file is converted again and the slow
+    SPSS parse is skipped otherwise.
+
+    Args:
+        sav_path (str): The path of the SPSS file.
+        cache_dir (str, optional): The directory of the cache. Defaults to the directory "cache"
+            next to the SPSS file.
+
+    Returns:
+        str: The path of the .npy file.
+    """
+    cache_dir = cache_dir or os.path.join(os.path.dirname(sav_path), "cache")
+    npy_path = os.path.join(cache_dir, f"{file_hash(sav_path)}.npy")
+
+    if not os.path.exists(npy_path):
+        os.makedirs(cache_dir, exist_ok=True)
+        # Ages are whole numbers like in the CSV files
+        chunks_to_npy(lambda: read_sav_chunks(sav_path), npy_path, ["Age"])
+
+    return npy_path
+
+
+def index_path_for(csv_path: str) -> str:
+    """Returns the path of the row-offset index of a training data CSV file."""
+    return os.path.splitext(csv_path)[0] + ".index.npy"
+
+
+def build_row_index(csv_path: str, index_path: Optional[str] = None) -> str:
+    """Writes the byte offsets of the data rows of a CSV file into a .npy file, so that any row
+    can be read with one seek (see `sample_csv_with_index`). The rows must not contain line
+    breaks inside quoted values.
+
+    Args:
+        csv_path (str): The path of the CSV file.
+        index_path (str, optional): The path of the written file. Defaults to the path of the CSV
+            file with the extension .index.npy.
+
+    Returns:
+        str: The path of the written file.
+    """
+    index_path = index_path or index_path_for(csv_path)
+    offsets = []
+    with open(csv_path, "rb") as file:
+        file.readline()  # The header
+        position = file.tell()
+        for line in file:
+            if line.strip():
+                offsets.append(position)
+            position += len(line)
+
+    temporary_path = index_path + ".tmp"
+    with open(temporary_path, "wb") as file:
+        np.save(file, np.array(offsets, dtype=np.int64))
+    os.replace(temporary_path, index_path)
+
+    return index_path
+
+
+def sample_csv_with_index(
+    csv_path: str,
+    n: int,
+    index_path: Optional[str] = None,
+    rng: Optional[np.random.Generator] = None,
+) -> pd.DataFrame:
+    """Reads `n` random rows of a CSV file without reading the other rows, using the row-offset
+    index written by `build_row_index`.
+
+    Raises:
+        ValueError: If there are fewer than `n` rows.
+    """
+    rng = rng or np.random.default_rng()
+    offsets = np.load(index_path or index_path_for(csv_path), mmap_mode="r")
+    rows = np.sort(rng.choice(len(offsets), size=n, replace=False))
+
+    with open(csv_path, "rb") as file:
+        lines = [file.readline()]
+        for row in rows:
+            file.seek(int(offsets[row]))
+            lines.append(file.readline().rstrip(b"\r\n") + b"\n")
+
+    return pd.read_csv(io.BytesIO(b"".join(lines)))
+
+
+def age_band(age: Any, width: int = 10) -> str:
+    """Returns the age band of an age, for example "20-29", or "unknown" if the age is not a
+    number."""
+    try:
+        start = int(float(age)) // width * width
+    except (TypeError, ValueError):
+        return "unknown"
+    return f"{start}-{start + width - 1}"
+
+
+def stratum_of(gender: Any, age: Any) -> Tuple[str, str]:
+    """Returns the stratum of a respondent: (gender, age band). A missing gender (None, NaN or
+    an empty string, depending on how the data was read) is "unknown"."""
+    if gender is None or (isinstance(gender, float) and np.isnan(gender)):
+        gender = "unknown"
+    gender = str(gender).strip() or "unknown"
+    return (gender, age_band(age))
+
+
+def allocate_sample(counts: Dict[Any, int], n: int) -> Dict[Any, int]:
+    """Divides a sample of `n` rows between strata in proportion to their sizes, rounding with
+    the largest remainder method.
+
+    Args:
+        counts (dict): The number of rows in each stratum.
+        n (int): The sample size.
+
+    Returns:
+        dict: The number of rows sampled from each stratum.
+    """
+    total = sum(counts.values())
+    quotas = {key: n * count / total for key, count in counts.items()}
+    allocation = {key: int(quota) for key, quota in quotas.items()}
+    remainders = sorted(
+        counts, key=lambda key: quotas[key] - allocation[key], reverse=True
+    )
+    for key in remainders[: n - sum(allocation.values())]:
+        allocation[key] += 1
+    return allocation
+
+
+def reservoir_sample_csv(
+    csv_path: str,
+    n: int,
+    stratified: bool = False,
+    chunksize: int = 100_000,
+    rng: Optional[np.random.Generator] = None,
+) -> pd.DataFrame:
+    """Samples `n` random rows of a CSV file in one pass over chunks of the file (reservoir
+    sampling), so the memory use does not depend on the size of the file.
+
+    If `stratified` is True, a reservoir of `n` rows is kept for each (Gender, age band) stratum
+    and the sample is divided between the strata in proportion to their sizes.
+
+    Args:
+        csv_path (str): The path of the CSV file.
+        n (int): The number of rows.
+        stratified (bool): Whether to stratify the sample by gender and age band.
+        chunksize (int): The number of rows read at a time.
+        rng (np.random.Generator, optional): The random number generator.
+
+    Returns:
+        DataFrame: The sampled rows in the order of the file.
+
+    Raises:
+        ValueError: If there are fewer than `n` rows.
+    """
+    rng = rng or np.random.default_rng()
+    # For each stratum: [rows seen, reservoir of (row number, row)]
+    reservoirs: Dict[Any, list] = {}
+    columns = None
+    row_number = 0
+
+    for chunk in pd.read_csv(csv_path, chunksize=chunksize):
+        columns = chunk.columns
+        if stratified:
+            keys = pd.Series(
+                [
+                    stratum_of(gender, age)
+                    for gender, age in zip(
+                        chunk.get("Gender", [None] * len(chunk)),
+                        chunk.get("Age", [None] * len(chunk)),
+                    )
+                ]
+            )
+            groups = keys.groupby(keys, sort=False).indices
+        else:
+            groups = {None: np.arange(len(chunk))}
+
+        for key, positions in groups.items():
+            state = reservoirs.setdefault(key, [0, []])
+            seen, reservoir = state
+            # Algorithm R: the i:th row of a stratum replaces a random slot with probability
+            # n / (i + 1). Only the accepted rows are taken from the chunk.
+            previous = seen + np.arange(len(positions))
+            slots = np.where(previous < n, previous, rng.integers(0, previous + 1))
+            accepted = np.flatnonzero(slots < n)
+            rows = chunk.iloc[positions[accepted]].itertuples(index=False, name=None)
+            for i, row in zip(accepted, rows):
+                item = (row_number + int(positions[i]), row)
+                if slots[i] == len(reservoir):
+                    reservoir.append(item)
+                else:
+                    reservoir[slots[i]] = item
+            state[0] = seen + len(positions)
+
+        row_number += len(chunk)
+
+    if row_number < n:
+        raise ValueError(f"Cannot sample {n} rows from {row_number} rows")
+
+    allocation = allocate_sample(
+        {key: seen for key, (seen, _) in reservoirs.items()}, n
+    )
+    sample = []
+    for key, (_, reservoir) in reservoirs.items():
+        chosen = rng.choice(len(reservoir), size=allocation[key], replace=False)
+        sample.extend(reservoir[i] for i in chosen)
+    sample.sort()
+
+    return pd.DataFrame([row for _, row in sample], columns=columns)
+
+
+class TrainingData:
+    """The training data rows. The rows are read in the fastest available way:
+
+    - If an up-to-date binary copy (see `convert_csv_to_npy`) of the CSV file exists, it is
+      memory-mapped read-only. Only the rows that are used are read from the mapped file, and
+      the pages stay in the operating system's page cache across server restarts.
+    - If an up-to-date row-offset index (see `build_row_index`) exists, random rows are read
+      with one seek each.
+    - Otherwise the CSV file is sampled in one streaming pass, so large files are never loaded
+      into memory as a whole.
+
+    An SPSS (.sav) file is converted once into a cached .npy file (see `convert_sav_to_npy`)
+    that is memory-mapped.
+
+    """
+
+    def __init__(self, csv_path: str) -> None:
+        """Opens the training data.
+
+        Args:
+            csv_path (str): The path of the training data CSV or SPSS (.sav) file.
+        """
+        self.csv_path = csv_path
+        self.__records = None
+        self.__index_path = None
+
+        if csv_path.lower().endswith(".sav"):
+            self.__records = np.load(convert_sav_to_npy(csv_path), mmap_mode="r")
+        elif _is_up_to_date(npy_path_for(csv_path), csv_path):
+            self.__records = np.load(npy_path_for(csv_path), mmap_mode="r")
+        elif _is_up_to_date(index_path_for(csv_path), csv_path):
+            self.__index_path = index_path_for(csv_path)
+
+    def is_memory_mapped(self) -> bool:
+        """Returns True if the data is read from a memory-mapped binary file."""
+        return self.__records is not None
+
+    def is_indexed(self) -> bool:
+        """Returns True if random rows are read with the row-offset index."""
+        return self.__index_path is not None
+
+    def __len__(self) -> int:
+        if self.__records is not None:
+            return len(self.__records)
+        if self.__index_path is not None:
+            return len(np.load(self.__index_path, mmap_mode="r"))
+        return sum(
+            len(chunk) for chunk in pd.read_csv(self.csv_path, chunksize=100_000)
+        )
+
+    def sample(
+        self, n: int, stratified: bool = False, seed: Optional[int] = None
+    ) -> pd.DataFrame:
+        """Returns `n` random rows without replacement in random order. The rows are read in the
+        order of the file and shuffled afterwards, so the first agents are not always the ones
+        from the beginning of the file.
+
+        Args:
+            n (int): The number of rows.
+            stratified (bool): Whether to divide the sample between the (Gender, age band)
+                strata in proportion to their sizes.
+            seed (int, optional): The seed of the random number generator. The same seed gives
+                the same rows. Defaults to **None** (a different sample every time).
+
+        Raises:
+            ValueError: If there are fewer than `n` rows.
+        """
+        rng = np.random.default_rng(seed)
+
+        if self.__records is not None:
+            if stratified:
+                rows = self._stratified_rows(n, rng)
+            else:
+                rows = rng.choice(len(self.__records), size=n, replace=False)
+            df = self._records_to_dataframe(self.__records[np.sort(rows)])
+        elif self.__index_path is not None and not stratified:
+            df = sample_csv_with_index(self.csv_path, n, self.__index_path, rng)
+        else:
+            df = reservoir_sample_csv(self.csv_path, n, stratified=stratified, rng=rng)
+
+        return df.iloc[rng.permutation(len(df))].reset_index(drop=True)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """Returns all rows."""
+        if self.__records is None:
+            return pd.read_csv(self.csv_path)
+        return self._records_to_dataframe(self.__records)
+
+    def _stratified_rows(self, n: int, rng: np.random.Generator) -> np.ndarray:
+        """Returns the numbers of `n` random rows of the mapped data, divided between the strata
+        in proportion to their sizes."""
+        if len(self.__records) < n:
+            raise ValueError(f"Cannot sample {n} rows from {len(self.__records)} rows")
+
+        names = self.__records.dtype.names
+        genders = self.__records["Gender"] if "Gender" in names else [None] * len(self)
+        ages = self.__records["Age"] if "Age" in names else [None] * len(self)
+        strata: Dict[Any, List[int]] = {}
+        for row, (gender, age) in enumerate(zip(genders, ages)):
+            strata.setdefault(stratum_of(gender, age), []).append(row)
+
+        allocation = allocate_sample(
+            {key: len(rows) for key, rows in strata.items()}, n
+        )
+        return np.concatenate(
+            [
+                rng.choice(rows, size=allocation[key], replace=False)
+                for key, rows in strata.items()
+            ]
+        )
+
+    def _records_to_dataframe(self, records: np.ndarray) -> pd.DataFrame:
+        """Copies rows of the structured array into a DataFrame like the one read from the CSV
+        file: empty strings are missing values again."""
+        df = pd.DataFrame(
+            {name: np.array(records[name]) for name in records.dtype.names}
+        )
+        for name in records.dtype.names:
+            if records.dtype[name].kind == "U":
+                df[name] = df[name].replace("", np.nan).astype(object)
+        return df
+
+
+def _is_up_to_date(path: str, csv_path: str) -> bool:
+    """Returns True if the file derived from the CSV file exists and is not older than it."""
+    return os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(csv_path)
+
+
+if __name__ == "__main__":
+    import sys
+    from ..key_config import CSV_FILE_PATH
+
+    if sys.argv[1:] == ["index"]:
+        print(f"Wrote {build_row_index(CSV_FILE_PATH)}")
+    else:
+        print(f"Wrote {convert_csv_to_npy(CSV_FILE_PATH)}")
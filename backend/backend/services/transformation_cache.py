@@ -0,0 +1,119 @@
+import hashlib
+import json
+import sqlite3
+import threading
+from typing import Tuple, Dict, Any, Optional
+
+
+class TransformationCache:
+    """A persistent store for the future latent variables of transformed agents. The new latent
+    variables depend only on the future scenario, the agent's original latent variable values and
+    the used model and prompt, so these form the key.
+
+    Attributes:
+        hits (int): The number of transformations found in the cache.
+        misses (int): The number of transformations not found in the cache.
+    """
+
+    def __init__(self, path: str = ":memory:") -> None:
+        """Opens (and creates if needed) the SQLite database of the cache.
+
+        Args:
+            path (str): The path of the database file. Defaults to an in-memory database.
+        """
+        self.__connection = sqlite3.connect(path, check_same_thread=False)
+        self.__lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        with self.__lock, self.__connection:
+            self.__connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS transformations (
+                    scenario_hash TEXT,
+                    latent_values TEXT,
+                    model TEXT,
+                    prompt_version TEXT,
+                    new_latent_values TEXT,
+                    PRIMARY KEY (scenario_hash, latent_values, model, prompt_version)
+                )
+                """
+            )
+
+    def get(
+        self,
+        scenario: str,
+        latent_key: Tuple[Any, ...],
+        model: str,
+        prompt_version: str,
+    ) -> Optional[Dict[str, Any]]:
+        """Returns the cached future latent variables or None if there are none for the key.
+
+        Args:
+            scenario (str): The future scenario.
+            latent_key (tuple): The rounded original latent variable values of the agent.
+            model (str): The name of the LLM model.
+            prompt_version (str): The version of the transformation prompt.
+        """
+        with self.__lock:
+            row = self.__connection.execute(
+                "SELECT new_latent_values FROM transformations WHERE scenario_hash = ? "
+                "AND latent_values = ? AND model = ? AND prompt_version = ?",
+                self._key(scenario, latent_key, model, prompt_version),
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            return json.loads(row[0])
+
+    def set(
+        self,
+        scenario: str,
+        latent_key: Tuple[Any, ...],
+        model: str,
+        prompt_version: str,
+        new_latent_values: Dict[str, Any],
+    ) -> None:
+        """Saves the future latent variables of an agent into the cache. Existing values for the
+        key are kept.
+
+        Args:
+            scenario (str): The future scenario.
+            latent_key (tuple): The rounded original latent variable values of the agent.
+            model (str): The name of the LLM model.
+            prompt_version (str): The version of the transformation prompt.
+            new_latent_values (dict): The future latent variables.
+        """
+        with self.__lock, self.__connection:
+            self.__connection.execute(
+                "INSERT OR IGNORE INTO transformations VALUES (?, ?, ?, ?, ?)",
+                self._key(scenario, latent_key, model, prompt_version)
+                + (json.dumps(new_latent_values),),
+            )
+
+    def get_statistics(self) -> Dict[str, float]:
+        """Returns the number of cache hits and misses and the hit rate."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def _key(
+        self,
+        scenario: str,
+        latent_key: Tuple[Any, ...],
+        model: str,
+        prompt_version: str,
+    ) -> Tuple[str, str, str, str]:
+        """Returns the database key for the given values."""
+        return (
+            hashlib.sha256(scenario.strip().encode("utf-8")).hexdigest(),
+            json.dumps(list(latent_key)),
+            model,
+            prompt_version,
+        )
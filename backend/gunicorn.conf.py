@@ -0,0 +1,24 @@
+import os
+
+# Gunicorn reads this file from the working directory when the server is started with
+# `gunicorn backend.wsgi:app` (see production/Dockerfile).
+
+# The agents are kept in the memory of the process, so all requests must be served by one worker
+workers = 1
+
+# Most of the time of a request is spent waiting for the LLM. With threads, one worker serves
+# other requests while a request waits, instead of blocking the whole worker. The views are
+# still synchronous: each request holds one thread until it is done, and the Gemini and OpenAI
+# clients still run their requests on their own event-loop threads. At most GUNICORN_THREADS
+# requests are served at the same time; the rest wait in the queue.
+#
+# The threads share the services created in app.py. The agents are published as copy-on-write
+# versions by PopulationStore, so a request never sees another request's agents being replaced,
+# and counters such as `LlmHandler.escalations` are locked.
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "32"))
+
+# A simulation can wait for the LLM for minutes. The worker's heartbeat runs in its own thread,
+# so a long request does not get the worker killed, but the request itself is limited.
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "300"))
+graceful_timeout = 30
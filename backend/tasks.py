@@ -9,3 +9,18 @@ def start(ctx):
 @task
 def test(ctx):
     ctx.run("coverage run --branch -m pytest && coverage report -m && coverage html")
+
+
+@task
+def convert_data(ctx):
+    ctx.run("poetry run python3 -m backend.services.training_data")
+
+
+@task
+def index_data(ctx):
+    ctx.run("poetry run python3 -m backend.services.training_data index")
+
+
+@task
+def warm_up_cache(ctx):
+    ctx.run("poetry run python3 -m backend.services.agent_transformer")
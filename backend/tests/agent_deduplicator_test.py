@@ -0,0 +1,54 @@
+import unittest
+from backend.entities.agent import Agent
+from backend.services.agent_deduplicator import (
+    latent_vector_key,
+    group_identical_agents,
+    get_representatives,
+    expand_group_responses,
+)
+
+
+class TestAgentDeduplicator(unittest.TestCase):
+    """Tests for grouping agents with identical latent variables."""
+
+    def setUp(self):
+        self.latent_variables = ["A", "B"]
+        self.agents = [
+            Agent({"Age": "20", "Gender": "Male", "Answers": {"A": "0", "B": "0"}}),
+            Agent({"Age": "21", "Gender": "Female", "Answers": {"A": 1.23, "B": -0.5}}),
+            Agent({"Age": "22", "Gender": "Male", "Answers": {"A": 0.0, "B": -0.0}}),
+            Agent({"Age": "23", "Gender": "Female", "Answers": {"A": 1.19, "B": -0.5}}),
+        ]
+
+    def test_latent_vector_key_rounds_values(self):
+        """Test that latent_vector_key rounds numeric values and handles strings."""
+        key = latent_vector_key(self.agents[1], self.latent_variables)
+        self.assertEqual((1.2, -0.5), key)
+        key = latent_vector_key(self.agents[0], self.latent_variables)
+        self.assertEqual((0.0, 0.0), key)
+
+    def test_latent_vector_key_future(self):
+        """Test that latent_vector_key uses the future latent variables when asked."""
+        self.agents[0].save_new_future_latent_variables({"A": "1.0", "B": "x"})
+        key = latent_vector_key(self.agents[0], self.latent_variables, future=True)
+        self.assertEqual((1.0, "x"), key)
+
+    def test_group_identical_agents(self):
+        """Test that agents with equal rounded latent values are grouped in order."""
+        groups = group_identical_agents(self.agents, self.latent_variables)
+        self.assertEqual(
+            [[self.agents[0], self.agents[2]], [self.agents[1], self.agents[3]]],
+            groups,
+        )
+        self.assertEqual([self.agents[0], self.agents[1]], get_representatives(groups))
+
+    def test_expand_group_responses(self):
+        """Test that the representative's responses are copied to the whole group."""
+        groups = group_identical_agents(self.agents, self.latent_variables)
+        responses = {self.agents[0]: {"Q1": 3}}
+        expanded = expand_group_responses(responses, groups)
+
+        self.assertEqual({"Q1": 3}, expanded[self.agents[2]])
+        self.assertNotIn(self.agents[1], expanded)
+        # The copies must be independent dictionaries
+        self.assertIsNot(expanded[self.agents[0]], expanded[self.agents[2]])
@@ -54,12 +54,68 @@ class TestAgent(unittest.TestCase):
         self.agent.future_questions = {"q1": "3"}
         self.agent.questions = {"q2": "2"}
         self.agent._Agent__future_info = {"Answers": {"var1": 10}}
+        self.agent.answer_probabilities = {"q2": [[0, 1, 0, 0, 0]]}
 
         self.agent.delete_future_info_and_questions()
 
         self.assertEqual(self.agent.get_agent_future_info(), {"Answers": {}})
         self.assertEqual(self.agent.questions, {})
         self.assertEqual(self.agent.future_questions, {})
+        self.assertEqual(self.agent.answer_probabilities, {})
+
+    def test_delete_future_info_and_future_questions(self):
+        """Test that delete_future_info_and_future_questions keeps the original answers."""
+        self.agent.future_questions = {"q1": [3]}
+        self.agent.questions = {"q1": [2]}
+        self.agent.future_answer_probabilities = {"q1": [[0, 0, 1, 0, 0]]}
+        self.agent.predicted_questions = {"q1"}
+        self.agent.future_predicted_questions = {"q1"}
+        self.agent._Agent__future_info = {"Answers": {"var1": 10}}
+
+        self.agent.delete_future_info_and_future_questions()
+
+        self.assertEqual(self.agent.get_agent_future_info(), {"Answers": {}})
+        self.assertEqual(self.agent.questions, {"q1": [2]})
+        self.assertEqual(self.agent.future_questions, {})
+        self.assertEqual(self.agent.future_answer_probabilities, {})
+        self.assertEqual(self.agent.predicted_questions, {"q1"})
+        self.assertEqual(self.agent.future_predicted_questions, set())
+
+    def test_create_variant(self):
+        """Test that create_variant copies the agent without the future information."""
+        self.agent.questions = {"q1": [2]}
+        self.agent.save_new_future_latent_variables({"var1": 10})
+        self.agent.future_questions = {"q1": [3]}
+
+        variant = self.agent.create_variant()
+
+        self.assertEqual(self.agent.get_id(), variant.get_id())
+        self.assertEqual(self.agent.get_agent_info(), variant.get_agent_info())
+        self.assertEqual({"Answers": {}}, variant.get_agent_future_info())
+        self.assertEqual({"q1": [2]}, variant.questions)
+        self.assertEqual({}, variant.future_questions)
+
+        variant.questions["q1"].append(4)
+        self.assertEqual({"q1": [2]}, self.agent.questions)
+
+    def test_copy(self):
+        """Test that copy keeps the future information and the copy's answers are separate."""
+        self.agent.questions = {"q1": [2]}
+        self.agent.save_new_future_latent_variables({"var1": 10})
+        self.agent.future_questions = {"q1": [3]}
+
+        copy = self.agent.copy()
+
+        self.assertEqual(self.agent.get_id(), copy.get_id())
+        self.assertEqual({"Answers": {"var1": 10}}, copy.get_agent_future_info())
+        self.assertEqual({"q1": [3]}, copy.future_questions)
+
+        copy.questions["q1"].append(4)
+        copy.future_questions["q1"].append(5)
+        copy.delete_future_info_and_future_questions()
+        self.assertEqual({"q1": [2]}, self.agent.questions)
+        self.assertEqual({"q1": [3]}, self.agent.future_questions)
+        self.assertEqual({"Answers": {"var1": 10}}, self.agent.get_agent_future_info())
 
     def test_save_new_future_latent_variables(self):
         """Test that save_new_future_latent_variables updates future_info correctly."""
@@ -2,6 +2,8 @@ import unittest
 from unittest.mock import Mock
 from backend.services.agent_transformer import AgentTransformer
 from backend.entities.agent import Agent
+from backend.services.agent_deduplicator import latent_vector_key
+from backend.services.transformation_cache import TransformationCache
 
 
 class TestAgentTranformerIntegration(unittest.TestCase):
@@ -150,3 +152,123 @@ Respondent 4:
 
         with self.assertRaises(RuntimeError):
             transformer.transform_agents_to_future(self.agents, self.scenario)
+
+    def test_identical_agents_are_transformed_once(self):
+        """Tests that agents with identical latent variables are sent to the llm only once and
+        all of them get the new variables."""
+        self.agents.append(Agent(dict(self.agents[0].get_agent_info())))
+
+        llm_answer = """
+
+Respondent 1:
+0.1
+-0.2
+
+Respondent 2:
+1.3
+2.3
+
+Respondent 3:
+0.0
+-2.2
+
+Respondent 4:
+1.3
+0.0
+"""
+        self.mock_llm.get_response.return_value = llm_answer
+        transformer = AgentTransformer(self.mock_llm)
+        transformer.transform_agents_to_future(self.agents, self.scenario)
+
+        prompt = self.mock_llm.get_response.call_args[0][0]
+        self.assertNotIn("Respondent 5:", prompt)
+        self.assertEqual(
+            self.agents[0].get_agent_future_info(),
+            self.agents[4].get_agent_future_info(),
+        )
+
+    def test_cached_transformations_are_not_sent_to_llm(self):
+        """Tests that agents found in the transformation cache are left out of the prompt."""
+        cache = TransformationCache()
+        llm_answer = """
+Respondent 1:
+0.1
+-0.2
+
+Respondent 2:
+1.3
+2.3
+
+Respondent 3:
+0.0
+-2.2
+
+Respondent 4:
+1.3
+0.0
+"""
+        self.mock_llm.get_response.return_value = llm_answer
+        transformer = AgentTransformer(self.mock_llm, transformation_cache=cache)
+        transformer.transform_agents_to_future(self.agents, self.scenario)
+
+        # A new agent with the same values as the first one and one unseen agent
+        new_agents = [
+            Agent(dict(self.agents[0].get_agent_info())),
+            Agent(
+                {
+                    "Age": "22",
+                    "Gender": "male",
+                    "Answers": {
+                        "Overall happiness level": 0.5,
+                        "Opposition to technology": 0.5,
+                    },
+                }
+            ),
+        ]
+        self.mock_llm.get_response.return_value = "Respondent 1:\n0.7\n0.8\n"
+        transformer.transform_agents_to_future(new_agents, self.scenario)
+
+        prompt = self.mock_llm.get_response.call_args[0][0]
+        self.assertNotIn("Respondent 2:", prompt)
+        self.assertEqual(
+            {"Overall happiness level": 0.1, "Opposition to technology": -0.2},
+            new_agents[0].get_agent_future_info()["Answers"],
+        )
+        self.assertEqual(
+            {"Overall happiness level": 0.7, "Opposition to technology": 0.8},
+            new_agents[1].get_agent_future_info()["Answers"],
+        )
+
+    def test_fully_cached_transformation_makes_no_llm_call(self):
+        """Tests that the LLM is not called when every agent is found in the cache."""
+        cache = TransformationCache()
+        transformer = AgentTransformer(self.mock_llm, transformation_cache=cache)
+        for agent in self.agents:
+            cache.set(
+                self.scenario,
+                latent_vector_key(
+                    agent, ["Overall happiness level", "Opposition to technology"]
+                ),
+                transformer._get_model_name(),
+                transformer.PROMPT_VERSION,
+                {"Overall happiness level": "1.0", "Opposition to technology": "1.0"},
+            )
+
+        self.assertTrue(
+            transformer.transform_agents_to_future(self.agents, self.scenario)
+        )
+        self.mock_llm.get_response.assert_not_called()
+
+    def test_warm_up_cache(self):
+        """Tests that warm_up_cache transforms the agents in batches into the cache."""
+        cache = TransformationCache()
+        self.mock_llm.get_response.return_value = (
+            "Respondent 1:\n0.1\n0.2\n\nRespondent 2:\n0.3\n0.4\n"
+        )
+        transformer = AgentTransformer(self.mock_llm, transformation_cache=cache)
+
+        failed = transformer.warm_up_cache(self.agents, self.scenario, batch_size=2)
+
+        self.assertEqual(0, failed)
+        self.assertEqual(2, self.mock_llm.get_response.call_count)
+        self.assertEqual(4, cache.misses)
@@ -34,8 +34,16 @@ class TestAgentTransformer(unittest.TestCase):
             ),
         ]
         self.INTRO_BEGINNING = "Intro"
+        self.LATENT_VARIABLES_BEGINNING = "Variables:"
+        self.LATENT_VARIABLE_LABELS = AgentTransformer.LATENT_VARIABLE_LABELS
         self.INTRO_END = "End"
         self.PROMPT_END = "The End"
+        self.SCENARIO_BEGINNING = "Scenario:"
+        self.VALUES_BEGINNING = "Values:"
+        self.PROMPT_CLOSING = "Closing"
+
+    def create_prompt_prefix(self, latent_variables):
+        return AgentTransformer.create_prompt_prefix(self, latent_variables)
 
     def _add_agent_variable_values(self, agents, latent_variables):
         prompt = ""
@@ -84,9 +92,24 @@ Respondent 2:
         result = AgentTransformer.create_prompt(
             self, self.agents, future_scenario, latent_variables
         )
-        compare = "Introfuture scenarioEndRespondent 1:\nLatent variable values:\n2\n\nRespondent 2:\nLatent variable values:\n3\n\nRespondent 3:\nLatent variable values:\n4\n\nRespondent 4:\nLatent variable values:\n5\n\nRespondent 5:\nLatent variable values:\n1\n\nThe End"
+        compare = "IntroVariables: - Overall happiness level\nEndThe EndScenario:future scenarioValues:Respondent 1:\nLatent variable values:\n2\n\nRespondent 2:\nLatent variable values:\n3\n\nRespondent 3:\nLatent variable values:\n4\n\nRespondent 4:\nLatent variable values:\n5\n\nRespondent 5:\nLatent variable values:\n1\n\nClosing"
         self.assertEqual(compare, result)
 
+    def test_create_prompt_prefix_uses_descriptive_labels(self):
+        """Test that the columns A-M of the food study are listed with their descriptive labels
+        and other column names as they are."""
+        result = AgentTransformer.create_prompt_prefix(self, ["A", "M", "Other"])
+        self.assertIn(
+            " - Future Awareness - Awareness of global agricultural challenges\n",
+            result,
+        )
+        self.assertIn(
+            " - Green Purchase Intention - Commitment to buying sustainable food\n",
+            result,
+        )
+        self.assertIn(" - Other\n", result)
+        self.assertNotIn(" - A\n", result)
+
     def test_get_latent_variables(self):
         """Test that _get_latent_variables returns the list of latent variable names from an agent."""
         result = AgentTransformer._get_latent_variables(self, self.agents[0])
@@ -101,16 +124,6 @@ Respondent 2:
         compare = "Respondent 1:\nLatent variable values:\n2\n\nRespondent 2:\nLatent variable values:\n3\n\nRespondent 3:\nLatent variable values:\n4\n\nRespondent 4:\nLatent variable values:\n5\n\nRespondent 5:\nLatent variable values:\n1\n\n"
         self.assertEqual(compare, result)
 
-    def test_only_empty_strings_in_a_list(self):
-        """Tests whether a list contains only empty string."""
-
-        string_list = ["", "", ""]
-        result = AgentTransformer._only_empty_strings_in_a_list(self, string_list)
-        self.assertEqual(True, result)
-        string_list = [1, 3, 5]
-        result = AgentTransformer._only_empty_strings_in_a_list(self, string_list)
-        self.assertEqual(False, result)
-
     def test_future_variables_exist(self):
         """Test for the check to see if the first agent in the list has future latent variable values already set."""
         self.assertEqual(
@@ -118,9 +131,12 @@ Respondent 2:
         )
 
     def test_delete_old_variables_and_questions(self):
-        """Test to see hat agent info is reset"""
+        """Test to see that the future info is reset and the original answers are kept"""
         AgentTransformer._delete_old_variables_and_questions(self, self.agents)
-        self.assertEqual({}, self.agents[0].questions)
+        self.assertEqual({}, self.agents[0].future_questions)
+        self.assertEqual(
+            {"Meat production should be reduced.": [1]}, self.agents[0].questions
+        )
 
 
 class MockAgent:
@@ -150,3 +166,7 @@ class MockAgent:
         self.__future_info = {"Answers": {}}
         self.questions = {}
         self.future_questions = {}
+
+    def delete_future_info_and_future_questions(self):
+        self.__future_info = {"Answers": {}}
+        self.future_questions = {}
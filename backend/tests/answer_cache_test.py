@@ -0,0 +1,49 @@
+import os
+import tempfile
+import unittest
+from backend.services.answer_cache import AnswerCache, normalize_question
+
+
+class TestAnswerCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = AnswerCache()
+
+    def test_get_returns_none_for_missing_answer(self):
+        """Test that get returns None and counts a miss when there is no answer."""
+        self.assertIsNone(self.cache.get((0.1, 0.2), "Q1", "gpt-4o", "1"))
+        self.assertEqual(1, self.cache.misses)
+
+    def test_set_and_get(self):
+        """Test that a saved answer is returned with a normalized question."""
+        self.cache.set((0.1, 0.2), "I like  pasta", "gpt-4o", "1", 4)
+
+        self.assertEqual(4, self.cache.get((0.1, 0.2), " i like pasta ", "gpt-4o", "1"))
+        self.assertIsNone(self.cache.get((0.1, 0.2), "I like pasta", "gpt-4o", "2"))
+        self.assertIsNone(self.cache.get((0.1, 0.3), "I like pasta", "gpt-4o", "1"))
+
+    def test_set_keeps_existing_answer(self):
+        """Test that an existing answer is not overwritten."""
+        self.cache.set((0.1,), "Q1", "gpt-4o", "1", 4)
+        self.cache.set((0.1,), "Q1", "gpt-4o", "1", 2)
+        self.assertEqual(4, self.cache.get((0.1,), "Q1", "gpt-4o", "1"))
+
+    def test_get_statistics(self):
+        """Test that the hit rate is calculated from hits and misses."""
+        self.cache.set((0.1,), "Q1", "gpt-4o", "1", 4)
+        self.cache.get((0.1,), "Q1", "gpt-4o", "1")
+        self.cache.get((0.2,), "Q1", "gpt-4o", "1")
+
+        self.assertEqual(
+            {"hits": 1, "misses": 1, "hit rate": 0.5}, self.cache.get_statistics()
+        )
+
+    def test_answers_persist_in_file(self):
+        """Test that answers saved into a file are found by a new cache instance."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "cache.sqlite")
+            AnswerCache(path).set((0.1,), "Q1", "gpt-4o", "1", 5)
+            self.assertEqual(5, AnswerCache(path).get((0.1,), "Q1", "gpt-4o", "1"))
+
+    def test_normalize_question(self):
+        """Test that questions are lowercased and extra whitespace is removed."""
+        self.assertEqual("i like pasta", normalize_question("  I like\n pasta "))
@@ -0,0 +1,118 @@
+import asyncio
+import socket
+import threading
+import unittest
+from backend.services.cancellation import (
+    CancellationToken,
+    RequestCancelled,
+    wait_for,
+    socket_disconnected,
+)
+from backend.services.hedged_llm import HedgedLLM
+
+
+class SlowProvider:
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        self.task_cancelled = threading.Event()
+
+    async def _generate_answer(self):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            self.task_cancelled.set()
+            raise
+        return "Agent 1: 3"
+
+    def get_response(self, prompt, cancellation=None):
+        future = asyncio.run_coroutine_threadsafe(self._generate_answer(), self.loop)
+        return wait_for(future, cancellation)
+
+
+class TestCancellationToken(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+
+    def test_deadline(self):
+        """Test that the token is cancelled when the deadline passes."""
+        token = CancellationToken(timeout=5.0, clock=lambda: self.now)
+        self.assertFalse(token.is_cancelled())
+        self.assertEqual(5.0, token.remaining())
+        self.now = 5.0
+        self.assertTrue(token.is_cancelled())
+        with self.assertRaises(RequestCancelled):
+            token.raise_if_cancelled()
+
+    def test_disconnect(self):
+        """Test that the token is cancelled when the client disconnects."""
+        disconnected = False
+        token = CancellationToken(is_disconnected=lambda: disconnected)
+        self.assertFalse(token.is_cancelled())
+        self.assertIsNone(token.remaining())
+        disconnected = True
+        self.assertTrue(token.is_cancelled())
+        self.assertEqual("The client disconnected", token.reason)
+
+    def test_cancel(self):
+        """Test that the token can be cancelled explicitly."""
+        token = CancellationToken()
+        token.cancel()
+        self.assertTrue(token.is_cancelled())
+
+    def test_child(self):
+        """Test that a child token is cancelled with its parent, but not the other way round."""
+        parent = CancellationToken(timeout=5.0, clock=lambda: self.now)
+        child = parent.child()
+        self.assertEqual(5.0, child.remaining())
+
+        child.cancel("Another provider answered first")
+        self.assertTrue(child.is_cancelled())
+        self.assertFalse(parent.is_cancelled())
+
+        other = parent.child()
+        self.now = 5.0
+        self.assertTrue(other.is_cancelled())
+        self.assertEqual("The deadline of the request passed", other.reason)
+
+    def test_wait_for_without_token(self):
+        """Test that wait_for returns the result when no token is given."""
+        provider = SlowProvider()
+
+        async def answer():
+            return "Agent 1: 3"
+
+        future = asyncio.run_coroutine_threadsafe(answer(), provider.loop)
+        self.assertEqual("Agent 1: 3", wait_for(future))
+
+    def test_cancelled_request_cancels_the_task(self):
+        """Test that a cancelled token cancels the coroutine running in the event loop."""
+        provider = SlowProvider()
+        token = CancellationToken()
+        threading.Timer(0.1, token.cancel).start()
+
+        with self.assertRaises(RequestCancelled):
+            provider.get_response("prompt", token)
+        self.assertTrue(provider.task_cancelled.wait(5))
+
+    def test_deadline_cancels_hedged_request(self):
+        """Test that the deadline cancels the request running in the provider's event loop."""
+        provider = SlowProvider()
+        llm = HedgedLLM([provider], hedge_delay=0.05)
+
+        with self.assertRaises(RequestCancelled):
+            llm.get_response("prompt", cancellation=CancellationToken(timeout=0.3))
+        self.assertTrue(provider.task_cancelled.wait(5))
+
+    def test_socket_disconnected(self):
+        """Test that only a closed peer is a disconnect and unread data is kept."""
+        server, client = socket.socketpair()
+        self.assertFalse(socket_disconnected(server))
+        client.sendall(b"GET")
+        # Unread data is not a disconnect and is left in the socket
+        self.assertFalse(socket_disconnected(server))
+        self.assertEqual(b"GET", server.recv(3))
+        client.close()
+        self.assertTrue(socket_disconnected(server))
+        self.assertFalse(socket_disconnected(None))
+        server.close()
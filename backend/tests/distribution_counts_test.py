@@ -0,0 +1,72 @@
+import unittest
+import numpy as np
+from backend.entities.agent import Agent
+from backend.services.get_data import GetData
+from backend.services.distribution_counts import DistributionCounts
+
+
+def make_agent(questions, future_questions=None):
+    agent = Agent({"Age": 30})
+    agent.questions = questions
+    agent.future_questions = future_questions or {}
+    return agent
+
+
+class TestDistributionCounts(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.agents = [
+            make_agent(
+                {"Q1": [int(a)], "Q2": [int(b), 1]},
+                {"Q1": [int(c)]},
+            )
+            for a, b, c in rng.integers(1, 6, (25, 3))
+        ]
+
+    def test_same_as_get_all_distributions(self):
+        """Test that the counted distributions equal the ones made from the agents."""
+        counts = DistributionCounts.from_agents(self.agents)
+
+        self.assertEqual(
+            GetData().get_all_distributions(self.agents),
+            counts.get_all_distributions(),
+        )
+
+    def test_even_number_of_answers(self):
+        """Test the statistics of an even number of answers."""
+        counts = DistributionCounts()
+        for answer in [2, 3, 4, 5]:
+            counts.add("Q", answer)
+
+        self.assertEqual(
+            {"median": 3.5, "mode": 2, "variation ratio": 0.75},
+            counts.get_distributions()[0]["statistics"],
+        )
+
+    def test_invalid_answer_is_not_counted(self):
+        """Test that answers other than the Likert levels are not counted."""
+        counts = DistributionCounts()
+        counts.add("Q", "x")
+        counts.add("Q", "4")
+
+        self.assertEqual([0, 0, 0, 1, 0], counts.get_counts("Q").tolist())
+        self.assertIsNone(counts.get_counts("Q", future=True))
+
+    def test_no_future_distributions(self):
+        """Test that the future distributions are empty without future answers."""
+        counts = DistributionCounts()
+        counts.add("Q", 1)
+
+        self.assertEqual([], counts.get_all_distributions()[1])
+
+    def test_copy_is_independent(self):
+        """Test that updating a copy does not change the original counts."""
+        counts = DistributionCounts()
+        counts.add("Q", 1)
+        copy = counts.copy()
+        copy.add("Q", 1)
+        copy.add("Q", 5, future=True)
+
+        self.assertEqual(1, counts.get_counts("Q").sum())
+        self.assertEqual(2, copy.get_counts("Q").sum())
+        self.assertIsNone(counts.get_counts("Q", future=True))
@@ -0,0 +1,173 @@
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+from google.api_core.exceptions import InvalidArgument, NotFound, ResourceExhausted
+from backend.services.gemini_service import (
+    CHARS_PER_TOKEN,
+    MIN_CACHED_TOKENS,
+    Gemini,
+)
+
+# A prefix that is long enough for Gemini cached content
+PREFIX = "I" * (MIN_CACHED_TOKENS * CHARS_PER_TOKEN)
+
+
+class MockModel:
+    def __init__(self, name, cached_tokens=0):
+        self.model_name = name
+        self.cached_tokens = cached_tokens
+        self.contents = []
+
+    def generate_content(self, content):
+        self.contents.append(content)
+        return SimpleNamespace(
+            text="Agent 1: 3",
+            usage_metadata=SimpleNamespace(
+                prompt_token_count=100, cached_content_token_count=self.cached_tokens
+            ),
+        )
+
+
+class MockExpiredModel:
+    """Mock model whose cached content has been deleted."""
+
+    def generate_content(self, content):
+        raise NotFound("CachedContent not found")
+
+
+class TestGeminiPromptCache(unittest.TestCase):
+    def setUp(self):
+        self.ai_model = MockModel("models/gemini-1.5-flash-002")
+        self.gemini = Gemini(self.ai_model)
+
+    def test_cached_prefix_is_not_sent(self):
+        """Test that only the rest of a prompt that starts with a cached prefix is sent."""
+        cached_model = MockModel("cached", cached_tokens=80)
+        with patch("google.generativeai.caching.CachedContent.create"), patch(
+            "google.generativeai.GenerativeModel.from_cached_content",
+            return_value=cached_model,
+        ):
+            self.assertTrue(self.gemini.cache_prefix(PREFIX))
+
+        self.gemini.get_response(PREFIX + "Agent 1")
+        self.gemini.get_response("Other prompt")
+
+        self.assertEqual(["Agent 1"], cached_model.contents)
+        self.assertEqual(["Other prompt"], self.ai_model.contents)
+        self.assertEqual(
+            {"prompt tokens": 200, "cached tokens": 80, "hit rate": 0.4},
+            self.gemini.get_cache_statistics(),
+        )
+
+    def test_failed_caching_sends_full_prompt(self):
+        """Test that caching is not retried at once and the whole prompt is sent if it fails."""
+        with patch(
+            "google.generativeai.caching.CachedContent.create",
+            side_effect=ValueError("Cached content is too small"),
+        ) as create:
+            self.assertFalse(self.gemini.cache_prefix(PREFIX))
+            self.assertFalse(self.gemini.cache_prefix(PREFIX))
+            self.assertEqual(1, create.call_count)
+
+        self.gemini.get_response(PREFIX + "Agent 1")
+        self.assertEqual([PREFIX + "Agent 1"], self.ai_model.contents)
+
+    def test_expired_prefix_is_not_used(self):
+        """Test that the prompts are sent in full after the cached content has expired and the
+        prefix is cached again by the next call."""
+        cached_model = MockModel("cached")
+        with patch("google.generativeai.caching.CachedContent.create") as create, patch(
+            "google.generativeai.GenerativeModel.from_cached_content",
+            return_value=cached_model,
+        ), patch("backend.services.gemini_service.time.monotonic") as monotonic:
+            monotonic.return_value = 0.0
+            self.gemini.cache_prefix(PREFIX, ttl_minutes=60)
+
+            monotonic.return_value = 3600.0
+            self.gemini.get_response(PREFIX + "Agent 1")
+            self.assertEqual([PREFIX + "Agent 1"], self.ai_model.contents)
+
+            self.assertTrue(self.gemini.cache_prefix(PREFIX, ttl_minutes=60))
+            self.assertEqual(2, create.call_count)
+            self.gemini.get_response(PREFIX + "Agent 2")
+            self.assertEqual(["Agent 2"], cached_model.contents)
+
+    def test_missing_cached_content_sends_full_prompt(self):
+        """Test that the whole prompt is sent if Gemini no longer has the cached content."""
+        cached_model = MockExpiredModel()
+        with patch("google.generativeai.caching.CachedContent.create"), patch(
+            "google.generativeai.GenerativeModel.from_cached_content",
+            return_value=cached_model,
+        ):
+            self.gemini.cache_prefix(PREFIX)
+
+        self.assertEqual("Agent 1: 3", self.gemini.get_response(PREFIX + "Agent 1"))
+        self.gemini.get_response(PREFIX + "Agent 2")
+        self.assertEqual(
+            [PREFIX + "Agent 1", PREFIX + "Agent 2"], self.ai_model.contents
+        )
+
+    def test_prefix_is_cached_without_holding_the_lock(self):
+        """Test that other calls return at once while the cached content is being created."""
+        calls_during_create = []
+
+        def create(**kwargs):
+            calls_during_create.append(self.gemini.cache_prefix(PREFIX))
+            self.gemini.get_response("Other prompt")
+
+        with patch(
+            "google.generativeai.caching.CachedContent.create", side_effect=create
+        ), patch("google.generativeai.GenerativeModel.from_cached_content"):
+            self.assertTrue(self.gemini.cache_prefix(PREFIX))
+
+        self.assertEqual([False], calls_during_create)
+        self.assertEqual(["Other prompt"], self.ai_model.contents)
+
+    def test_short_prefix_is_not_cached(self):
+        """Test that a prefix below the minimum size of cached content is not sent to be
+        cached."""
+        with patch("google.generativeai.caching.CachedContent.create") as create:
+            self.assertFalse(self.gemini.cache_prefix("Instructions. "))
+            self.assertEqual(0, create.call_count)
+
+    def test_unversioned_model_is_not_cached(self):
+        """Test that a prefix is not sent to be cached for a model without a version
+        suffix."""
+        gemini = Gemini(MockModel("models/gemini-1.5-flash"))
+        with patch("google.generativeai.caching.CachedContent.create") as create:
+            self.assertFalse(gemini.cache_prefix(PREFIX))
+            self.assertEqual(0, create.call_count)
+
+
+class MockCandidateModel:
+    """A model whose candidate_count requests fail with the given error."""
+
+    def __init__(self, error):
+        self.model_name = "gemini"
+        self.error = error
+
+    async def generate_content_async(self, content, generation_config=None):
+        if generation_config is not None:
+            raise self.error
+        return SimpleNamespace(text="Agent 1: 3", usage_metadata=None)
+
+
+class TestGeminiCandidates(unittest.TestCase):
+    def test_rejected_candidate_count_is_disabled(self):
+        """Test that separate requests are sent when the model rejects candidate_count."""
+        gemini = Gemini(
+            MockCandidateModel(InvalidArgument("candidate_count must be 1"))
+        )
+
+        self.assertEqual(
+            [["Agent 1: 3", "Agent 1: 3"]],
+            gemini.get_parallel_multiple_responses(["prompt"], 2),
+        )
+        self.assertFalse(gemini.candidate_count_supported)
+
+    def test_transient_error_keeps_candidate_count(self):
+        """Test that a rate limit error does not disable multiple candidates."""
+        gemini = Gemini(MockCandidateModel(ResourceExhausted("429 Quota exceeded")))
+
+        self.assertEqual([], gemini.get_parallel_multiple_responses(["prompt"], 2))
+        self.assertTrue(gemini.candidate_count_supported)
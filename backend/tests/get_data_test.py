@@ -1,5 +1,16 @@
 import unittest
-from backend.services.get_data import GetData
+import numpy as np
+from backend.services.get_data import (
+    GetData,
+    add_statistics,
+    answer_matrix,
+    repetition_counts,
+    mean_confidence_interval,
+    statistics_from_counts,
+    grouped_counts,
+    segment_labels,
+)
+from backend.entities.agent import Agent
 
 
 class TestGetData(unittest.TestCase):
@@ -169,11 +180,180 @@ class TestGetData(unittest.TestCase):
 
         self.assertEqual(distributions[0]["question"], "Question 1")
 
+    def test_get_repeated_distributions(self):
+        """Test get_repeated_distributions gives mean counts and intervals over repetitions."""
+        agents = [
+            MockAgent({"Q": [1, 1, 2]}, {}),
+            MockAgent({"Q": [5, 5, 5]}, {}),
+        ]
+        distributions = self.get_data.get_repeated_distributions(agents)
+
+        self.assertEqual(1, len(distributions))
+        data = distributions[0]["data"]
+        self.assertAlmostEqual(2 / 3, data[0]["value"])
+        self.assertAlmostEqual(1 / 3, data[1]["value"])
+        self.assertEqual([1.0, 1.0], data[4]["confidence interval"])
+        statistics = distributions[0]["statistics"]
+        self.assertEqual(3, statistics["repetitions"])
+        self.assertAlmostEqual(3 + 1 / 6, statistics["mean"])
+        self.assertEqual(5, statistics["mode"])
+
+    def test_get_all_repeated_distributions_no_future(self):
+        """Test get_all_repeated_distributions returns no future distributions without future
+        answers."""
+        agents = [MockAgent({"Q": [1, 2]}, {})]
+        current, future = self.get_data.get_all_repeated_distributions(agents)
+
+        self.assertEqual(1, len(current))
+        self.assertEqual([], future)
+
+    def test_answer_matrix_pads_missing_answers(self):
+        """Test that answer_matrix pads missing repetitions with zeros."""
+        agents = [MockAgent({"Q": [1, 2]}, {}), MockAgent({"Q": [3]}, {})]
+        matrix = answer_matrix(agents, "Q")
+        np.testing.assert_array_equal([[1, 2], [3, 0]], matrix)
+        np.testing.assert_array_equal(
+            [[1, 0, 1, 0, 0], [0, 1, 0, 0, 0]], repetition_counts(matrix)
+        )
+
+    def test_mean_confidence_interval_single_sample(self):
+        """Test that the confidence interval is infinite with only one sample."""
+        mean, half = mean_confidence_interval(np.array([3.0]))
+        self.assertEqual(3.0, mean)
+        self.assertEqual(np.inf, half)
+
+    def test_statistics_from_counts_matches_add_statistics(self):
+        """Test that statistics_from_counts gives the same results as add_statistics."""
+        for counts in ([2, 1, 1, 2, 0], [1, 2, 0, 2, 1], [0, 0, 0, 0, 1]):
+            distribution = {
+                "answers": dict(
+                    zip(
+                        [
+                            "Strongly disagree",
+                            "Disagree",
+                            "Neutral",
+                            "Agree",
+                            "Strongly agree",
+                        ],
+                        counts,
+                    )
+                ),
+                "statistics": {},
+            }
+            expected = add_statistics(distribution)["statistics"]
+            self.assertEqual(expected, statistics_from_counts(np.array(counts)))
+
+    def test_get_all_expected_distributions(self):
+        """Test that expected distributions are sums of the agents' probabilities."""
+        agents = [
+            MockAgent({}, {}, {"Q": [[0, 0.5, 0.5, 0, 0]]}),
+            MockAgent({}, {}, {"Q": [[0, 0, 1, 0, 0], [0, 0, 0, 1, 0]]}),
+        ]
+        current, future = self.get_data.get_all_expected_distributions(agents)
+
+        values = [item["value"] for item in current[0]["data"]]
+        self.assertEqual([0, 0.5, 1.0, 0.5, 0], values)
+        self.assertEqual(
+            {"median": 3, "mode": 3, "variation ratio": 0.5, "mean": 3.0},
+            current[0]["statistics"],
+        )
+        self.assertEqual([], future)
+
+
+class TestSegmentedDistributions(unittest.TestCase):
+    """Tests for the distributions of the segments of the agents."""
+
+    def setUp(self):
+        self.get_data = GetData()
+        rng = np.random.default_rng(1)
+        self.agents = []
+        for i, (current, future) in enumerate(rng.integers(1, 6, (40, 2))):
+            agent = Agent(
+                {
+                    "Age": 18 + i,
+                    "Gender": ["Male", "Female", "Other"][i % 3],
+                    "Answers": {"Region": str(i % 2), "var1": 0.5},
+                }
+            )
+            agent.questions = {"Q1": [int(current)], "Q2": [int(future)]}
+            agent.future_questions = {"Q1": [int(future)]}
+            self.agents.append(agent)
+
+    def test_segments_equal_distributions_of_subsets(self):
+        """Test that each segment has the same distributions as its agents alone."""
+        segments = self.get_data.get_all_segmented_distributions(self.agents, "Gender")
+
+        self.assertEqual(["Female", "Male", "Other"], [s["segment"] for s in segments])
+        for segment in segments:
+            subset = [
+                agent
+                for agent in self.agents
+                if agent.get_agent_info()["Gender"] == segment["segment"]
+            ]
+            current, future = self.get_data.get_all_distributions(subset)
+            self.assertEqual(len(subset), segment["agents"])
+            self.assertEqual(current, segment["distributions"])
+            self.assertEqual(future, segment["future_distributions"])
+
+    def test_segment_by_age_band_and_column(self):
+        """Test that agents are segmented by age band or by an answer column."""
+        self.assertEqual(
+            ["10-19", "20-29", "30-39", "40-49", "50-59"],
+            [
+                s["segment"]
+                for s in self.get_data.get_all_segmented_distributions(
+                    self.agents, "Age"
+                )
+            ],
+        )
+        self.assertEqual(
+            [20, 20],
+            [
+                s["agents"]
+                for s in self.get_data.get_all_segmented_distributions(
+                    self.agents, "Region"
+                )
+            ],
+        )
+
+    def test_invalid_segment_column(self):
+        """Test that a numeric or missing column is rejected."""
+        with self.assertRaises(ValueError):
+            segment_labels(self.agents, "var1")
+        with self.assertRaises(ValueError):
+            segment_labels(self.agents, "Missing")
+
+    def test_integral_float_segments(self):
+        """Test that whole numbers read as floats are labelled like integers."""
+        agents = [
+            Agent({"Age": 30, "Gender": "Male", "Answers": {"Code": value}})
+            for value in [1.0, 2.0, np.float64(1.0), np.nan, 3]
+        ]
+        self.assertEqual(
+            ["1", "2", "1", "unknown", "3"], segment_labels(agents, "Code")
+        )
+
+    def test_grouped_counts(self):
+        """Test that the answers are counted per group, question and Likert level."""
+        matrix = np.array([[1, 5], [1, 0], [2, 5]])
+        counts = grouped_counts(matrix, np.array([0, 1, 0]), 2)
+
+        self.assertEqual((2, 2, 5), counts.shape)
+        self.assertEqual([1, 1, 0, 0, 0], counts[0, 0].tolist())
+        self.assertEqual([0, 0, 0, 0, 2], counts[0, 1].tolist())
+        self.assertEqual([0, 0, 0, 0, 0], counts[1, 1].tolist())
+
 
 class MockAgent:
     """A class to mock Agent-objects"""
 
-    def __init__(self, questions: dict, future_questions: dict):
+    def __init__(
+        self,
+        questions: dict,
+        future_questions: dict,
+        answer_probabilities: dict = None,
+        future_answer_probabilities: dict = None,
+    ):
         """Creates an agent.
 
         Args:
@@ -184,6 +364,8 @@ class MockAgent:
         # {'Meat production should be reduced.': 2}
         self.questions = questions
         self.future_questions = future_questions
+        self.answer_probabilities = answer_probabilities or {}
+        self.future_answer_probabilities = future_answer_probabilities or {}
 
 
 class MockQuestions:
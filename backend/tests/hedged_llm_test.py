@@ -0,0 +1,198 @@
+import threading
+import time
+import unittest
+from backend.services.cancellation import CancellationToken
+from backend.services.hedged_llm import CircuitBreaker, HedgedLLM, is_valid_response
+
+
+class MockProvider:
+    def __init__(self, response="Agent 1: 3", error=None, release=None):
+        self.response = response
+        self.error = error
+        self.release = release
+        self.calls = 0
+
+    def get_response(self, prompt, cancellation=None):
+        self.calls += 1
+        self.cancellation = cancellation
+        if self.release is not None:
+            self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        return self.response
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.breaker = CircuitBreaker(2, 30.0, clock=lambda: self.now)
+
+    def test_opens_after_consecutive_failures(self):
+        """Test that the circuit opens after the threshold of failures."""
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.allow_request())
+        self.breaker.record_failure()
+        self.assertFalse(self.breaker.allow_request())
+        self.assertTrue(self.breaker.is_open())
+
+    def test_success_resets_failures(self):
+        """Test that a success resets the count of consecutive failures."""
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.allow_request())
+
+    def test_half_open_after_reset_timeout(self):
+        """Test that one trial request is allowed after the timeout and a success closes the circuit."""
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.now = 31.0
+        self.assertTrue(self.breaker.allow_request())
+        self.assertFalse(self.breaker.allow_request())
+        self.breaker.record_success()
+        self.assertTrue(self.breaker.allow_request())
+
+
+class TestHedgedLLM(unittest.TestCase):
+    def test_is_valid_response(self):
+        """Test that error strings and empty lists are not valid responses."""
+        self.assertTrue(is_valid_response("## Answer\n\nAgent 1: 3"))
+        self.assertFalse(is_valid_response("OpenAI Error: timeout"))
+        self.assertFalse(is_valid_response("## Error\n\nError message: 429"))
+        self.assertFalse(is_valid_response([]))
+
+    def test_fast_primary_is_not_hedged(self):
+        """Test that no duplicate request is sent when the primary answers in time."""
+        primary = MockProvider("first")
+        secondary = MockProvider("second")
+        llm = HedgedLLM([primary, secondary], hedge_delay=5)
+
+        self.assertEqual("first", llm.get_response("prompt"))
+        self.assertEqual(0, secondary.calls)
+
+    def test_slow_primary_is_hedged(self):
+        """Test that the secondary answers when the primary is slower than the hedging delay."""
+        release = threading.Event()
+        primary = MockProvider("first", release=release)
+        secondary = MockProvider("second")
+        llm = HedgedLLM([primary, secondary], hedge_delay=0.01)
+
+        self.assertEqual("second", llm.get_response("prompt"))
+        release.set()
+
+    def test_slower_request_is_cancelled(self):
+        """Test that the token of the request that lost is cancelled, but not the caller's."""
+        release = threading.Event()
+        primary = MockProvider("first", release=release)
+        secondary = MockProvider("second")
+        llm = HedgedLLM([primary, secondary], hedge_delay=0.01)
+        token = CancellationToken()
+
+        self.assertEqual("second", llm.get_response("prompt", cancellation=token))
+        self.assertTrue(primary.cancellation.is_cancelled())
+        self.assertFalse(secondary.cancellation.is_cancelled())
+        self.assertFalse(token.is_cancelled())
+        release.set()
+
+    def test_response_that_cannot_be_parsed_fails_over(self):
+        """Test that a response rejected by the caller's check is not used."""
+        primary = MockProvider("I cannot answer that")
+        secondary = MockProvider("Agent 1: 3")
+        llm = HedgedLLM([primary, secondary], hedge_delay=5)
+
+        response = llm.get_response(
+            "prompt", is_valid=lambda response: response.startswith("Agent")
+        )
+        self.assertEqual("Agent 1: 3", response)
+
+    def test_half_open_provider_keeps_its_trial_request(self):
+        """Test that the circuit of a provider is checked only when a request is sent to it."""
+        llm = HedgedLLM(
+            [MockProvider("first"), MockProvider("second")],
+            hedge_delay=5,
+            failure_threshold=1,
+            reset_timeout=0.05,
+        )
+        llm.breakers[1].record_failure()
+        time.sleep(0.06)
+
+        self.assertEqual("first", llm.get_response("prompt"))
+        # The secondary was not needed, so its trial request is still available
+        self.assertTrue(llm.breakers[1].allow_request())
+        self.assertFalse(llm.breakers[1].allow_request())
+
+    def test_answering_model_is_recorded(self):
+        """Test that the model of the provider that answered is recorded, not the primary one."""
+        release = threading.Event()
+        primary = MockProvider("first", release=release)
+        primary.model = "primary-model"
+        secondary = MockProvider("second")
+        secondary.model = "secondary-model"
+        llm = HedgedLLM([primary, secondary], hedge_delay=0.01)
+
+        self.assertEqual("primary-model", llm.get_answering_model())
+        self.assertEqual("second", llm.get_response("prompt"))
+        release.set()
+        self.assertEqual("primary-model", llm.model)
+        self.assertEqual(["primary-model", "secondary-model"], llm.models)
+        self.assertEqual("secondary-model", llm.get_answering_model())
+
+    def test_fails_over_on_error(self):
+        """Test that the secondary is asked at once when the primary raises."""
+        primary = MockProvider(error=RuntimeError("down"))
+        secondary = MockProvider("second")
+        llm = HedgedLLM([primary, secondary], hedge_delay=5)
+
+        self.assertEqual("second", llm.get_response("prompt"))
+
+    def test_invalid_response_fails_over(self):
+        """Test that the secondary is asked at once when the primary returns an error."""
+        primary = MockProvider("OpenAI Error: rate limit")
+        secondary = MockProvider("second")
+        llm = HedgedLLM([primary, secondary], hedge_delay=5)
+
+        self.assertEqual("second", llm.get_response("prompt"))
+
+    def test_open_circuit_skips_provider(self):
+        """Test that a provider with an open circuit is not asked."""
+        primary = MockProvider(error=RuntimeError("down"))
+        secondary = MockProvider("second")
+        llm = HedgedLLM([primary, secondary], hedge_delay=5, failure_threshold=2)
+
+        for _ in range(3):
+            llm.get_response("prompt")
+
+        self.assertEqual(2, primary.calls)
+        self.assertEqual(3, secondary.calls)
+
+    def test_all_providers_failing(self):
+        """Test that the error is passed on like with a single provider."""
+        llm = HedgedLLM(
+            [MockProvider(error=RuntimeError("a")), MockProvider("OpenAI Error: b")],
+            hedge_delay=5,
+        )
+        self.assertEqual("OpenAI Error: b", llm.get_response("prompt"))
+
+        llm = HedgedLLM([MockProvider(error=RuntimeError("down"))])
+        with self.assertRaises(RuntimeError):
+            llm.get_response("prompt")
+
+    def test_unsupported_method(self):
+        """Test that a method no provider has raises ValueError."""
+        llm = HedgedLLM([MockProvider()])
+        with self.assertRaises(ValueError):
+            llm.get_parallel_token_logprobs(["prompt"])
+
+    def test_cache_statistics_are_summed(self):
+        """Test that the prompt cache statistics come from the providers that have them."""
+        primary = MockProvider()
+        primary.get_cache_statistics = lambda: {
+            "prompt tokens": 300,
+            "cached tokens": 100,
+            "hit rate": 1 / 3,
+        }
+        llm = HedgedLLM([primary, MockProvider()])
+        self.assertEqual(
+            {"prompt tokens": 300, "cached tokens": 100, "hit rate": 1 / 3},
+            llm.get_cache_statistics(),
+        )
@@ -0,0 +1,100 @@
+import unittest
+import numpy as np
+import pandas as pd
+from backend.entities.agent import Agent
+from backend.services.population_store import PopulationStore
+from backend.services.latent_correlations import (
+    LatentCorrelations,
+    latent_answer_correlations,
+    get_all_correlations,
+)
+
+
+class TestLatentAnswerCorrelations(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.X = np.round(rng.normal(size=(100, 3)), 1)
+        self.Y = np.clip(np.round(3 + self.X[:, :2]), 1, 5).astype(np.int64)
+
+    def test_pearson(self):
+        """Test that the Pearson correlations match NumPy's."""
+        correlations, counts = latent_answer_correlations(self.X, self.Y, "pearson")
+
+        expected = np.corrcoef(self.X.T, self.Y.T)[:3, 3:]
+        np.testing.assert_allclose(expected, correlations)
+        self.assertEqual([100, 100], counts.tolist())
+
+    def test_spearman(self):
+        """Test that the Spearman correlations match pandas' without missing answers."""
+        correlations, _ = latent_answer_correlations(self.X, self.Y, "spearman")
+
+        expected = pd.DataFrame(np.hstack([self.X, self.Y])).corr("spearman")
+        np.testing.assert_allclose(expected.values[:3, 3:], correlations)
+
+    def test_missing_answers_are_left_out(self):
+        """Test that agents without an answer are left out of that question only."""
+        Y = self.Y.copy()
+        Y[:10, 0] = 0
+        correlations, counts = latent_answer_correlations(self.X, Y, "pearson")
+
+        expected = np.corrcoef(self.X[10:].T, self.Y[10:, 0])[:3, 3]
+        np.testing.assert_allclose(expected, correlations[:, 0])
+        self.assertEqual([90, 100], counts.tolist())
+
+    def test_constant_answers(self):
+        """Test that the correlations of constant answers are NaN."""
+        Y = np.full((100, 1), 3)
+        correlations, _ = latent_answer_correlations(self.X, Y)
+        self.assertTrue(np.isnan(correlations).all())
+
+
+class TestLatentCorrelations(unittest.TestCase):
+    def setUp(self):
+        self.agents = []
+        for i in range(20):
+            agent = Agent({"Age": 30, "Answers": {"var1": i / 10, "Region": "North"}})
+            agent.questions = {"Q": [1 + i // 4]}
+            self.agents.append(agent)
+
+    def test_get_all_correlations(self):
+        """Test that only the numeric values of the agents are used as latent variables."""
+        current, future = get_all_correlations(self.agents)
+
+        self.assertEqual([], future)
+        self.assertEqual("Q", current[0]["question"])
+        # Only numeric values are latent variables
+        self.assertEqual(["var1"], [c["variable"] for c in current[0]["correlations"]])
+        self.assertGreater(current[0]["correlations"][0]["value"], 0.9)
+
+    def test_integer_coded_variables(self):
+        """Test that integer values stored as strings are used as latent variables."""
+        agents = []
+        for i in range(20):
+            agent = Agent({"Age": 30, "Answers": {"A": str(i // 4), "B": "North"}})
+            agent.questions = {"Q": [1 + i // 4]}
+            agents.append(agent)
+
+        current, _ = get_all_correlations(agents)
+
+        self.assertEqual(["A"], [c["variable"] for c in current[0]["correlations"]])
+        self.assertAlmostEqual(1.0, current[0]["correlations"][0]["value"])
+
+    def test_cached_by_version(self):
+        """Test that the results are cached by the population version and the method."""
+        store = PopulationStore()
+        analytics = LatentCorrelations()
+        population = store.publish(self.agents)
+
+        first = analytics.get_correlations(population)
+        self.assertIs(first, analytics.get_correlations(population))
+        self.assertIsNot(first, analytics.get_correlations(population, "pearson"))
+
+        newer = store.publish(population.copy_agents(), base=population)
+        self.assertIsNot(first, analytics.get_correlations(newer))
+
+    def test_unknown_method(self):
+        """Test that an unknown method raises ValueError."""
+        with self.assertRaises(ValueError):
+            LatentCorrelations().get_correlations(
+                PopulationStore().current(), "kendall"
+            )
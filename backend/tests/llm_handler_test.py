@@ -1,6 +1,11 @@
+import math
+import re
 import pytest
-import builtins
 from backend.services.llm_handler import LlmHandler
+from backend.services.answer_cache import AnswerCache
+from backend.services.hedged_llm import HedgedLLM
+from backend.services.cancellation import CancellationToken, RequestCancelled
+from backend.services.distribution_counts import DistributionCounts
 
 
 class MockAgent:
@@ -13,6 +18,10 @@ class MockAgent:
         }
         self.questions = {}
         self.future_questions = {}
+        self.answer_probabilities = {}
+        self.future_answer_probabilities = {}
+        self.predicted_questions = set()
+        self.future_predicted_questions = set()
 
     def get_agent_info(self):
         return self._agent_info
@@ -27,7 +36,7 @@ class MockLLM:
     def __init__(self):
         self.prompt_received = None
 
-    def get_response(self, prompt):
+    def get_response(self, prompt, cancellation=None):
         self.prompt_received = prompt
         return "Agent 1: 3, 4\nAgent 2: 2, 5"
 
@@ -40,6 +49,29 @@ class MockLLM:
             "Agent 1: 4, 5\nAgent 2: 3, 4",
         ]
 
+    def get_parallel_token_logprobs(self, prompts):
+        self.prompts_received = prompts
+        tokens = [
+            ("Agent", {"Agent": 0.0}),
+            (" ", {" ": 0.0}),
+            ("1", {"1": 0.0}),
+            (":", {":": 0.0}),
+            (" ", {" ": 0.0}),
+            ("3", {"3": math.log(0.5), "4": math.log(0.3), "x": math.log(0.2)}),
+            ("\n", {"\n": 0.0}),
+            ("Agent", {"Agent": 0.0}),
+            (" 2", {" 2": 0.0}),
+            (":", {":": 0.0}),
+            (" 5", {" 5": math.log(0.9), " 1": math.log(0.1)}),
+        ]
+        return [tokens for _ in prompts]
+
+    def get_parallel_multiple_responses(self, prompts, n):
+        self.prompts_received = prompts
+        self.n_received = n
+        candidates = ["Agent 1: 3, 4\nAgent 2: 2, 5", "Agent 1: 1, 1\nAgent 2: 5, 5"]
+        return [candidates[:n] for _ in prompts]
+
 
 class MockLLMString:
     """Mock LLM that returns a single string for parallel responses."""
@@ -86,13 +118,6 @@ class MockLLMEmpty:
         return ""
 
 
-class MockStr(str):
-    """Mock string that splits into a single-element list."""
-
-    def split(self, sep=None, maxsplit=-1):
-        return ["element"]
-
-
 # Fixtures
 
 
@@ -146,6 +171,18 @@ def test_add_agents_info_without_future(llm_handler, fake_agents):
     assert "2" in info_prompt
 
 
+def test_add_agents_info_rounds_like_grouping(llm_handler):
+    """Test that agents grouped by their rounded latent values get the same prompt."""
+    agents = [MockAgent({"Q1": 1.23, "Q2": -0.04}), MockAgent({"Q1": 1.19, "Q2": 0.0})]
+
+    assert len(llm_handler._group_agents(agents)) == 1
+    first, second = (
+        llm_handler.add_agents_info([agent], ["Q1", "Q2"]) for agent in agents
+    )
+    assert first == second
+    assert "1.2\n0.0\n" in first
+
+
 def test_add_questions_and_instructions(llm_handler):
     """Test that add_questions_and_instructions adds the correct questions and instructions to the prompt."""
     questions = ["Q1", "Q2", "Q3"]
@@ -175,62 +212,40 @@ def test_create_prompt(llm_handler, fake_agents):
 # Parse and save tests
 
 
-def test_parse_line_success(llm_handler):
-    """Test that parse_line correctly maps answers to questions for a valid line."""
+def test_parse_responses_success(llm_handler, fake_agents):
+    """Test that parse_responses correctly maps answers to questions for a valid response."""
     qs = ["Q1", "Q2"]
-    line = "Agent 1: 3, 4"
-    assert llm_handler.parse_line(line, 0, qs) == {"Q1": 3, "Q2": 4}
+    responses = llm_handler.parse_responses(
+        "Agent 1: 3, 4\nAgent 2: 2, 5", fake_agents, qs
+    )
+    assert responses == {
+        fake_agents[0]: {"Q1": 3, "Q2": 4},
+        fake_agents[1]: {"Q1": 2, "Q2": 5},
+    }
 
 
-def test_parse_line_failure(llm_handler):
-    """Test that parse_line returns None for mismatched agent index."""
+def test_parse_responses_matches_agent_numbers(llm_handler, fake_agents):
+    """Test that the answers are matched to the agents by number, not by line order."""
     qs = ["Q1", "Q2"]
-    line = "Agent 2: 3, 4"
-    assert llm_handler.parse_line(line, 0, qs) is None
+    response = "Here are the answers:\nAgent 2: 2, 5\n\nAgent 1: 3, 4"
+    responses = llm_handler.parse_responses(response, fake_agents, qs)
+    assert responses[fake_agents[0]] == {"Q1": 3, "Q2": 4}
+    assert responses[fake_agents[1]] == {"Q1": 2, "Q2": 5}
 
 
-def test_parse_line_invalid_format_using_fakestr(llm_handler):
-    """Test that parse_line returns None when non-digit parts are present."""
-    qs = ["Q1", "Q2"]
-    line = MockStr("Agent 1: dummy")
-    assert llm_handler.parse_line(line, 0, qs) is None
-
-
-def test_parse_line_conversion_failure(monkeypatch, llm_handler):
-    """Test that parse_line handles ValueError during int conversion gracefully."""
-    qs = ["Q1", "Q2"]
-    line = "Agent 1: 3, 4"
-    original_int = builtins.int
-
-    def fake_int(x):
-        raise ValueError("error")
-
-    monkeypatch.setattr(builtins, "int", fake_int)
-    assert llm_handler.parse_line(line, 0, qs) is None
-    monkeypatch.setattr(builtins, "int", original_int)
-
-
-def test_process_lines(llm_handler, fake_agents):
-    """Test that process_lines returns correct mapping for valid lines."""
-    qs = ["Q1", "Q2"]
-    lines = ["Agent 1: 3, 4", "Agent 2: 2, 5"]
-    responses = llm_handler.process_lines(lines, fake_agents, qs)
-    assert len(responses) == 2
-
-
-def test_process_lines_insufficient_agents(llm_handler):
-    """Test that process_lines skips extra lines when fewer agents are provided."""
+def test_parse_responses_unknown_agent(llm_handler):
+    """Test that lines of agents that were not in the prompt are skipped."""
     agent = MockAgent({"Q1": 1, "Q2": 2})
-    lines = ["Agent 1: 3, 4", "Agent 2: 2, 5"]
-    responses = llm_handler.process_lines(lines, [agent], ["Q1", "Q2"])
+    response = "Agent 1: 3, 4\nAgent 2: 2, 5"
+    responses = llm_handler.parse_responses(response, [agent], ["Q1", "Q2"])
     assert len(responses) == 1
 
 
-def test_process_lines_skip_empty_response(llm_handler, fake_agents):
-    """Test that process_lines skips lines that parse to None."""
-    lines = ["Agent 1: 3, 4", "Agent 2: invalid"]
-    responses = llm_handler.process_lines(lines, fake_agents, ["Q1", "Q2"])
-    assert len(responses) == 1
+def test_parse_responses_skip_invalid_line(llm_handler, fake_agents):
+    """Test that agents whose line has no answers are left out."""
+    response = "Agent 1: 3, 4\nAgent 2: invalid"
+    responses = llm_handler.parse_responses(response, fake_agents, ["Q1", "Q2"])
+    assert list(responses) == [fake_agents[0]]
 
 
 def test_save_responses_to_agents(llm_handler, fake_agents):
@@ -243,6 +258,17 @@ def test_save_responses_to_agents(llm_handler, fake_agents):
     assert fake_agents[0].questions == {"Q1": [3], "Q2": [4]}
 
 
+def test_save_responses_to_agents_counts_first_answers(llm_handler, fake_agents):
+    """Test that only the first answer of each agent to a question is counted."""
+    fake_agents[0].questions = {"Q1": [1]}
+    fake_agents[1].questions = {}
+    counts = DistributionCounts()
+    responses = {fake_agents[0]: {"Q1": 2, "Q2": 5}, fake_agents[1]: {"Q1": 3}}
+    llm_handler.save_responses_to_agents(responses, False, counts)
+    assert counts.get_counts("Q1").tolist() == [0, 0, 1, 0, 0]
+    assert counts.get_counts("Q2").tolist() == [0, 0, 0, 0, 1]
+
+
 def test_save_responses_append_existing(llm_handler, fake_agents):
     """Test that save_responses_to_agents appends to existing question lists."""
     fake_agents[0].questions = {"Q1": [1]}
@@ -313,3 +339,545 @@ def test_get_agents_responses_empty_response(llm_handler, fake_agents):
     llm_handler.transformer = MockTransformer(False)
     llm_handler.llm = MockLLMEmpty()
     assert llm_handler.get_agents_responses(fake_agents, ["Q1", "Q2"]) is None
+
+
+def test_get_agents_responses_deduplicates_identical_agents(llm_handler):
+    """Test that identical agents are prompted once and all of them get the answer."""
+    agents = [MockAgent({"Q1": 1, "Q2": 2}), MockAgent({"Q1": 1, "Q2": 2})]
+    res = llm_handler.get_agents_responses(agents, ["Q1", "Q2"])
+
+    assert "Agent 2:\n" not in llm_handler.llm.prompt_received
+    assert res["original"][agents[1]] == {"Q1": 3, "Q2": 4}
+    assert agents[0].questions == {"Q1": [3], "Q2": [4]}
+    assert agents[1].questions == {"Q1": [3], "Q2": [4]}
+
+
+def test_get_agents_responses_without_deduplication(llm_handler):
+    """Test that every agent is prompted when deduplication is turned off."""
+    llm_handler.deduplicate = False
+    agents = [MockAgent({"Q1": 1, "Q2": 2}), MockAgent({"Q1": 1, "Q2": 2})]
+    res = llm_handler.get_agents_responses(agents, ["Q1", "Q2"])
+
+    assert "Agent 2:\n" in llm_handler.llm.prompt_received
+    assert res["original"][agents[1]] == {"Q1": 2, "Q2": 5}
+
+
+def test_get_repeated_agents_responses_stops_when_converged(llm_handler, fake_agents):
+    """Test that a question is not asked again once its answers have converged."""
+    rounds = llm_handler.get_repeated_agents_responses(
+        fake_agents, ["Q1", "Q2"], max_repetitions=5, min_repetitions=2
+    )
+
+    # MockLLM always gives the same answers, so the intervals converge immediately
+    assert rounds == {"Q1": 2, "Q2": 2}
+    assert fake_agents[0].questions["Q1"] == [3, 3]
+
+
+def test_get_repeated_agents_responses_max_repetitions(llm_handler, fake_agents):
+    """Test that a question is asked at most max_repetitions times."""
+    rounds = llm_handler.get_repeated_agents_responses(
+        fake_agents, ["Q1"], max_repetitions=1
+    )
+
+    assert rounds == {"Q1": 1}
+    assert fake_agents[1].questions["Q1"] == [2]
+
+
+def test_get_agents_responses_multiple_samples(llm_handler, fake_agents):
+    """Test that all responses of one multi-sample request are saved into the agents."""
+    res = llm_handler.get_agents_responses(fake_agents, ["Q1", "Q2"], samples=2)
+
+    assert llm_handler.llm.n_received == 2
+    assert len(llm_handler.llm.prompts_received) == 1
+    assert len(res["original"]) == 2
+    assert fake_agents[0].questions == {"Q1": [3, 1], "Q2": [4, 1]}
+
+
+def test_get_agents_responses_multiple_samples_with_future(llm_handler, fake_agents):
+    """Test that multiple samples are requested for both the original and future prompt."""
+    llm_handler.transformer = MockTransformer(True)
+    res = llm_handler.get_agents_responses(fake_agents, ["Q1", "Q2"], samples=2)
+
+    assert len(llm_handler.llm.prompts_received) == 2
+    assert len(res["original"]) == 2 and len(res["future"]) == 2
+    assert fake_agents[1].future_questions == {"Q1": [2, 5], "Q2": [5, 5]}
+
+
+def test_get_agents_responses_multiple_samples_missing_response(
+    llm_handler, fake_agents
+):
+    """Test that None is returned when the LLM does not respond to every prompt."""
+    llm_handler.llm.get_parallel_multiple_responses = lambda prompts, n: []
+    assert llm_handler.get_agents_responses(fake_agents, ["Q1"], samples=2) is None
+
+
+def test_get_agents_responses_multiple_samples_future_fails(llm_handler, fake_agents):
+    """Test that no answers are saved if the future responses cannot be parsed."""
+    llm_handler.transformer = MockTransformer(True)
+    llm_handler.llm.get_parallel_multiple_responses = lambda prompts, n: [
+        ["Agent 1: 3, 4\nAgent 2: 2, 5"],
+        ["invalid"],
+    ]
+
+    assert (
+        llm_handler.get_agents_responses(fake_agents, ["Q1", "Q2"], samples=2) is None
+    )
+    assert fake_agents[0].questions == {}
+    assert fake_agents[0].future_questions == {}
+
+
+def test_get_repeated_agents_responses_samples_per_request(llm_handler, fake_agents):
+    """Test that repeated sampling requests several samples per round trip."""
+    rounds = llm_handler.get_repeated_agents_responses(
+        fake_agents, ["Q1"], max_repetitions=3, samples_per_request=2
+    )
+
+    # Two samples in the first request, one in the second
+    assert rounds == {"Q1": 3}
+    assert len(fake_agents[0].questions["Q1"]) == 3
+
+
+def test_parse_token_logprobs(llm_handler, fake_agents):
+    """Test that Likert probabilities are read from the tokens after 'Agent X:'."""
+    tokens = llm_handler.llm.get_parallel_token_logprobs(["prompt"])[0]
+    parsed = llm_handler.parse_token_logprobs(tokens, fake_agents, ["Q1"])
+
+    assert parsed[fake_agents[0]]["Q1"] == pytest.approx([0, 0, 0.625, 0.375, 0])
+    assert parsed[fake_agents[1]]["Q1"] == pytest.approx([0.1, 0, 0, 0, 0.9])
+
+
+def test_parse_token_logprobs_multiple_questions(llm_handler, fake_agents):
+    """Test that answers after commas are mapped to the following questions."""
+    tokens = [
+        ("Agent 1:", {}),
+        (" 2", {"2": 0.0}),
+        (",", {}),
+        (" 4", {"4": math.log(0.5), "5": math.log(0.5)}),
+    ]
+    parsed = llm_handler.parse_token_logprobs(tokens, fake_agents, ["Q1", "Q2"])
+
+    assert parsed[fake_agents[0]]["Q1"] == pytest.approx([0, 1, 0, 0, 0])
+    assert parsed[fake_agents[0]]["Q2"] == pytest.approx([0, 0, 0, 0.5, 0.5])
+
+
+def test_get_agents_probability_responses(llm_handler, fake_agents):
+    """Test that probabilities and the most probable answers are saved into the agents."""
+    res = llm_handler.get_agents_probability_responses(fake_agents, ["Q1"])
+
+    assert "original" in res and "future" not in res
+    assert fake_agents[0].questions == {"Q1": [3]}
+    assert fake_agents[1].questions == {"Q1": [5]}
+    assert len(fake_agents[1].answer_probabilities["Q1"]) == 1
+
+
+def test_get_agents_probability_responses_unsupported_llm(llm_handler, fake_agents):
+    """Test that a ValueError is raised when the LLM does not give log probabilities."""
+    llm_handler.llm = MockLLMEmpty()
+    with pytest.raises(ValueError):
+        llm_handler.get_agents_probability_responses(fake_agents, ["Q1"])
+
+
+def test_get_agents_responses_reuses_original_answers(llm_handler, fake_agents):
+    """Test that only the future agents are asked when the original answers exist."""
+    llm_handler.transformer = MockTransformer(True)
+    for agent in fake_agents:
+        agent.questions = {"Q1": [1], "Q2": [2]}
+
+    res = llm_handler.get_agents_responses(fake_agents, ["Q1", "Q2"])
+
+    # Only the single future prompt was sent
+    assert not hasattr(llm_handler.llm, "prompts_received")
+    assert "simulating" in llm_handler.llm.prompt_received
+    assert res["original"][fake_agents[0]] == {"Q1": 1, "Q2": 2}
+    assert fake_agents[0].questions == {"Q1": [1], "Q2": [2]}
+    assert fake_agents[0].future_questions == {"Q1": [3], "Q2": [4]}
+
+
+def test_get_agents_responses_asks_original_without_enough_answers(
+    llm_handler, fake_agents
+):
+    """Test that the original agents are asked again when their answers are all paired."""
+    llm_handler.transformer = MockTransformer(True)
+    for agent in fake_agents:
+        agent.questions = {"Q1": [1], "Q2": [2]}
+        agent.future_questions = {"Q1": [1], "Q2": [2]}
+
+    llm_handler.get_agents_responses(fake_agents, ["Q1", "Q2"])
+
+    assert len(llm_handler.llm.prompts_received) == 2
+    assert fake_agents[0].questions == {"Q1": [1, 3], "Q2": [2, 4]}
+
+
+def test_get_agents_responses_multiple_samples_reuses_original_answers(
+    llm_handler, fake_agents
+):
+    """Test that cached original answers are paired with multiple future samples."""
+    llm_handler.transformer = MockTransformer(True)
+    for agent in fake_agents:
+        agent.questions = {"Q1": [1, 2]}
+
+    res = llm_handler.get_agents_responses(fake_agents, ["Q1"], samples=2)
+
+    assert len(llm_handler.llm.prompts_received) == 1
+    assert [answers[fake_agents[0]] for answers in res["original"]] == [
+        {"Q1": 1},
+        {"Q1": 2},
+    ]
+    assert len(fake_agents[0].future_questions["Q1"]) == 2
+
+
+def test_get_agents_responses_uses_answer_cache(llm_handler, fake_agents):
+    """Test that cached answers are not asked from the LLM and new answers are cached."""
+    llm_handler.answer_cache = AnswerCache()
+    llm_handler.get_agents_responses(fake_agents, ["Q1", "Q2"])
+
+    agents = [MockAgent({"Q1": 1, "Q2": 2}), MockAgent({"Q1": 3, "Q2": 4})]
+    # The LLM would give an empty response, so the answers must come from the cache
+    llm_handler.llm.get_response = lambda prompt: ""
+    res = llm_handler.get_agents_responses(agents, ["Q1", "Q2"])
+
+    assert res["original"][agents[1]] == {"Q1": 2, "Q2": 5}
+    assert agents[0].questions == {"Q1": [3], "Q2": [4]}
+    assert llm_handler.answer_cache.get_statistics()["hits"] == 4
+
+
+def test_get_agents_responses_cache_miss_asks_only_missing_agents(
+    llm_handler, fake_agents
+):
+    """Test that only the agents without cached answers are included in the prompt."""
+    llm_handler.answer_cache = AnswerCache()
+    llm_handler.get_agents_responses(fake_agents[:1], ["Q1", "Q2"])
+
+    agents = [MockAgent({"Q1": 1, "Q2": 2}), MockAgent({"Q1": 3, "Q2": 4})]
+    res = llm_handler.get_agents_responses(agents, ["Q1", "Q2"])
+
+    assert "Agent 2:\n" not in llm_handler.llm.prompt_received
+    assert "3\n4\n" in llm_handler.llm.prompt_received
+    assert res["original"][agents[1]] == {"Q1": 3, "Q2": 4}
+
+
+def test_get_agents_responses_cache_not_used_for_repeated_questions(
+    llm_handler, fake_agents
+):
+    """Test that agents that have already answered get a new answer from the LLM."""
+    llm_handler.answer_cache = AnswerCache()
+    llm_handler.get_agents_responses(fake_agents, ["Q1"])
+    llm_handler.llm.prompt_received = None
+    llm_handler.get_agents_responses(fake_agents, ["Q1"])
+
+    assert llm_handler.llm.prompt_received is not None
+    assert fake_agents[0].questions == {"Q1": [3, 3]}
+
+
+class MockLLMDown:
+    """Mock LLM whose provider is down."""
+
+    model = "primary"
+
+    def get_response(self, prompt, cancellation=None):
+        raise RuntimeError("down")
+
+
+def test_get_agents_responses_caches_under_answering_model(llm_handler, fake_agents):
+    """Test that the answers of a hedged LLM are cached under the model that answered and are
+    found from the cache."""
+    secondary = MockLLM()
+    secondary.model = "secondary"
+    llm_handler.llm = HedgedLLM([MockLLMDown(), secondary], hedge_delay=5)
+    llm_handler.answer_cache = AnswerCache()
+    llm_handler.get_agents_responses(fake_agents, ["Q1", "Q2"])
+
+    version = llm_handler.PROMPT_VERSION
+    cache = llm_handler.answer_cache
+    assert cache.get((3.0, 4.0), "Q2", "secondary", version) == 5
+    assert cache.get((3.0, 4.0), "Q2", "primary", version) is None
+
+    agents = [MockAgent({"Q1": 1, "Q2": 2}), MockAgent({"Q1": 3, "Q2": 4})]
+    secondary.get_response = lambda prompt, cancellation=None: ""
+    res = llm_handler.get_agents_responses(agents, ["Q1", "Q2"])
+
+    assert res["original"][agents[1]] == {"Q1": 2, "Q2": 5}
+
+
+class MockLLMUnparsable:
+    """Mock LLM that answers with text that cannot be parsed into answers."""
+
+    model = "primary"
+
+    def get_response(self, prompt, cancellation=None):
+        return "I am sorry, but I cannot answer on behalf of the agents."
+
+
+def test_get_agents_responses_hedged_llm_skips_unparsable_response(
+    llm_handler, fake_agents
+):
+    """Test that a hedged LLM uses the response that can be parsed into answers."""
+    secondary = MockLLM()
+    secondary.model = "secondary"
+    llm_handler.llm = HedgedLLM([MockLLMUnparsable(), secondary], hedge_delay=5)
+
+    res = llm_handler.get_agents_responses(fake_agents, ["Q1", "Q2"])
+
+    assert res["original"][fake_agents[0]] == {"Q1": 3, "Q2": 4}
+    assert llm_handler.llm.get_answering_model() == "secondary"
+
+
+class MockLLMIncomplete:
+    """Mock cheap LLM that leaves out the answers of the second agent."""
+
+    model = "cheap"
+
+    def get_response(self, prompt):
+        return "Agent 1: 3, 4\nAgent 2: 2"
+
+
+def test_get_agents_responses_escalates_incomplete_response(llm_handler, fake_agents):
+    """Test that an incomplete response is escalated and the larger model's answers are saved."""
+    llm_handler.llm = MockLLMIncomplete()
+    llm_handler.escalation_llm = MockLLM()
+    llm_handler.answer_cache = AnswerCache()
+    questions = ["Statement 1", "Statement 2"]
+
+    result = llm_handler.get_agents_responses(fake_agents, questions)
+
+    assert result["original"][fake_agents[1]] == {"Statement 1": 2, "Statement 2": 5}
+    assert llm_handler.escalation_llm.prompt_received is not None
+    assert llm_handler.escalations == 1
+    version = llm_handler.PROMPT_VERSION
+    cache = llm_handler.answer_cache
+    assert cache.get((3.0, 4.0), "Statement 2", "MockLLM", version) == 5
+    assert cache.get((3.0, 4.0), "Statement 2", "cheap", version) is None
+
+
+def test_get_agents_responses_escalated_answers_found_in_cache(
+    llm_handler, fake_agents
+):
+    """Test that the answers of the larger model are found from the answer cache."""
+    llm_handler.llm = MockLLMIncomplete()
+    llm_handler.escalation_llm = MockLLM()
+    llm_handler.answer_cache = AnswerCache()
+    questions = ["Statement 1", "Statement 2"]
+    llm_handler.get_agents_responses(fake_agents, questions)
+
+    agents = [MockAgent({"Q1": 1, "Q2": 2}), MockAgent({"Q1": 3, "Q2": 4})]
+    result = llm_handler.get_agents_responses(agents, questions)
+
+    assert result["original"][agents[1]] == {"Statement 1": 2, "Statement 2": 5}
+    assert llm_handler.escalations == 1
+
+
+class MockLLMWorse:
+    """Mock larger LLM whose response cannot be parsed."""
+
+    model = "large"
+
+    def get_response(self, prompt):
+        return "I cannot answer"
+
+
+def test_get_agents_responses_keeps_better_parse(llm_handler, fake_agents):
+    """Test that the cheap model's answers are kept if the larger model answers fewer agents."""
+    llm_handler.llm = MockLLMIncomplete()
+    llm_handler.escalation_llm = MockLLMWorse()
+    llm_handler.answer_cache = AnswerCache()
+    questions = ["Statement 1", "Statement 2"]
+
+    result = llm_handler.get_agents_responses(fake_agents, questions)
+
+    assert result["original"][fake_agents[0]] == {"Statement 1": 3, "Statement 2": 4}
+    assert llm_handler.escalations == 1
+    version = llm_handler.PROMPT_VERSION
+    assert (
+        llm_handler.answer_cache.get((1.0, 2.0), "Statement 1", "cheap", version) == 3
+    )
+
+
+def test_get_agents_responses_complete_response_not_escalated(llm_handler, fake_agents):
+    """Test that the larger model is not asked when the cheap model's response is valid."""
+    llm_handler.escalation_llm = MockLLMIncomplete()
+    llm_handler.escalation_llm.get_response = None
+
+    result = llm_handler.get_agents_responses(
+        fake_agents, ["Statement 1", "Statement 2"]
+    )
+
+    assert result["original"][fake_agents[0]] == {"Statement 1": 3, "Statement 2": 4}
+    assert llm_handler.escalations == 0
+
+
+def test_get_agents_responses_escalates_mismatched_responses(llm_handler, fake_agents):
+    """Test that all prompts are escalated when the responses do not match the prompts."""
+    llm_handler.transformer = MockTransformer(future_exists=True)
+    llm_handler.llm = MockLLMBadResponse()
+    llm_handler.escalation_llm = MockLLM()
+
+    result = llm_handler.get_agents_responses(
+        fake_agents, ["Statement 1", "Statement 2"]
+    )
+
+    assert set(result) == {"original", "future"}
+    assert llm_handler.escalations == 2
+
+
+class MockLLMLatent:
+    """Mock LLM that answers from the first latent value of each agent in the prompt."""
+
+    def __init__(self):
+        self.asked = 0
+
+    def _answer(self, prompt):
+        blocks = re.findall(r"Agent (\d+):\nLatent variable values:\n(\S+)\n", prompt)
+        self.asked += len(blocks)
+        return "\n".join(
+            f"Agent {number}: {min(5, max(1, round(3 + float(value))))}"
+            for number, value in blocks
+        )
+
+    def get_response(self, prompt):
+        return self._answer(prompt)
+
+    def get_parallel_responses(self, prompts):
+        return [self._answer(prompt) for prompt in prompts]
+
+
+def test_get_agents_surrogate_responses(llm_handler):
+    """Test that only part of a large population is asked and the rest is predicted."""
+    agents = [MockAgent({"Q1": round(-2 + i * 0.04, 2), "Q2": 0}) for i in range(101)]
+    llm_handler.llm = MockLLMLatent()
+
+    result = llm_handler.get_agents_surrogate_responses(
+        agents, ["Statement"], initial_size=15, batch_size=5, max_rounds=2
+    )
+
+    assert llm_handler.llm.asked <= 25
+    answers = [result["original"][agent]["Statement"] for agent in agents]
+    expected = [min(5, max(1, round(3 + i * 0.04 - 2))) for i in range(101)]
+    assert sum(a == e for a, e in zip(answers, expected)) >= 85
+    assert all(
+        agent.questions["Statement"] == [answer]
+        for agent, answer in zip(agents, answers)
+    )
+    # Agents with equal rounded latent values are grouped, so some asked groups have several
+    predicted = [agent for agent in agents if "Statement" in agent.predicted_questions]
+    assert 0 < len(predicted) < 101
+
+
+def test_get_agents_surrogate_responses_default_sizes_scale(llm_handler):
+    """Test that by default at most half of a population of 100 distinct agents is asked."""
+    agents = [MockAgent({"Q1": round(-2 + i * 0.04, 2), "Q2": i}) for i in range(100)]
+    llm_handler.llm = MockLLMLatent()
+
+    llm_handler.get_agents_surrogate_responses(agents, ["Statement"])
+
+    assert 20 <= llm_handler.llm.asked <= 50
+    predicted = [agent for agent in agents if "Statement" in agent.predicted_questions]
+    assert len(predicted) == 100 - llm_handler.llm.asked
+
+
+def test_get_agents_surrogate_responses_small_population(llm_handler, fake_agents):
+    """Test that every agent is asked when there are fewer agents than the initial size."""
+    result = llm_handler.get_agents_surrogate_responses(
+        fake_agents, ["Statement 1", "Statement 2"]
+    )
+    assert result["original"][fake_agents[1]] == {"Statement 1": 2, "Statement 2": 5}
+    assert fake_agents[1].predicted_questions == set()
+
+
+def test_get_agents_surrogate_responses_failure(llm_handler, fake_agents):
+    """Test that None is returned when the first agents cannot be asked."""
+    llm_handler.llm = MockLLMEmpty()
+    assert llm_handler.get_agents_surrogate_responses(fake_agents, ["Q"]) is None
+
+
+def test_prompts_share_static_prefix(llm_handler, fake_agents):
+    """Test that prompts for different agents and questions start with the same prefix."""
+    prefix = llm_handler.create_prompt_prefix(["Q1", "Q2"])
+    first = llm_handler.create_prompt(fake_agents, ["Statement 1"])
+    second = llm_handler.create_prompt(
+        fake_agents[::-1], ["Statement 2", "Statement 3"]
+    )
+
+    assert first.startswith(prefix)
+    assert second.startswith(prefix)
+    assert "Agent 1:" not in prefix.split("For example:")[0]
+    assert "Statement" not in prefix
+
+
+def test_prompt_prefix_is_cached_by_llm(llm_handler, fake_agents):
+    """Test that the prefix is given to an LLM that supports explicit context caching before
+    the prompts are sent, and not when a prompt is only created."""
+    cached = []
+    llm_handler.llm.cache_prefix = cached.append
+
+    llm_handler.create_prompt(fake_agents, ["Statement 1"])
+    assert cached == []
+
+    llm_handler.get_agents_responses(fake_agents, ["Statement 1", "Statement 2"])
+
+    assert len(cached) == 1
+    assert cached[0].startswith(llm_handler.create_intro())
+    assert cached[0].endswith(llm_handler.add_instructions())
+
+
+class MockCancellableLLM:
+    """Mock LLM that accepts a cancellation token like the providers."""
+
+    def get_response(self, prompt, cancellation=None):
+        self.cancellation = cancellation
+        cancellation.raise_if_cancelled()
+        return "Agent 1: 3\nAgent 2: 2"
+
+
+def test_get_agents_responses_passes_cancellation_to_llm(llm_handler, fake_agents):
+    """Test that the cancellation token is given to the LLM."""
+    llm_handler.llm = MockCancellableLLM()
+    token = CancellationToken()
+
+    result = llm_handler.get_agents_responses(
+        fake_agents, ["Statement 1"], cancellation=token
+    )
+
+    assert llm_handler.llm.cancellation is token
+    assert result["original"][fake_agents[0]] == {"Statement 1": 3}
+
+
+def test_get_agents_responses_cancelled(llm_handler, fake_agents):
+    """Test that a cancelled request raises instead of saving answers."""
+    llm_handler.llm = MockCancellableLLM()
+    token = CancellationToken()
+    token.cancel()
+
+    with pytest.raises(RequestCancelled):
+        llm_handler.get_agents_responses(
+            fake_agents, ["Statement 1"], cancellation=token
+        )
+
+    assert fake_agents[0].questions == {}
+
+
+class MockCancellableLogprobsLLM(MockLLM):
+    """Mock LLM whose log probability requests accept a cancellation token."""
+
+    def get_parallel_token_logprobs(self, prompts, cancellation=None):
+        self.cancellation = cancellation
+        cancellation.raise_if_cancelled()
+        return super().get_parallel_token_logprobs(prompts)
+
+
+def test_get_agents_probability_responses_passes_cancellation_to_llm(
+    llm_handler, fake_agents
+):
+    """Test that the cancellation token is given to the log probability requests."""
+    llm_handler.llm = MockCancellableLogprobsLLM()
+    token = CancellationToken()
+
+    llm_handler.get_agents_probability_responses(
+        fake_agents, ["Q1"], cancellation=token
+    )
+    assert llm_handler.llm.cancellation is token
+
+    token.cancel()
+    with pytest.raises(RequestCancelled):
+        llm_handler.get_agents_probability_responses(
+            fake_agents, ["Q2"], cancellation=token
+        )
@@ -0,0 +1,63 @@
+import unittest
+from backend.services.local_llm_service import LocalLLM
+
+
+class MockLlama:
+    model_path = "models/llama-3.2-3b-instruct.Q4_K_M.gguf"
+
+    def __init__(self, error=None):
+        self.error = error
+        self.prompts = []
+
+    def set_cache(self, cache):
+        self.cache = cache
+
+    def create_chat_completion(self, messages, max_tokens):
+        if self.error is not None:
+            raise self.error
+        self.prompts.append(messages[0]["content"])
+        return {
+            "choices": [
+                {"message": {"content": f"Agent 1: {len(self.prompts)}"}},
+            ]
+        }
+
+
+class TestLocalLLM(unittest.TestCase):
+    def setUp(self):
+        self.ai_model = MockLlama()
+        self.llm = LocalLLM(self.ai_model)
+
+    def test_model_name_is_file_name(self):
+        """Test that the model is named by its file name."""
+        self.assertEqual("llama-3.2-3b-instruct.Q4_K_M.gguf", self.llm.model)
+
+    def test_get_response(self):
+        """Test that the prompt is sent to the model as a chat message."""
+        self.assertEqual("Agent 1: 1", self.llm.get_response("prompt"))
+        self.assertEqual(["prompt"], self.ai_model.prompts)
+
+    def test_get_parallel_responses(self):
+        """Test that the batch is answered in order and formatted like the remote providers."""
+        response = self.llm.get_parallel_responses(["first", "second"])
+
+        self.assertEqual("## Answer\n\nAgent 1: 1\n## Answer\n\nAgent 1: 2\n", response)
+        self.assertEqual(["first", "second"], self.ai_model.prompts)
+
+    def test_get_parallel_responses_error(self):
+        """Test that an error is returned in the form of the remote providers."""
+        llm = LocalLLM(MockLlama(error=RuntimeError("out of memory")))
+        response = llm.get_parallel_responses(["prompt"])
+        self.assertTrue(response.startswith("## Error"))
+
+    def test_get_parallel_multiple_responses(self):
+        """Test that each prompt gets `n` responses in order."""
+        responses = self.llm.get_parallel_multiple_responses(["a", "b"], 2)
+        self.assertEqual(
+            [["Agent 1: 1", "Agent 1: 2"], ["Agent 1: 3", "Agent 1: 4"]], responses
+        )
+
+    def test_get_parallel_multiple_responses_error(self):
+        """Test that an error gives an empty list."""
+        llm = LocalLLM(MockLlama(error=RuntimeError("out of memory")))
+        self.assertEqual([], llm.get_parallel_multiple_responses(["prompt"], 2))
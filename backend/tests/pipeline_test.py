@@ -0,0 +1,262 @@
+import os
+import tempfile
+import threading
+import unittest
+import pandas as pd
+from backend.services.cancellation import CancellationToken, RequestCancelled
+from backend.services.pipeline import Pipeline, PipelineNode
+from backend.services.survey_pipeline import SurveyPipeline
+from backend.services.training_data import TrainingData
+
+
+class TestPipeline(unittest.TestCase):
+    def setUp(self):
+        self.pipeline = Pipeline()
+        self.calls = []
+
+    def node(self, name, inputs=(), **params):
+        def function(*values, **params):
+            self.calls.append(name)
+            return sum(values) + params.get("value", 0)
+
+        return PipelineNode(name, function, inputs, params)
+
+    def test_key_depends_on_params_and_inputs(self):
+        """Test that the key changes with the parameters and the keys of the inputs."""
+        a = self.node("a", value=1)
+        self.assertEqual(a.key, self.node("a", value=1).key)
+        self.assertNotEqual(a.key, self.node("a", value=2).key)
+        self.assertNotEqual(
+            self.node("b", [a]).key, self.node("b", [self.node("a", value=2)]).key
+        )
+
+    def test_only_changed_nodes_are_computed(self):
+        """Test that unchanged inputs are reused and only the changed ones computed."""
+        a = self.node("a", value=1)
+        b = self.node("b", value=2)
+        self.assertEqual(3, self.pipeline.run(self.node("sum", [a, b])))
+
+        trace = []
+        changed = self.node("b", value=5)
+        self.assertEqual(6, self.pipeline.run(self.node("sum", [a, changed]), trace))
+
+        self.assertEqual(["a", "b", "sum", "b", "sum"], self.calls)
+        self.assertEqual(
+            ["reused", "computed", "computed"], [step["status"] for step in trace]
+        )
+
+    def test_failed_node_is_not_memoized(self):
+        """Test that a failed node is computed again on the next run."""
+
+        def fail():
+            self.calls.append("fail")
+            raise RuntimeError("No answer")
+
+        node = PipelineNode("fail", fail)
+        for _ in range(2):
+            with self.assertRaises(RuntimeError):
+                self.pipeline.run(node)
+        self.assertEqual(["fail", "fail"], self.calls)
+        self.assertNotIn(node, self.pipeline)
+
+    def test_concurrent_runs_compute_once(self):
+        """Test that threads running the same node wait for one computation."""
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow():
+            self.calls.append("slow")
+            started.set()
+            release.wait(5)
+            return 1
+
+        node = PipelineNode("slow", slow)
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(self.pipeline.run(node)))
+            for _ in range(3)
+        ]
+        threads[0].start()
+        started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual([1, 1, 1], results)
+        self.assertEqual(["slow"], self.calls)
+
+    def test_waiting_run_is_not_cancelled_with_the_computing_run(self):
+        """Test that a thread waiting for a cancelled computation computes the node itself."""
+        started = threading.Event()
+        release = threading.Event()
+
+        def cancelled():
+            started.set()
+            release.wait(5)
+            raise RequestCancelled("Cancelled")
+
+        def answered():
+            self.calls.append("answered")
+            return 2
+
+        errors = []
+        results = []
+
+        def run_cancelled():
+            try:
+                self.pipeline.run(PipelineNode("slow", cancelled))
+            except RequestCancelled as error:
+                errors.append(error)
+
+        first = threading.Thread(target=run_cancelled)
+        second = threading.Thread(
+            target=lambda: results.append(
+                self.pipeline.run(PipelineNode("slow", answered))
+            )
+        )
+        first.start()
+        started.wait(5)
+        second.start()
+        release.set()
+        first.join(5)
+        second.join(5)
+
+        self.assertEqual(1, len(errors))
+        self.assertEqual([2], results)
+        self.assertEqual(["answered"], self.calls)
+
+    def test_cancelled_waiting_run_stops_waiting(self):
+        """Test that a waiting thread raises RequestCancelled when its own request is
+        cancelled, and the computation goes on for the computing thread."""
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow():
+            started.set()
+            release.wait(5)
+            return 1
+
+        node = PipelineNode("slow", slow)
+        results = []
+        computing = threading.Thread(
+            target=lambda: results.append(self.pipeline.run(node))
+        )
+        computing.start()
+        started.wait(5)
+
+        cancellation = CancellationToken()
+        cancellation.cancel()
+        with self.assertRaises(RequestCancelled):
+            self.pipeline.run(node, cancellation=cancellation)
+
+        release.set()
+        computing.join(5)
+        self.assertEqual([1], results)
+        self.assertIn(node, self.pipeline)
+
+
+class FakeLlmHandler:
+    PROMPT_VERSION = "1"
+
+    def __init__(self):
+        self.asked = []
+
+    def _get_model_name(self):
+        return "fake"
+
+    def get_agents_responses(self, agents, questions, cancellation=None):
+        for agent in agents:
+            for question in questions:
+                if question not in agent.questions:
+                    self.asked.append(("original", question))
+                    agent.questions[question] = [2]
+                if agent.get_agent_future_info()["Answers"]:
+                    self.asked.append(("future", question))
+                    agent.future_questions[question] = [4]
+        return {}
+
+
+class FakeTransformer:
+    PROMPT_VERSION = "1"
+
+    def __init__(self):
+        self.scenarios = []
+
+    def transform_agents_to_future(self, agents, scenario, cancellation=None):
+        self.scenarios.append(scenario)
+        for agent in agents:
+            agent.save_new_future_latent_variables({"var1": 1.0})
+        return True
+
+
+class TestSurveyPipeline(unittest.TestCase):
+    def setUp(self):
+        with tempfile.NamedTemporaryFile(delete=False, mode="w", suffix=".csv") as tmp:
+            pd.DataFrame(
+                {
+                    "var1": [0.1 * i for i in range(10)],
+                    "Age": range(20, 30),
+                    "Gender": ["Female", "Male"] * 5,
+                }
+            ).to_csv(tmp.name, index=False)
+            self.csv_path = tmp.name
+
+        self.llm_handler = FakeLlmHandler()
+        self.transformer = FakeTransformer()
+        self.survey = SurveyPipeline(
+            self.llm_handler, self.transformer, TrainingData(self.csv_path)
+        )
+
+    def tearDown(self):
+        os.remove(self.csv_path)
+
+    def test_distributions(self):
+        """Test that the distributions are made from the answers of the agents."""
+        result = self.survey.run(["Q1", "Q2"], scenario="Rain", agent_count=4)
+
+        self.assertEqual(2, len(result["distributions"]))
+        self.assertEqual(
+            [0, 4, 0, 0, 0],
+            [level["value"] for level in result["distributions"][0]["data"]],
+        )
+        self.assertEqual(
+            {"median": 4, "mode": 4, "variation ratio": 0.0},
+            result["future_distributions"][1]["statistics"],
+        )
+
+    def test_changing_one_question_asks_only_it(self):
+        """Test that only the new question is asked when one question changes."""
+        self.survey.run(["Q1", "Q2"], agent_count=4)
+        self.llm_handler.asked.clear()
+
+        self.survey.run(["Q1", "Q3"], agent_count=4)
+
+        self.assertEqual({("original", "Q3")}, set(self.llm_handler.asked))
+
+    def test_changing_scenario_asks_only_future_agents(self):
+        """Test that a new scenario asks only the future agents again."""
+        self.survey.run(["Q1"], scenario="Rain", agent_count=4)
+        self.llm_handler.asked.clear()
+
+        result = self.survey.run(["Q1"], scenario="Drought", agent_count=4)
+
+        self.assertEqual({("future", "Q1")}, set(self.llm_handler.asked))
+        self.assertEqual(["Rain", "Drought"], self.transformer.scenarios)
+        statuses = {step["stage"]: step["status"] for step in result["stages"]}
+        self.assertEqual("reused", statuses["population"])
+        self.assertEqual("computed", statuses["transformation"])
+
+    def test_same_run_is_reused(self):
+        """Test that running the same pipeline again reuses the distributions."""
+        self.survey.run(["Q1"], agent_count=4, seed=1)
+        result = self.survey.run(["Q1"], agent_count=4, seed=1)
+
+        self.assertEqual(
+            [{"stage": "distributions", "status": "reused"}],
+            [
+                {"stage": step["stage"], "status": step["status"]}
+                for step in result["stages"]
+            ],
+        )
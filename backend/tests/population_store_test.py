@@ -0,0 +1,54 @@
+import unittest
+from backend.entities.agent import Agent
+from backend.services.population_store import PopulationStore
+
+
+class TestPopulationStore(unittest.TestCase):
+    def setUp(self):
+        self.store = PopulationStore()
+        self.agents = [Agent({"Age": 20, "Answers": {"var1": 1.0}}) for _ in range(3)]
+
+    def test_empty_at_start(self):
+        """Test that the store starts with an empty population."""
+        self.assertEqual(0, len(self.store.current()))
+
+    def test_publish_replaces_current(self):
+        """Test that a published population becomes the current version."""
+        population = self.store.publish(self.agents)
+
+        self.assertIs(population, self.store.current())
+        self.assertEqual(tuple(self.agents), population.agents)
+        self.assertEqual(1, population.version)
+
+    def test_reader_keeps_its_version(self):
+        """Test that a writer's changes are not seen by a reader of the earlier version."""
+        self.store.publish(self.agents)
+        reader = self.store.current()
+        copies = reader.copy_agents()
+        copies[0].questions["Statement"] = [4]
+
+        self.store.publish(copies, base=reader)
+
+        self.assertEqual({}, reader.agents[0].questions)
+        self.assertEqual({"Statement": [4]}, self.store.current().agents[0].questions)
+        self.assertEqual(2, self.store.current().version)
+
+    def test_publish_fails_on_stale_base(self):
+        """Test that publishing on an outdated version is rejected."""
+        self.store.publish(self.agents)
+        base = self.store.current()
+        self.store.publish(base.copy_agents(), base=base)
+
+        self.assertIsNone(self.store.publish(base.copy_agents(), base=base))
+        self.assertEqual(2, self.store.current().version)
+
+    def test_distribution_counts(self):
+        """Test that the answers are counted from the agents, unless counts are given."""
+        self.agents[0].questions["Statement"] = [4]
+        counted = self.store.publish(self.agents).distribution_counts
+        self.assertEqual([0, 0, 0, 1, 0], counted.get_counts("Statement").tolist())
+
+        kept = counted.copy()
+        kept.add("Statement", 2)
+        population = self.store.publish(self.agents, distribution_counts=kept)
+        self.assertIs(kept, population.distribution_counts)
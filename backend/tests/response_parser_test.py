@@ -0,0 +1,93 @@
+import unittest
+import numpy as np
+from backend.services.response_parser import parse_likert_answers, parse_latent_values
+
+
+class TestParseLikertAnswers(unittest.TestCase):
+    def test_answers_are_written_to_agent_rows(self):
+        """Test that the answers are written to the rows of the agent numbers."""
+        response = "Agent 2: 5, 1\nAgent 1: 3, 4\nAgent 3: 2"
+        answers, counts = parse_likert_answers(response, 3, 2)
+
+        np.testing.assert_array_equal([[3, 4], [5, 1], [2, 0]], answers)
+        np.testing.assert_array_equal([2, 2, 1], counts)
+
+    def test_other_text_is_skipped(self):
+        """Test that unknown agents, repeated lines and decimals are skipped."""
+        response = (
+            "Sure!\n  Agent 1 : 3, 4.\nAgent 9: 1, 1\nAgent 1: 5, 5\nAgent 2: 2.5"
+        )
+        answers, counts = parse_likert_answers(response, 2, 2)
+
+        # Only the first line of agent 1 is used and decimals are not answers
+        np.testing.assert_array_equal([3, 0], answers[:, 0])
+        np.testing.assert_array_equal([1, 0], counts)
+
+    def test_extra_answers_are_ignored(self):
+        """Test that answers beyond the number of questions are ignored."""
+        answers, counts = parse_likert_answers("Agent 1: 1, 2, 3", 1, 2)
+
+        np.testing.assert_array_equal([[1, 2]], answers)
+        np.testing.assert_array_equal([2], counts)
+
+    def test_long_numbers_are_skipped(self):
+        """Test that numbers too long to be agents or answers are skipped."""
+        response = "Agent 1: 99999999999999999999999\nAgent 99999999999999999999: 3"
+        answers, counts = parse_likert_answers(response, 2, 2)
+
+        np.testing.assert_array_equal([[0, 0], [0, 0]], answers)
+        np.testing.assert_array_equal([0, 0], counts)
+
+    def test_large_response(self):
+        """Test that a response of 10 000 agents is parsed completely."""
+        rng = np.random.default_rng(0)
+        expected = rng.integers(1, 6, (10_000, 5))
+        response = "\n".join(
+            f"Agent {i + 1}: " + ", ".join(map(str, expected[i]))
+            for i in rng.permutation(10_000)
+        )
+        answers, counts = parse_likert_answers(response, 10_000, 5)
+
+        np.testing.assert_array_equal(expected, answers)
+        self.assertTrue((counts == 5).all())
+
+
+class TestParseLatentValues(unittest.TestCase):
+    def test_values_are_written_to_respondent_rows(self):
+        """Test that the values are written to the rows of the respondent numbers."""
+        response = "Respondent 2:\n1.3\n-2\n\nRespondent 1:\nLatent variable values:\n0.1\n-.5\n"
+        values = parse_latent_values(response, 2, 2)
+
+        np.testing.assert_array_equal([[0.1, -0.5], [1.3, -2.0]], values)
+
+    def test_unknown_respondent(self):
+        """Test that a respondent number out of range raises RuntimeError."""
+        with self.assertRaises(RuntimeError):
+            parse_latent_values("Respondent 3:\n0.1\n", 2, 1)
+        with self.assertRaises(RuntimeError):
+            parse_latent_values("Respondent 99999999999999999999:\n0.1\n", 2, 1)
+
+    def test_repeated_respondent(self):
+        """Test that a repeated respondent raises RuntimeError."""
+        with self.assertRaises(RuntimeError):
+            parse_latent_values("Respondent 1:\n0.1\nRespondent 1:\n0.2\n", 1, 1)
+
+    def test_too_many_values(self):
+        """Test that more values than latent variables raise RuntimeError."""
+        with self.assertRaises(RuntimeError):
+            parse_latent_values("Respondent 1:\n0.1\n0.2\n", 1, 1)
+
+    def test_missing_respondent(self):
+        """Test that a missing respondent raises RuntimeError."""
+        with self.assertRaises(RuntimeError):
+            parse_latent_values("Respondent 1:\n0.1\n", 2, 1)
+
+    def test_large_response(self):
+        """Test that a response of 10 000 respondents is parsed completely."""
+        expected = np.round(np.random.default_rng(0).uniform(-3, 3, (10_000, 13)), 1)
+        response = "\n\n".join(
+            f"Respondent {i + 1}:\n" + "\n".join(f"{value:.1f}" for value in row)
+            for i, row in reversed(list(enumerate(expected)))
+        )
+
+        np.testing.assert_allclose(expected, parse_latent_values(response, 10_000, 13))
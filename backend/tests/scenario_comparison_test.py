@@ -0,0 +1,108 @@
+import threading
+import unittest
+from backend.entities.agent import Agent
+from backend.services.cancellation import CancellationToken, RequestCancelled
+from backend.services.scenario_comparison import ScenarioComparison
+
+
+class MockTransformer:
+    """Sets the future latent variables to the length of the scenario."""
+
+    def transform_agents_to_future(self, agents, future_scenario, cancellation=None):
+        if cancellation is not None and cancellation.is_cancelled():
+            raise RequestCancelled("The request was cancelled")
+        for agent in agents:
+            agent.save_new_future_latent_variables({"A": len(future_scenario)})
+        return True
+
+
+class MockLlmHandler:
+    """Answers with the first latent variable value, and records which prompts were made."""
+
+    def __init__(self):
+        self.calls = []
+        self.tokens = []
+        self.lock = threading.Lock()
+
+    def get_agents_responses(self, agents, questions, cancellation=None):
+        future = bool(agents[0].get_agent_future_info()["Answers"])
+        with self.lock:
+            self.calls.append((future, tuple(questions)))
+            self.tokens.append(cancellation)
+        for agent in agents:
+            for question in questions:
+                if future:
+                    value = agent.get_agent_future_info()["Answers"]["A"]
+                    agent.future_questions.setdefault(question, []).append(value)
+                if not future or question not in agent.questions:
+                    value = agent.get_agent_info()["Answers"]["A"]
+                    agent.questions.setdefault(question, []).append(value)
+
+
+class TestScenarioComparison(unittest.TestCase):
+    def setUp(self):
+        self.agents = [
+            Agent({"Age": "20", "Gender": "Male", "Answers": {"A": 1}}),
+            Agent({"Age": "21", "Gender": "Female", "Answers": {"A": 2}}),
+        ]
+        self.llm_handler = MockLlmHandler()
+        self.transformer = MockTransformer()
+        self.comparison = ScenarioComparison(self.llm_handler, self.transformer)
+
+    def test_compare_returns_distributions_per_scenario(self):
+        """Test that each scenario gets its own future distributions."""
+        current, scenarios = self.comparison.compare(
+            self.agents, ["abc", "abcde"], ["Q1"]
+        )
+
+        self.assertEqual("Q1", current[0]["question"])
+        self.assertEqual(["abc", "abcde"], [item["scenario"] for item in scenarios])
+        values = [
+            [item["value"] for item in scenario["future_distributions"][0]["data"]]
+            for scenario in scenarios
+        ]
+        self.assertEqual([0, 0, 2, 0, 0], values[0])
+        self.assertEqual([0, 0, 0, 0, 2], values[1])
+
+    def test_compare_asks_original_agents_once(self):
+        """Test that the original agents are asked once and the scenarios only once each."""
+        self.comparison.compare(self.agents, ["abc", "abcde", "a"], ["Q1"])
+
+        original_calls = [call for call in self.llm_handler.calls if not call[0]]
+        future_calls = [call for call in self.llm_handler.calls if call[0]]
+        self.assertEqual(1, len(original_calls))
+        self.assertEqual(3, len(future_calls))
+
+    def test_compare_does_not_modify_agents(self):
+        """Test that the session's agents are left unchanged."""
+        self.comparison.compare(self.agents, ["abc", "abcde"], ["Q1"])
+
+        self.assertEqual({}, self.agents[0].questions)
+        self.assertEqual({"Answers": {}}, self.agents[0].get_agent_future_info())
+
+    def test_compare_skips_answered_original_questions(self):
+        """Test that questions the agents have already answered are not asked again."""
+        for agent in self.agents:
+            agent.questions = {"Q1": [3]}
+
+        current, _ = self.comparison.compare(self.agents, ["abc", "abcde"], ["Q1"])
+
+        self.assertTrue(all(call[0] for call in self.llm_handler.calls))
+        self.assertEqual(2, current[0]["data"][2]["value"])
+
+    def test_compare_passes_cancellation_token(self):
+        """Test that the cancellation token reaches every question."""
+        cancellation = CancellationToken()
+
+        self.comparison.compare(self.agents, ["abc", "abcde"], ["Q1"], cancellation)
+
+        self.assertEqual(3, len(self.llm_handler.tokens))
+        self.assertTrue(all(token is cancellation for token in self.llm_handler.tokens))
+
+    def test_cancelled_compare_raises(self):
+        """Test that a cancelled comparison raises RequestCancelled."""
+        cancellation = CancellationToken()
+        cancellation.cancel()
+
+        with self.assertRaises(RequestCancelled):
+            self.comparison.compare(self.agents, ["abc", "abcde"], ["Q1"], cancellation)
@@ -0,0 +1,96 @@
+import unittest
+import numpy as np
+from backend.entities.agent import Agent
+from backend.services.shift_statistics import (
+    get_shift_statistics,
+    shift_statistics,
+    paired_shift_counts,
+    wilcoxon_signed_rank,
+    chi_square_sf,
+)
+
+
+class TestShiftStatistics(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+        self.current = self.rng.integers(1, 6, (200, 2))
+        self.future = np.clip(self.current + self.rng.integers(-1, 3, (200, 2)), 1, 5)
+
+    def test_shares_and_mean_shift(self):
+        """Test the mean shift and the shares of changed answers."""
+        current = np.array([[1], [3], [5], [2]])
+        future = np.array([[2], [3], [4], [0]])
+        statistics = shift_statistics(current, future, ["Q"], rng=self.rng)[0]
+
+        # The agent without a future answer is left out
+        self.assertEqual(3, statistics["agents"])
+        self.assertAlmostEqual(0.0, statistics["mean shift"])
+        self.assertAlmostEqual(2 / 3, statistics["changed share"])
+        self.assertAlmostEqual(1 / 3, statistics["increased share"])
+        self.assertAlmostEqual(1 / 3, statistics["decreased share"])
+
+    def test_bootstrap_interval_contains_mean_shift(self):
+        """Test that the confidence interval contains the mean shift and the tests find the shift."""
+        statistics = shift_statistics(
+            self.current, self.future, ["Q1", "Q2"], rng=self.rng
+        )
+
+        for question in statistics:
+            low, high = question["mean shift confidence interval"]
+            self.assertLess(low, question["mean shift"])
+            self.assertGreater(high, question["mean shift"])
+            self.assertLess(question["wilcoxon"]["p value"], 0.001)
+            self.assertLess(question["symmetry test"]["p value"], 0.001)
+
+    def test_wilcoxon_matches_ranking(self):
+        """Test that the rank sum equals the one from ranking the shifts directly."""
+        differences = self.future[:, 0] - self.current[:, 0]
+        differences = differences[differences != 0]
+        absolute = np.abs(differences)
+        order = np.sort(absolute)
+        ranks = {
+            value: np.flatnonzero(order == value).mean() + 1 for value in set(order)
+        }
+        expected = sum(ranks[abs(d)] for d in differences if d > 0)
+
+        statistic, _, _ = wilcoxon_signed_rank(
+            paired_shift_counts(self.current, self.future)
+        )
+        self.assertAlmostEqual(expected, statistic[0])
+
+    def test_unchanged_answers(self):
+        """Test that the tests of unchanged answers give None."""
+        statistics = shift_statistics(
+            self.current, self.current, ["Q1", "Q2"], rng=self.rng
+        )[0]
+
+        self.assertEqual(0.0, statistics["changed share"])
+        self.assertIsNone(statistics["wilcoxon"]["p value"])
+        self.assertIsNone(statistics["symmetry test"]["p value"])
+        self.assertEqual([0.0, 0.0], statistics["mean shift confidence interval"])
+
+    def test_chi_square_sf(self):
+        """Test the chi-square tail probability against table values."""
+        for x, degrees in [(3.841, 1), (5.991, 2), (7.815, 3), (18.307, 10)]:
+            self.assertAlmostEqual(0.05, chi_square_sf(x, degrees), places=3)
+        self.assertEqual(1.0, chi_square_sf(0, 3))
+
+    def test_no_future_agents(self):
+        """Test that agents without future answers give no statistics."""
+        agent = Agent({"Age": 30})
+        agent.questions = {"Q": [3]}
+        self.assertEqual([], get_shift_statistics([agent]))
+
+    def test_get_shift_statistics(self):
+        """Test that only the questions answered by both the current and future agents are compared."""
+        agents = []
+        for current, future in zip(self.current[:, 0], self.future[:, 0]):
+            agent = Agent({"Age": 30})
+            agent.questions = {"Q": [int(current)], "Only current": [1]}
+            agent.future_questions = {"Q": [int(future)]}
+            agents.append(agent)
+
+        statistics = get_shift_statistics(agents, rng=self.rng)
+
+        self.assertEqual(["Q"], [question["question"] for question in statistics])
+        self.assertEqual(200, statistics[0]["agents"])
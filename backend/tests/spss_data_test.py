@@ -0,0 +1,123 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+import pyreadstat
+from backend.services.spss_data import (
+    file_hash,
+    read_sav_metadata,
+    column_names_from_metadata,
+    read_sav_chunks,
+)
+from backend.services.training_data import (
+    chunks_to_npy,
+    convert_sav_to_npy,
+    TrainingData,
+)
+
+
+class TestSpssData(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.sav_path = os.path.join(self.directory.name, "survey.sav")
+        df = pd.DataFrame(
+            {
+                "FA": [0.5, -1.2, 2.0],
+                "TECH": [1.1, 0.0, -0.3],
+                "age": [26.0, 30.0, 41.0],
+                "sex": [1.0, 2.0, 1.0],
+            }
+        )
+        pyreadstat.write_sav(
+            df,
+            self.sav_path,
+            column_labels=[
+                "Future Awareness - Awareness of global agricultural challenges",
+                "Tech Orientation - Trust in food production technology",
+                "Age of the respondent",
+                "Gender",
+            ],
+            variable_value_labels={"sex": {1.0: "Female", 2.0: "Male"}},
+        )
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_read_sav_metadata(self):
+        """Test that the labels of the columns and values are read."""
+        metadata = read_sav_metadata(self.sav_path)
+        self.assertEqual(3, metadata["rows"])
+        self.assertEqual(
+            "Tech Orientation - Trust in food production technology",
+            metadata["column_labels"]["TECH"],
+        )
+        self.assertEqual(
+            {"1.0": "Female", "2.0": "Male"}, metadata["value_labels"]["sex"]
+        )
+
+    def test_column_names_from_metadata(self):
+        """Test that columns without a label keep their name."""
+        metadata = {
+            "column_labels": {"FA": "Future Awareness", "age": None, "q2": "Gender"},
+        }
+        self.assertEqual(
+            {"FA": "Future Awareness", "age": "Age", "q2": "Gender"},
+            column_names_from_metadata(metadata),
+        )
+
+    def test_read_sav_chunks(self):
+        """Test that the columns are named by the labels and the codes replaced by labels."""
+        chunks = list(read_sav_chunks(self.sav_path, chunksize=2))
+
+        self.assertEqual([2, 1], [len(chunk) for chunk in chunks])
+        self.assertEqual(
+            [
+                "Future Awareness - Awareness of global agricultural challenges",
+                "Tech Orientation - Trust in food production technology",
+                "Age",
+                "Gender",
+            ],
+            list(chunks[0].columns),
+        )
+        self.assertEqual(
+            ["Female", "Male", "Female"],
+            [gender for chunk in chunks for gender in chunk["Gender"]],
+        )
+
+    def test_conversion_is_cached_by_file_hash(self):
+        """Test that the binary copy is named by the hash of the file."""
+        cache_dir = os.path.join(self.directory.name, "cache")
+        npy_path = convert_sav_to_npy(self.sav_path, cache_dir)
+
+        self.assertEqual(f"{file_hash(self.sav_path)}.npy", os.path.basename(npy_path))
+
+        # The cached file is used instead of parsing the SPSS file again
+        os.utime(npy_path, (0, 0))
+        self.assertEqual(npy_path, convert_sav_to_npy(self.sav_path, cache_dir))
+        self.assertEqual(0, os.path.getmtime(npy_path))
+
+    def test_conversion_writes_every_chunk(self):
+        """Test that the rows of all chunks are written and the ages are whole numbers."""
+        npy_path = os.path.join(self.directory.name, "survey.npy")
+        chunks_to_npy(
+            lambda: read_sav_chunks(self.sav_path, chunksize=2), npy_path, ["Age"]
+        )
+        records = np.load(npy_path)
+
+        self.assertEqual([26, 30, 41], records["Age"].tolist())
+        self.assertEqual(["Female", "Male", "Female"], records["Gender"].tolist())
+        self.assertEqual(
+            [1.1, 0.0, -0.3],
+            records["Tech Orientation - Trust in food production technology"].tolist(),
+        )
+
+    def test_training_data_from_sav(self):
+        """Test that an SPSS file can be used as the training data."""
+        data = TrainingData(self.sav_path)
+
+        self.assertTrue(data.is_memory_mapped())
+        df = data.to_dataframe()
+        self.assertEqual(["Female", "Male", "Female"], list(df["Gender"]))
+        self.assertEqual([26, 30, 41], list(df["Age"]))
+        self.assertEqual(2, len(data.sample(2)))
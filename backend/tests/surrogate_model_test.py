@@ -0,0 +1,73 @@
+import unittest
+import numpy as np
+from backend.services.surrogate_model import (
+    OrdinalRegression,
+    latent_matrix,
+    select_diverse,
+    uncertainty,
+)
+
+
+class MockAgent:
+    def __init__(self, answers):
+        self.info = {"Answers": answers}
+
+    def get_agent_info(self):
+        return self.info
+
+    def get_agent_future_info(self):
+        return {"Answers": {"A": -float(self.info["Answers"]["A"])}}
+
+
+class TestOrdinalRegression(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.X = rng.uniform(-2.4, 2.4, size=(300, 3))
+        # The answer grows with the first latent variable only
+        self.y = np.clip(np.round(3 + self.X[:, 0]), 1, 5).astype(int)
+
+    def test_predicts_ordinal_answers(self):
+        """Test that the model learns the answers of the training data."""
+        model = OrdinalRegression().fit(self.X, self.y)
+        accuracy = (model.predict(self.X) == self.y).mean()
+        self.assertGreater(accuracy, 0.8)
+
+    def test_probabilities_sum_to_one(self):
+        """Test that the probabilities of each agent sum to one."""
+        probabilities = OrdinalRegression().fit(self.X, self.y).predict_proba(self.X)
+        self.assertEqual((300, 5), probabilities.shape)
+        np.testing.assert_allclose(probabilities.sum(axis=1), 1.0)
+        self.assertTrue((probabilities >= 0).all())
+
+    def test_single_answer(self):
+        """Test that a model fitted to one answer only predicts it."""
+        model = OrdinalRegression().fit(self.X[:10], np.full(10, 4))
+        self.assertTrue((model.predict(self.X) == 4).all())
+
+    def test_uncertainty(self):
+        """Test that a certain prediction has no uncertainty."""
+        probabilities = np.array([[1.0, 0, 0, 0, 0], [0.2, 0.2, 0.2, 0.2, 0.2]])
+        np.testing.assert_allclose([0.0, 0.8], uncertainty(probabilities))
+
+
+class TestSurrogateHelpers(unittest.TestCase):
+    def test_latent_matrix(self):
+        """Test that non-numeric values are 0 and future values are used for the future agents."""
+        agents = [MockAgent({"A": 1.5, "B": "x"}), MockAgent({"A": "-0.5", "B": 2})]
+        np.testing.assert_allclose(
+            [[1.5, 0.0], [-0.5, 2.0]], latent_matrix(agents, ["A", "B"])
+        )
+        np.testing.assert_allclose(
+            [[-1.5], [0.5]], latent_matrix(agents, ["A"], future=True)
+        )
+
+    def test_select_diverse_covers_the_extremes(self):
+        """Test that the middle and the extremes are selected first."""
+        X = np.linspace(-2, 2, 41).reshape(-1, 1)
+        selected = select_diverse(X, 3)
+        self.assertEqual([20, 0, 40], selected)
+
+    def test_select_diverse_skips_duplicates_and_selected(self):
+        """Test that duplicate and already selected agents are not selected."""
+        X = np.array([[0.0], [0.0], [1.0], [2.0]])
+        self.assertEqual([0, 2], select_diverse(X, 5, selected=[3]))
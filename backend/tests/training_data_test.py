@@ -0,0 +1,190 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from backend.services.training_data import (
+    dataframe_to_agents,
+    convert_csv_to_npy,
+    npy_path_for,
+    build_row_index,
+    reservoir_sample_csv,
+    allocate_sample,
+    age_band,
+    stratum_of,
+    TrainingData,
+)
+
+
+class TestTrainingData(unittest.TestCase):
+    def test_dataframe_to_agents(self):
+        """Test that each row becomes an agent with age, gender and latent values."""
+        df = pd.DataFrame(
+            {
+                "A": [0, 1],
+                "B": [0.5, -1.2],
+                "Age": [26, 30],
+                "Gender": ["Female", "Male"],
+            }
+        )
+        agents = dataframe_to_agents(df)
+
+        self.assertEqual(2, len(agents))
+        self.assertEqual(
+            {"Age": "30", "Gender": "Male", "Answers": {"A": "1", "B": -1.2}},
+            agents[1].get_agent_info(),
+        )
+        # The given dataframe is not modified
+        self.assertEqual(26, df["Age"][0])
+
+
+class TestTrainingDataFile(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.csv_path = os.path.join(self.directory.name, "survey.csv")
+        pd.DataFrame(
+            {
+                "A": [0.5, -1.2, 2.0],
+                "B": [1, 2, 3],
+                "Age": [26, 30, 41],
+                "Gender": ["Female", None, "Male"],
+            }
+        ).to_csv(self.csv_path, index=False)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_csv_is_parsed_without_binary_copy(self):
+        """Test that the CSV file is read when there is no binary copy."""
+        data = TrainingData(self.csv_path)
+        self.assertFalse(data.is_memory_mapped())
+        self.assertEqual(3, len(data))
+
+    def test_binary_copy_is_memory_mapped(self):
+        """Test that the converted file is mapped and gives the same agents as the CSV file."""
+        npy_path = convert_csv_to_npy(self.csv_path)
+        self.assertEqual(npy_path_for(self.csv_path), npy_path)
+
+        data = TrainingData(self.csv_path)
+        self.assertTrue(data.is_memory_mapped())
+
+        expected = dataframe_to_agents(pd.read_csv(self.csv_path))
+        agents = dataframe_to_agents(data.to_dataframe())
+        self.assertEqual(
+            [agent.get_agent_info() for agent in expected],
+            [agent.get_agent_info() for agent in agents],
+        )
+
+    def test_sample(self):
+        """Test that a sample has the columns of the file and cannot be larger than it."""
+        convert_csv_to_npy(self.csv_path)
+        df = TrainingData(self.csv_path).sample(2)
+
+        self.assertEqual(2, len(df))
+        self.assertEqual(["A", "B", "Age", "Gender"], list(df.columns))
+        with self.assertRaises(ValueError):
+            TrainingData(self.csv_path).sample(4)
+
+    def test_outdated_binary_copy_is_not_used(self):
+        """Test that a binary copy older than the CSV file is not used."""
+        npy_path = convert_csv_to_npy(self.csv_path)
+        os.utime(npy_path, (0, 0))
+        self.assertFalse(TrainingData(self.csv_path).is_memory_mapped())
+
+    def test_indexed_sample(self):
+        """Test that the row-offset index is used and gives rows of the file."""
+        build_row_index(self.csv_path)
+        data = TrainingData(self.csv_path)
+
+        self.assertTrue(data.is_indexed())
+        self.assertEqual(3, len(data))
+        df = data.sample(3)
+        self.assertEqual([-1.2, 0.5, 2.0], sorted(df["A"]))
+        self.assertEqual(["Female", "Male"], sorted(df["Gender"].dropna()))
+
+
+class TestStreamingSampling(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.csv_path = os.path.join(self.directory.name, "survey.csv")
+        pd.DataFrame(
+            {
+                "A": range(1000),
+                "Age": [20 + i % 40 for i in range(1000)],
+                "Gender": ["Female" if i % 4 else "Male" for i in range(1000)],
+            }
+        ).to_csv(self.csv_path, index=False)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_reservoir_sample(self):
+        """Test that the rows are sampled from the whole file in their order."""
+        df = reservoir_sample_csv(
+            self.csv_path, 50, chunksize=64, rng=np.random.default_rng(1)
+        )
+
+        self.assertEqual(50, len(df))
+        self.assertEqual(50, df["A"].nunique())
+        self.assertEqual(sorted(df["A"]), list(df["A"]))
+        # Rows from the end of the file are as likely as rows from the beginning
+        self.assertGreater(df["A"].max(), 500)
+        self.assertLess(df["A"].min(), 500)
+
+    def test_reservoir_sample_is_uniform(self):
+        """Test that every part of the file is sampled equally often."""
+        rng = np.random.default_rng(2)
+        counts = np.zeros(1000)
+        for _ in range(200):
+            df = reservoir_sample_csv(self.csv_path, 10, chunksize=300, rng=rng)
+            counts[df["A"]] += 1
+        # 2000 draws from ten blocks of 100 rows
+        block_counts = counts.reshape(10, 100).sum(axis=1)
+        self.assertTrue(((block_counts > 140) & (block_counts < 260)).all())
+
+    def test_stratified_reservoir_sample(self):
+        """Test that the sample has the genders in the proportions of the file."""
+        df = reservoir_sample_csv(self.csv_path, 40, stratified=True, chunksize=64)
+        self.assertEqual(10, (df["Gender"] == "Male").sum())
+        self.assertEqual(40, df["A"].nunique())
+
+    def test_stratified_sample_from_memory_mapped_file(self):
+        """Test that a stratified sample keeps the proportion of the genders."""
+        convert_csv_to_npy(self.csv_path)
+        df = TrainingData(self.csv_path).sample(40, stratified=True)
+        self.assertEqual(10, (df["Gender"] == "Male").sum())
+
+    def test_sample_is_shuffled(self):
+        """Test that the sample is not in the order of the file."""
+        df = TrainingData(self.csv_path).sample(50, seed=3)
+        self.assertEqual(50, df["A"].nunique())
+        self.assertNotEqual(sorted(df["A"]), list(df["A"]))
+        self.assertEqual(list(range(50)), list(df.index))
+
+    def test_stratified_sample_is_shuffled(self):
+        """Test that the strata of a stratified sample are not in order."""
+        convert_csv_to_npy(self.csv_path)
+        df = TrainingData(self.csv_path).sample(40, stratified=True, seed=3)
+        self.assertNotEqual(sorted(df["A"]), list(df["A"]))
+
+    def test_too_large_sample(self):
+        """Test that a sample larger than the file raises ValueError."""
+        with self.assertRaises(ValueError):
+            reservoir_sample_csv(self.csv_path, 1001)
+
+    def test_allocate_sample(self):
+        """Test that the sample is allocated by the sizes of the strata."""
+        self.assertEqual(
+            {"a": 5, "b": 3, "c": 2}, allocate_sample({"a": 50, "b": 26, "c": 24}, 10)
+        )
+
+    def test_missing_gender_is_unknown(self):
+        """Test that a missing gender is the same stratum however the data was read."""
+        for gender in (None, np.nan, "", " "):
+            self.assertEqual(("unknown", "20-29"), stratum_of(gender, 26))
+        self.assertEqual(("Female", "unknown"), stratum_of("Female", None))
+
+    def test_age_band(self):
+        """Test that ages are put into decades and missing ages are unknown."""
+        self.assertEqual("20-29", age_band("26"))
+        self.assertEqual("unknown", age_band(None))
@@ -0,0 +1,40 @@
+import os
+import tempfile
+import unittest
+from backend.services.transformation_cache import TransformationCache
+
+
+class TestTransformationCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = TransformationCache()
+
+    def test_set_and_get(self):
+        """Test that saved latent variables are returned for the same key only."""
+        self.cache.set("Scenario", (0.1, 0.2), "gpt-4o", "1", {"A": "0.5", "B": "1.0"})
+
+        self.assertEqual(
+            {"A": "0.5", "B": "1.0"},
+            self.cache.get("Scenario", (0.1, 0.2), "gpt-4o", "1"),
+        )
+        self.assertIsNone(self.cache.get("Other", (0.1, 0.2), "gpt-4o", "1"))
+        self.assertIsNone(self.cache.get("Scenario", (0.1, 0.2), "gemini", "1"))
+
+    def test_get_statistics(self):
+        """Test that hits and misses are counted."""
+        self.cache.set("Scenario", (0.1,), "gpt-4o", "1", {"A": "0.5"})
+        self.cache.get("Scenario", (0.1,), "gpt-4o", "1")
+        self.cache.get("Scenario", (0.3,), "gpt-4o", "1")
+
+        self.assertEqual(
+            {"hits": 1, "misses": 1, "hit rate": 0.5}, self.cache.get_statistics()
+        )
+
+    def test_transformations_persist_in_file(self):
+        """Test that transformations saved into a file are found by a new cache instance."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "cache.sqlite")
+            TransformationCache(path).set("Scenario", (0.1,), "gpt-4o", "1", {"A": 1})
+            self.assertEqual(
+                {"A": 1},
+                TransformationCache(path).get("Scenario", (0.1,), "gpt-4o", "1"),
+            )